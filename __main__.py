@@ -0,0 +1,10 @@
+""" python -m jsonDiff (the checkout directory), or python path/to/jsonDiff: same as jsonDiff.py
+"""
+import os
+import sys
+import runpy
+
+PROJECT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, PROJECT_PATH)                      # the modules import each other by name
+runpy.run_path(os.path.join(PROJECT_PATH, 'jsonDiff.py'), run_name='__main__')  # not import: the package is jsonDiff too
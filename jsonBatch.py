@@ -0,0 +1,196 @@
+import os
+import sys
+import glob
+import json
+import time
+import shlex
+import argparse
+import concurrent.futures
+
+from jsonComparison import Comparison, comparisonOptions
+from jsonLoader import loadJson
+from jsonRules import argumentRules
+
+IDENTICAL = 'identical'
+DIFFERENT = 'different'
+FAILED = 'failed'
+
+
+def pairDirectories(dir1, dir2, pattern):
+  """ Pair the files matching pattern in 2 directory trees on their relative path
+
+      Returns the (file1, file2) pairs and the files only found in one of the trees
+  """
+  def relativeFiles(top):
+    files = glob.glob(os.path.join(glob.escape(top), pattern), recursive=True)
+    return {os.path.relpath(fn, top) for fn in files if os.path.isfile(fn)}
+  files1 = relativeFiles(dir1)
+  files2 = relativeFiles(dir2)
+  pairs = [(os.path.join(dir1, fn), os.path.join(dir2, fn)) for fn in sorted(files1 & files2)]
+  single = [(os.path.join(dir1, fn), None) for fn in sorted(files1 - files2)] + \
+           [(None, os.path.join(dir2, fn)) for fn in sorted(files2 - files1)]
+  return pairs, single
+
+
+def readManifest(fn):
+  """ File pairs from a manifest, one pair per line, # starts a comment
+
+      Relative paths are relative to the manifest
+  """
+  top = os.path.dirname(fn)
+  pairs = []
+  with open(fn) as fp:
+    for lineno, line in enumerate(fp, 1):
+      fields = shlex.split(line, comments=True)
+      if not fields:
+        continue
+      if len(fields) != 2:
+        raise ValueError('{} line {}: expected 2 file names'.format(fn, lineno))
+      pairs.append(tuple(os.path.join(top, field) for field in fields))
+  return pairs
+
+
+def diffPair(options, fn1, fn2, messages):
+  """ Compare one pair of files, run by the worker processes
+  """
+  result = {'file1': fn1, 'file2': fn2}
+  start = time.perf_counter()
+  try:
+    comparison = Comparison(**options)
+    for jsonId, fn in (('1', fn1), ('2', fn2)):
+      comparison.setJson(jsonId, loadJson(fn), False)  # every pair is compared one time
+    comparison.compare()
+  except (OSError, ValueError) as e:                  # JSONDecodeError is a ValueError
+    result['status'] = FAILED
+    result['error'] = str(e)
+  else:
+    result['status'] = DIFFERENT if comparison.mismatch else IDENTICAL
+    result['mismatches'] = len(comparison.mismatch)
+    if messages:
+      result['messages'] = [mismatch.error for mismatch in comparison.mismatch]
+  result['seconds'] = round(time.perf_counter() - start, 6)
+  return result
+
+
+def runBatch(pairs, options, jobs, inFlight, report, messages=False):
+  """ Compare all pairs with jobs worker processes
+
+      At most inFlight pairs are queued at a time, so only their results are
+      held in memory. report(index, result) is called as soon as a pair is done
+  """
+  pending = set()
+  pairs = iter(enumerate(pairs))
+  with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+    while True:
+      for index, (fn1, fn2) in pairs:
+        future = executor.submit(diffPair, options, fn1, fn2, messages)
+        future.index = index
+        pending.add(future)
+        if len(pending) >= inFlight:
+          break
+      if not pending:
+        break
+      done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+      for future in done:
+        report(future.index, future.result())
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(prog='jsonDiff.py batch',
+                                   description='Compare many pairs of JSON files in worker processes')
+  parser.add_argument('dir1', nargs='?', default=None, help='directory tree 1')
+  parser.add_argument('dir2', nargs='?', default=None, help='directory tree 2')
+  parser.add_argument('--manifest', action='store', default=None,
+                      help='file with a pair of JSON files per line, instead of 2 directories')
+  parser.add_argument('--pattern', action='store', default='**/*.json',
+                      help='glob pattern for the files in the directories (default **/*.json)')
+  parser.add_argument('--jobs', '-j', action='store', type=int, default=os.cpu_count() or 1,
+                      help='worker processes (default: number of cpus)')
+  parser.add_argument('--in-flight', action='store', type=int, default=None,
+                      help='pairs queued for the workers at a time (default 2 * JOBS)')
+  parser.add_argument('--summary', action='store', default=None,
+                      help='write the results of all pairs as JSON to SUMMARY')
+  parser.add_argument('--verbose', '-v', action='store_true', help='print the mismatches of every pair')
+  parser.add_argument('--align', action='store_true',
+                      help='compare lists by pairing equal elements instead of by index')
+  parser.add_argument('--key', action='store', default=None,
+                      help='compare lists of objects by pairing the objects with the same KEY property')
+  parser.add_argument('--abs-tol', action='store', type=float, default=0.0,
+                      help='numbers at most ABS_TOL apart are the same')
+  parser.add_argument('--rel-tol', action='store', type=float, default=0.0,
+                      help='numbers at most REL_TOL times the largest of the two apart are the same')
+  parser.add_argument('--ignore', action='append', default=[], metavar='PATTERN',
+                      help='leave the paths matching PATTERN out, like $.items[*].updatedAt or $..etag')
+  parser.add_argument('--include', action='append', default=[], metavar='PATTERN',
+                      help='only compare the paths matching PATTERN')
+  parser.add_argument('--rules', action='store', default=None,
+                      help='file with a rule per line: "ignore PATTERN" or "include PATTERN"')
+  args = parser.parse_args(argv)
+  if (args.manifest is None) == (args.dir1 is None or args.dir2 is None):
+    parser.error('give 2 directories or --manifest')
+  if args.jobs < 1:
+    parser.error('--jobs must be at least 1')
+  if not (args.abs_tol >= 0 and args.rel_tol >= 0):
+    parser.error('--abs-tol and --rel-tol can not be negative')
+  try:
+    args.ignore, args.include = argumentRules(args)
+  except (OSError, ValueError) as e:
+    parser.error(str(e))
+
+  single = []
+  if args.manifest is not None:
+    try:
+      pairs = readManifest(args.manifest)
+    except (OSError, ValueError) as e:
+      print('Can not read manifest: {}'.format(e))
+      return 2
+  else:
+    for top in (args.dir1, args.dir2):
+      if not os.path.isdir(top):
+        print('Can not find: {}'.format(top))
+        return 2
+    pairs, single = pairDirectories(args.dir1, args.dir2, args.pattern)
+
+  options = dict(comparisonOptions(args), workers=1)  # the pairs are the unit of work
+  results = [None] * len(pairs)
+  totals = {IDENTICAL: 0, DIFFERENT: 0, FAILED: 0}
+
+  def report(index, result):
+    results[index] = result
+    totals[result['status']] += 1
+    if result['status'] == FAILED:
+      print('Failed: {} - {}: {}'.format(result['file1'], result['file2'], result['error']), flush=True)
+    elif result['status'] == DIFFERENT:
+      print('Different: {} - {}: {} mismatches'.format(result['file1'], result['file2'], result['mismatches']),
+            flush=True)
+      for message in result.get('messages', ()):
+        print(message)
+
+  start = time.perf_counter()
+  runBatch(pairs, options, args.jobs, args.in_flight or 2 * args.jobs, report, args.verbose)
+  for fn1, fn2 in single:
+    print('Only in {}: {}'.format(*((args.dir1, fn1) if fn2 is None else (args.dir2, fn2))))
+  seconds = time.perf_counter() - start
+
+  summary = {'pairs': len(pairs),
+             'identical': totals[IDENTICAL],
+             'different': totals[DIFFERENT],
+             'failed': totals[FAILED],
+             'unpaired': len(single),
+             'mismatches': sum(result.get('mismatches', 0) for result in results),
+             'seconds': round(seconds, 6),
+             'pairSeconds': round(sum(result['seconds'] for result in results), 6),
+             'results': results,
+             'unpairedFiles': [fn1 or fn2 for fn1, fn2 in single]}
+  print('{pairs} pairs: {identical} identical, {different} different, {failed} failed, '
+        '{unpaired} unpaired, {mismatches} mismatches in {seconds:.2f}s'.format(**summary))
+  if args.summary is not None:
+    with open(args.summary, 'w') as fp:
+      json.dump(summary, fp, indent=2)
+  if totals[FAILED] or single:
+    return 2
+  return 1 if totals[DIFFERENT] else 0
+
+
+if __name__=='__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import gc
+import copy
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+from jsonComparison import Comparison
+from jsonSearch import SearchIndex, itemText
+from jsonLoader import loadFiles
+
+try:
+  import jsonDiffGui
+  import jsonView
+except ImportError:                                   # no tkinter: no gui benchmarks
+  jsonDiffGui = None
+
+SCALARS = 'int:3,float:2,str:4,bool:1,null:1'         # default scalar mix, kind:weight
+PLACEMENTS = ('uniform', 'shallow', 'deep', 'cluster')
+BENCHMARKS = ('load', 'fingerprint', 'compare', 'recompare', 'search', 'insertNodes', 'expand', 'scroll', 'startup')
+WINDOW_ROWS = 50                                      # rows of a window of the scroll benchmark
+STARTUP_BUDGET = 0.2                                  # seconds the cli may take to compare 2 small files
+STARTUP_HEAVY = ('tkinter', '_tkinter', 'jsonDiffGui', 'numpy', 'sqlite3', 'cProfile')  # not needed to compare them
+WORDS = ('alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliet')
+
+
+def parseScalars(text):
+  """ Scalar mix 'kind:weight,...' as (kinds, weights)
+  """
+  kinds = []
+  weights = []
+  for part in text.split(','):
+    kind, _, weight = part.partition(':')
+    if kind not in ('int', 'float', 'str', 'bool', 'null'):
+      raise ValueError('unknown scalar kind: {}'.format(kind))
+    kinds.append(kind)
+    weights.append(float(weight or 1))
+  return kinds, weights
+
+
+class Generator:
+  """ Synthetic json documents of a given shape
+
+      Objects have fanout properties, lists arrayLength elements, down to
+      depth levels. At every level objects and lists alternate, the leaves
+      are scalars picked with the weights of the scalar mix
+  """
+  def __init__(self, seed=1, depth=5, fanout=8, arrayLength=10, scalars=SCALARS):
+    self.rng = random.Random(seed)
+    self.depth = depth
+    self.fanout = fanout
+    self.arrayLength = arrayLength
+    self.kinds, self.weights = parseScalars(scalars)
+
+  def scalar(self):
+    rng = self.rng
+    kind = rng.choices(self.kinds, self.weights)[0]
+    if kind == 'int':
+      return rng.randint(-1000000, 1000000)
+    if kind == 'float':
+      return rng.random() * 1000
+    if kind == 'str':
+      return '{} {}'.format(rng.choice(WORDS), rng.randint(0, 99999))
+    if kind == 'bool':
+      return rng.random() < 0.5
+    return None
+
+  def document(self, depth=None):
+    depth = self.depth if depth is None else depth
+    if depth <= 0:
+      return self.scalar()
+    if depth % 2 == self.depth % 2:                   # objects at the top, then lists, ...
+      return {'{}{}'.format(self.rng.choice(WORDS), i): self.document(depth - 1) for i in range(self.fanout)}
+    return [self.document(depth - 1) for i in range(self.arrayLength)]
+
+  def mutate(self, data, count, placement='uniform'):
+    """ Copy of data with count mutations: changed scalars, added/removed
+        properties and list elements
+
+        placement: uniform (anywhere), shallow (top 2 levels), deep (deepest
+        containers) or cluster (all in one top level subtree)
+    """
+    data = copy.deepcopy(data)
+    containers = []                                   # (depth, container, top level key)
+    def collect(value, depth, top):
+      if type(value) in (dict, list):
+        containers.append((depth, value, top))
+        for key, child in (value.items() if type(value) is dict else enumerate(value)):
+          collect(child, depth + 1, key if top is None else top)
+    collect(data, 0, None)
+    if placement == 'shallow':
+      containers = [c for c in containers if c[0] < 2]
+    elif placement == 'deep':
+      deepest = max(c[0] for c in containers)
+      containers = [c for c in containers if c[0] == deepest]
+    elif placement == 'cluster':
+      tops = sorted({c[2] for c in containers if c[2] is not None}, key=str)
+      if tops:
+        top = self.rng.choice(tops)
+        containers = [c for c in containers if c[2] == top]
+    rng = self.rng
+    for i in range(count):
+      depth, container, top = rng.choice(containers)
+      action = rng.random()
+      if type(container) is dict:
+        if action < 0.6 and container:
+          key = rng.choice(list(container))
+          if type(container[key]) not in (dict, list):
+            container[key] = self.scalar()
+          else:
+            container['{}{}'.format(rng.choice(WORDS), rng.randint(100, 999))] = self.scalar()
+        elif action < 0.8 and container:
+          key = rng.choice(list(container))
+          if type(container[key]) not in (dict, list):  # keep the collected containers in the data
+            del container[key]
+        else:
+          container['{}{}'.format(rng.choice(WORDS), rng.randint(100, 999))] = self.scalar()
+      else:
+        if action < 0.6 and container:
+          index = rng.randrange(len(container))
+          if type(container[index]) not in (dict, list):
+            container[index] = self.scalar()
+          else:
+            container.append(self.scalar())
+        elif action < 0.8 and container and type(container[-1]) not in (dict, list):
+          container.pop()
+        else:
+          container.append(self.scalar())
+    return data
+
+  def pair(self, mutations, placement='uniform'):
+    data = self.document()
+    return data, self.mutate(data, mutations, placement)
+
+
+def countNodes(data):
+  """ Number of objects, lists and scalars in data
+  """
+  count = 0
+  stack = [data]
+  while stack:
+    value = stack.pop()
+    count += 1
+    if type(value) is dict:
+      stack.extend(value.values())
+    elif type(value) is list:
+      stack.extend(value)
+  return count
+
+
+class HeadlessTree:
+  """ Stand in for ttk.Treeview, keeps the items in dicts
+  """
+  def __init__(self):
+    self.children = {'': []}
+    self.count = 0
+
+  def tag_configure(self, *args, **kwargs):
+    pass
+
+  def insert(self, parent, position, text='', tags=(), open=False):
+    self.count += 1
+    item = 'I{:X}'.format(self.count)
+    self.children[item] = []
+    if position == 'end':
+      self.children[parent].append(item)
+    else:
+      self.children[parent].insert(position, item)
+    return item
+
+  def get_children(self, item=''):
+    return tuple(self.children[item])
+
+  def delete(self, *items):
+    for item in items:
+      self.delete(*self.children.pop(item))
+      for children in self.children.values():
+        if item in children:
+          children.remove(item)
+          break
+
+
+class Bench:
+  """ Benchmarks of one pair of generated documents
+  """
+  def __init__(self, data1, data2, repeat=3, tk=False, options=None):
+    self.data = {'1': data1, '2': data2}
+    self.nodes = countNodes(data1) + countNodes(data2)
+    self.repeat = repeat
+    self.tk = tk
+    self.options = options or {}
+    self.root = None
+
+  def run(self, names, memory=True):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+      self.files = {}
+      for jsonId in ('1', '2'):
+        self.files[jsonId] = os.path.join(tmp, 'file{}.json'.format(jsonId))
+        with open(self.files[jsonId], 'w') as fp:
+          json.dump(self.data[jsonId], fp)
+      for name in names:
+        if name in ('insertNodes', 'expand', 'scroll') and jsonDiffGui is None:
+          print('{:12} skipped: tkinter not available'.format(name))
+          continue
+        results[name] = self.measure(getattr(self, name), memory and name != 'startup')  # startup runs elsewhere
+        result = results[name]
+        print('{:12} {:9.4f}s {:12.0f} nodes/s {:9.1f} MB'.format(
+              name, result['seconds'], result['nodesPerSecond'], result.get('peakMB', 0)), flush=True)
+        if name == 'startup':
+          result.update(self.startupCheck(result['seconds']))
+          for module in result['heavy']:
+            print('{:12} imports {}'.format('', module))
+          if result['overBudget']:
+            print('{:12} over the budget of {}s'.format('', STARTUP_BUDGET))
+    if self.root is not None:
+      self.root.destroy()
+    return results
+
+  def measure(self, bench, memory):
+    """ Best wall time of repeat runs, peak memory of an extra traced run
+    """
+    times = []
+    for i in range(self.repeat):
+      setup = bench(None)                             # untimed preparation
+      gc.collect()
+      start = time.perf_counter()
+      bench(setup)
+      times.append(time.perf_counter() - start)
+    result = {'seconds': min(times),
+              'mean': sum(times) / len(times),
+              'nodes': self.nodes,
+              'nodesPerSecond': self.nodes / min(times) if min(times) else 0}
+    if memory:
+      setup = bench(None)
+      gc.collect()
+      tracemalloc.start()
+      bench(setup)
+      result['peakMB'] = tracemalloc.get_traced_memory()[1] / 1e6
+      tracemalloc.stop()
+    return result
+
+  # every benchmark is called twice: with None for the untimed setup, then timed with the setup
+  def load(self, setup):
+    if setup is None:
+      return True
+    for future in loadFiles((self.files['1'], self.files['2'])):
+      future.result()
+
+  def fingerprint(self, setup):
+    if setup is None:
+      comparison = Comparison(**self.options)
+      comparison.jsonData = dict(self.data)
+      return comparison
+    setup.fingerprint('1')
+    setup.fingerprint('2')
+
+  def compare(self, setup):
+    if setup is None:
+      comparison = Comparison(**self.options)
+      comparison.setJson('1', self.data['1'])
+      comparison.setJson('2', self.data['2'])
+      return comparison
+    setup.compare()
+
+  def recompare(self, setup):
+    """ compare after reloading file2 with the same content
+    """
+    if setup is None:
+      comparison = self.compare(None)
+      comparison.compare()
+      comparison.setJson('2', copy.deepcopy(self.data['2']))
+      return comparison
+    setup.compare()
+
+  def search(self, setup):
+    if setup is None:
+      return True
+    for jsonId in ('1', '2'):
+      index = SearchIndex(self.data[jsonId])
+      for text in WORDS[:3] + ('12', 'true', 'no such text'):
+        index.search(text)
+
+  def app(self):
+    """ App without a window around a compared Comparison
+    """
+    app = jsonDiffGui.App.__new__(jsonDiffGui.App)
+    comparison = self.compare(None)
+    comparison.compare()
+    app.currentComparison = comparison
+    for jsonId in ('1', '2'):
+      if self.tk:
+        if self.root is None:
+          self.root = jsonDiffGui.tk.Tk()
+          self.root.withdraw()
+        comparison.jsonView[jsonId] = jsonDiffGui.ttk.Treeview(self.root)
+      else:
+        comparison.jsonView[jsonId] = HeadlessTree()
+    return app
+
+  def insertNodes(self, setup):
+    if setup is None:
+      return self.app()
+    comparison = setup.currentComparison
+    for jsonId in ('1', '2'):
+      setup.insertNodes(comparison.jsonView[jsonId], comparison.jsonData[jsonId], jsonId)
+
+  def expand(self, setup):
+    """ insertNodes and open every item
+    """
+    if setup is None:
+      return self.app()
+    comparison = setup.currentComparison
+    for jsonId in ('1', '2'):
+      setup.insertNodes(comparison.jsonView[jsonId], comparison.jsonData[jsonId], jsonId)
+      lazy = comparison.jsonLazy[jsonId]
+      while lazy:
+        setup.expandNode(jsonId, next(iter(lazy)))
+
+  def scroll(self, setup):
+    """ Rows of 200 windows of the virtual view, every object/list expanded
+    """
+    if setup is None:
+      trees = []
+      for jsonId in ('1', '2'):
+        tree = jsonView.FlatTree(self.data[jsonId])
+        row = 0
+        while row < len(tree):
+          key, value, path, node = tree.row(row)
+          if node is None and type(value) in (dict, list):
+            tree.expand(path)
+          row += 1
+        trees.append(tree)
+      return trees
+    rng = random.Random(1)
+    for tree in setup:
+      for i in range(200):
+        top = rng.randrange(max(1, len(tree) - WINDOW_ROWS))
+        for row in range(top, min(len(tree), top + WINDOW_ROWS)):
+          key, value, path, node = tree.row(row)
+          itemText(key, value)
+
+  def startup(self, setup):
+    """ jsonDiff.py --cli -q of 2 small files in a new python process
+    """
+    if setup is None:
+      fn = os.path.join(os.path.dirname(self.files['1']), 'startup.json')
+      with open(fn, 'w') as fp:
+        json.dump({'startup': [1, 2, 3]}, fp)
+      return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jsonDiff.py'),
+              '--cli', '-q', fn, fn]
+    subprocess.run(setup, stdout=subprocess.DEVNULL, check=True)
+
+  def startupCheck(self, seconds):
+    """ The heavy modules imported by the startup benchmark, over budget when there are any
+        or its best time, seconds, is above STARTUP_BUDGET
+    """
+    command = self.startup(None)
+    process = subprocess.run(command[:1] + ['-X', 'importtime'] + command[1:], stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, text=True, check=True)
+    modules = [line.rpartition('|')[2].strip() for line in process.stderr.splitlines() if line.startswith('import time:')]
+    heavy = [module for module in modules if module.split('.')[0] in STARTUP_HEAVY]
+    return {'budget': STARTUP_BUDGET,
+            'heavy': heavy,
+            'overBudget': seconds > STARTUP_BUDGET or bool(heavy)}
+
+
+def compareBaseline(results, baseline, threshold):
+  """ Print the changes against a baseline run, returns the regressions
+  """
+  regressions = []
+  for name, result in results['benchmarks'].items():
+    base = baseline.get('benchmarks', {}).get(name)
+    if base is None or not base['seconds']:
+      continue
+    ratio = result['seconds'] / base['seconds']
+    line = '{:12} {:9.4f}s -> {:9.4f}s {:+7.1%}'.format(name, base['seconds'], result['seconds'], ratio - 1)
+    if 'peakMB' in result and base.get('peakMB'):
+      line += '   {:9.1f} MB -> {:9.1f} MB'.format(base['peakMB'], result['peakMB'])
+    if ratio > 1 + threshold:
+      line += '   REGRESSION'
+      regressions.append(name)
+    print(line)
+  return regressions
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description='Benchmark jsonDiff on generated JSON documents')
+  parser.add_argument('--seed', type=int, default=1, help='random seed (default 1)')
+  parser.add_argument('--depth', type=int, default=5, help='levels of objects/lists (default 5)')
+  parser.add_argument('--fanout', type=int, default=8, help='properties per object (default 8)')
+  parser.add_argument('--array', type=int, default=10, help='elements per list (default 10)')
+  parser.add_argument('--scalars', default=SCALARS, help='scalar mix, kind:weight,... (default {})'.format(SCALARS))
+  parser.add_argument('--mutations', type=int, default=100, help='changes in document 2 (default 100)')
+  parser.add_argument('--placement', choices=PLACEMENTS, default='uniform', help='where the changes are made')
+  parser.add_argument('--align', action='store_true', help='compare with list alignment')
+  parser.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark, the best counts (default 3)')
+  parser.add_argument('--benchmarks', default=','.join(BENCHMARKS),
+                      help='comma separated benchmarks (default {})'.format(','.join(BENCHMARKS)))
+  parser.add_argument('--no-memory', action='store_true', help='skip the traced run for the peak memory')
+  parser.add_argument('--tk', action='store_true', help='insert in real Treeviews (needs a display)')
+  parser.add_argument('--output', default=None, help='save the results as JSON')
+  parser.add_argument('--baseline', default=None, help='compare with the results of an earlier run')
+  parser.add_argument('--threshold', type=float, default=0.1,
+                      help='slow down against the baseline reported as regression (default 0.1)')
+  args = parser.parse_args(argv)
+  names = [name for name in args.benchmarks.split(',') if name]
+  for name in names:
+    if name not in BENCHMARKS:
+      parser.error('unknown benchmark: {}'.format(name))
+  try:
+    generator = Generator(args.seed, args.depth, args.fanout, args.array, args.scalars)
+  except ValueError as e:
+    parser.error(str(e))
+
+  data1, data2 = generator.pair(args.mutations, args.placement)
+  bench = Bench(data1, data2, args.repeat, args.tk, {'alignLists': args.align})
+  print('{} nodes, {} mutations ({})'.format(bench.nodes, args.mutations, args.placement))
+  results = {'parameters': {key: value for key, value in vars(args).items()
+                            if key not in ('output', 'baseline')},
+             'python': platform.python_version(),
+             'platform': platform.platform(),
+             'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+             'nodes': bench.nodes,
+             'benchmarks': bench.run(names, not args.no_memory)}
+  if args.output is not None:
+    with open(args.output, 'w') as fp:
+      json.dump(results, fp, indent=2)
+  if args.baseline is not None:
+    with open(args.baseline) as fp:
+      baseline = json.load(fp)
+    if baseline.get('parameters', {}).get('seed') != args.seed or baseline.get('nodes') != bench.nodes:
+      print('Warning: baseline was run on other documents')
+    if compareBaseline(results, baseline, args.threshold):
+      return 1
+  if results['benchmarks'].get('startup', {}).get('overBudget'):
+    return 1
+  return 0
+
+
+if __name__=='__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,108 @@
+import os
+import time
+import zlib
+import marshal
+import hashlib
+
+from jsonComparison import Mismatch, DIGEST_SIZE
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.jsonDiff', 'cache.sqlite')
+CACHE_SIZE = 256 << 20                                # bytes of cached data, least recently used are evicted
+CACHE_VERSION = 2                                     # change when the cached data changes
+CHUNK_SIZE = 1 << 20                                  # bytes read at a time to digest a file
+
+
+class DiffCache:
+  """ Comparison results and fingerprints kept on disk between runs
+
+      Entries are keyed by content digests of the files, so a file that is
+      renamed or touched without changes still hits. Results are also keyed
+      by the comparison options. When the data exceeds maxSize bytes the
+      least recently used entries are evicted
+  """
+  def __init__(self, path=CACHE_PATH, maxSize=CACHE_SIZE):
+    self.path = path
+    self.maxSize = maxSize
+    import sqlite3                                    # only loaded when the cache is used
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Comparisons in GUI tasks use the cache from another thread, one at a time
+    self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    with self.db:
+      self.db.execute('CREATE TABLE IF NOT EXISTS entries '
+                      '(key TEXT PRIMARY KEY, data BLOB, size INTEGER, used REAL)')
+      self.db.execute('CREATE TABLE IF NOT EXISTS files '
+                      '(path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, digest TEXT)')
+
+  def close(self):
+    self.db.close()
+
+  def fileDigest(self, fn):
+    """ Content digest of file fn, only read again when its size or modification time changed
+    """
+    path = os.path.abspath(fn)
+    stat = os.stat(path)
+    row = self.db.execute('SELECT size, mtime, digest FROM files WHERE path = ?', (path,)).fetchone()
+    if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+      return row[2]
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, 'rb') as fp:
+      for chunk in iter(lambda: fp.read(CHUNK_SIZE), b''):
+        h.update(chunk)
+    digest = h.hexdigest()
+    with self.db:
+      self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                      (path, stat.st_size, stat.st_mtime_ns, digest))
+    return digest
+
+  def get(self, key):
+    row = self.db.execute('SELECT data FROM entries WHERE key = ?', (key,)).fetchone()
+    if row is None:
+      return None
+    with self.db:
+      self.db.execute('UPDATE entries SET used = ? WHERE key = ?', (time.time(), key))
+    return row[0]
+
+  def put(self, key, data):
+    """ Save data (bytes), evict the least recently used entries when over maxSize
+    """
+    if len(data) > self.maxSize:
+      return
+    with self.db:
+      self.db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', (key, data, len(data), time.time()))
+      total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+      if total > self.maxSize:
+        for oldKey, size in self.db.execute('SELECT key, size FROM entries ORDER BY used').fetchall():
+          if total <= self.maxSize:
+            break
+          self.db.execute('DELETE FROM entries WHERE key = ?', (oldKey,))
+          total -= size
+
+  def resultKey(self, digest1, digest2, options):
+    options = ','.join('{}={!r}'.format(name, value) for name, value in sorted(options.items()))
+    return 'result:{}:{}:{}:{}:{}'.format(CACHE_VERSION, marshal.version, digest1, digest2, options)
+
+  def getResult(self, digest1, digest2, options):
+    """ Mismatches and limited of a comparison of these files with these options, None when not cached
+    """
+    data = self.get(self.resultKey(digest1, digest2, options))
+    if data is None:
+      return None
+    limited, mismatches = marshal.loads(zlib.decompress(data))
+    return [Mismatch(*mismatch) for mismatch in mismatches], limited
+
+  def putResult(self, digest1, digest2, options, mismatches, limited):
+    mismatches = [(m.kind, m.path, m.path2, m.value1, m.value2, m.file) for m in mismatches]
+    self.put(self.resultKey(digest1, digest2, options),
+             zlib.compress(marshal.dumps((limited, mismatches)), 1))
+
+  def getFingerprints(self, digest):
+    """ The fingerprints of a file in the order of Comparison.fingerprintData, None when not cached
+    """
+    return self.get('fingerprints:{}:{}'.format(CACHE_VERSION, digest))
+
+  def putFingerprints(self, digest, fingerprints):
+    self.put('fingerprints:{}:{}'.format(CACHE_VERSION, digest), fingerprints)
+
+
+if __name__=='__main__':
+  print('to be imported')
@@ -1,50 +1,595 @@
+import bisect
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import math
+import os
+import queue
+import threading
+from json.decoder import scanstring, WHITESPACE
+
+from jsonStats import NO_PHASE
+from jsonLoader import loadsJson
+from jsonRules import PathRules
+
+numpy = False                                         # imported when first needed (loadNumpy), None: not installed
+
+
+MIN_PART = 1 << 16                                    # smaller parts are not worth a worker process
+PROGRESS_STEP = 1 << 12                               # containers compared between progress reports
+DIGEST_SIZE = 16                                      # bytes of a subtree fingerprint
+ITER_BUFFER = 1 << 10                                 # mismatches found ahead of iterMismatches
+NUMERIC_MIN = 64                                      # shorter lists of numbers are compared element by element
+NUMBERS = {int, float}
+CONTAINERS = {dict, list}
+EXACT_FLOAT = 1 << 53                                 # larger ints are not exact as float
+RANGE_SHOWN = 3                                       # values shown in the message of a changed range
+PARSED_SIZE = 6                                       # bytes of parsed json data per byte of the file, about
+HASH_SIZE = 128                                       # bytes of a subtree fingerprint with its table entry
+ITEM_SIZE = 512                                       # bytes of a TreeView item with its path
+MISMATCH_SIZE = 256                                   # bytes of a Mismatch with its paths
+
+# mismatch kinds
+CHANGED = 0
+DIFFERENT_TYPES = 1
+MISSING_PROPERTY = 2
+MISSING_ELEMENT = 3
+MOVED = 4
+CHANGED_RANGE = 5                                     # consecutive elements of numeric lists
+KIND_NAMES = ('changed', 'different types', 'missing property', 'missing element', 'moved', 'changed range')
+
+
+class MismatchLimit(Exception):
+  """ Raised when maxMismatches are found, stops the comparison
+  """
+
+
+class Cancelled(Exception):
+  """ Raised by a progress report to stop the work, see Comparison.enableProgress
+  """
+
+
 class Comparison:
-  def __init__(self, index=0):
+  def __init__(self, index=0, alignLists=False, listKey=None, workers=1, splitDepth=1, maxMismatches=None,
+               ignore=(), include=(), absTol=0.0, relTol=0.0):
     self.tabIndex = index                             # Save tab index (not used at the moment)
+    self.alignLists = alignLists                      # Pair list elements by content instead of index
+    self.listKey = listKey                            # Pair list elements (objects) by this property
+    self.workers = workers                            # Worker processes comparing subtrees
+    self.splitDepth = splitDepth                      # Depth of the subtrees compared by the workers
+    self.maxMismatches = maxMismatches                # Stop comparing at this many mismatches, None: find all
+    self.mismatchCount = 0                            # Initialize mismatches found, counted with maxMismatches
+    self.limited = False                              # Initialize limit reached, compare stopped at maxMismatches
+    if maxMismatches is not None:
+      self.addMismatch = self.limitedAddMismatch
+    self.absTol = absTol                              # Numbers at most this far apart are the same
+    self.relTol = relTol                              # Numbers at most this far apart relative to the largest are the same
+    if absTol or relTol:
+      self.addChanged = self.toleranceAddChanged
     self.jsonPath = {'1': None, '2': None}            # Initialize json file path
     self.jsonData = {'1': None, '2': None}            # Initialize json data
+    self.jsonHash = {'1': None, '2': None}            # Initialize subtree fingerprints, id(subtree): hash
+    self.jsonHashed = {'1': None, '2': None}          # Initialize json data the fingerprints belong to
+    self.jsonDigest = {'1': None, '2': None}          # Initialize file content digest, key of the persistent cache
+    self.cache = None                                 # Initialize persistent cache (jsonCache.DiffCache), None: not used
+    self.diffCache = None                             # Initialize subtree pairs of the last compare
+    self.diffTree = None                              # Initialize subtree pairs of the running compare
+    self.diffPrevious = None                          # Initialize subtree pairs to replay in the running compare
     self.jsonView = {'1': None, '2': None}            # Initialize TreeView
-    self.mismatch = {}                                # Initialize mismatch dict
-    self.mismatchIndex = None                         # Initialize index into mismatch dict
-    self.maxIndex = 0                                 # Initialize max index of mismatch dict
+    self.jsonItems = {'1': {}, '2': {}}               # Initialize TreeView items, path: item
+    self.jsonLazy = {'1': {}, '2': {}}                # Initialize TreeView items with children not inserted yet
+    self.jsonFolds = {'1': {}, '2': {}}               # Initialize TreeView items of folded identical children
+    self.mismatch = []                                # Initialize mismatch list
+    self.mismatchPath = None                          # Initialize mismatches per file, path: Mismatch
+    self.mismatchAncestors = None                     # Initialize paths above mismatches per file, path: child keys
+    self.mismatchIndex = None                         # Initialize index into mismatch list
+    self.maxIndex = 0                                 # Initialize max index of mismatch list
     self.search = {'1': [], '2': []}                  # Initialize search dict
+    self.jsonIndex = {'1': None, '2': None}           # Initialize search index of the json data
     self.searchIndex = {'1': -1, '2': -1}             # Initialize serach dict index
+    self.stats = None                                 # Initialize Stats, None: not instrumented
+    self.profiler = None                              # Initialize profiler, context manager around compare
+    self.progress = None                              # Initialize progress report, None: no reports
+    self.rootPath = ()                                # Initialize path of the json data in the files
+    self.ruleState = None                             # Initialize jsonRules.PathState of the pair being compared
+    self.unloaded = None                              # Initialize (mismatches, mismatchIndex) after unload, None: loaded
+    self.setRules(ignore, include)
       
+  def setRules(self, ignore=(), include=()):
+    """ Leave the paths matching the ignore patterns out of the comparison,
+        with include patterns only compare the paths matching them
+    
+        The patterns are like $.items[*].updatedAt or $..etag, see 
+        jsonRules.PathRules. The fingerprints leave the excluded paths out 
+        too, they are made again
+    """
+    self.ignore = tuple(ignore)
+    self.include = tuple(include)
+    self.rules = PathRules(self.ignore, self.include) if self.ignore or self.include else None
+    self.jsonHash = {'1': None, '2': None}
+    self.jsonHashed = {'1': None, '2': None}
+    self.diffCache = None
+
+  def setJson(self, jsonId, data, fingerprint=True, digest=None):
+    """ Save newly loaded json data and fingerprint it
+    
+        Fingerprints pay off when they are used again: comparing after a
+        reload, with the cache, or one baseline with many variants. For a
+        single compare, fingerprint=False is much cheaper, identical
+        subtrees are then skipped by comparing them with ==. They are
+        still made with alignLists, it pairs list elements by them.
+        digest is the content digest of the file (DiffCache.fileDigest), 
+        with it the fingerprints and results are kept in the cache
+    """
+    self.jsonData[jsonId] = data
+    self.jsonDigest[jsonId] = digest
+    if not fingerprint and not self.alignLists:
+      self.jsonHash[jsonId] = {}
+      self.jsonHashed[jsonId] = data
+    elif self.cache is None or digest is None or self.rules is not None:  # cached without rules
+      self.fingerprint(jsonId)
+    elif not self.cachedFingerprints(jsonId):
+      self.fingerprint(jsonId)
+      self.cache.putFingerprints(digest, b''.join(self.jsonHash[jsonId].values()))
+
+  def fingerprint(self, jsonId):
+    """ Compute a content hash for every object/list in the json data
+    
+        Hashes are stored by id() of the subtree, the json data is kept
+        alive with them so the ids stay valid. Equal hashes mean equal
+        subtrees, so jsonDiff can skip those without walking them. With
+        path rules only what is compared is hashed
+    """
+    with self.phase('fingerprint'):
+      self.fingerprintData(jsonId)
+
+  def cachedFingerprints(self, jsonId):
+    """ Take the fingerprints of jsonId from the cache, returns False when not cached
+    
+        The cache has them in the order fingerprintData computes them, 
+        children before their parent
+    """
+    with self.phase('fingerprint'):
+      fingerprints = self.cache.getFingerprints(self.jsonDigest[jsonId])
+      if fingerprints is None:
+        return False
+      data = self.jsonData[jsonId]
+      containers = containersBelow(data) if type(data) in (dict, list) else []
+      if len(fingerprints) != len(containers) * DIGEST_SIZE:   # not the same data
+        return False
+      table = {}
+      for index, obj in enumerate(containers):
+        table[id(obj)] = fingerprints[index*DIGEST_SIZE:(index+1)*DIGEST_SIZE]
+      self.jsonHash[jsonId] = table
+      self.jsonHashed[jsonId] = data
+      return True
+
+  def fingerprintData(self, jsonId):
+    """ Hash the containers children first (containersBelow), the hash of a 
+        child is part of its parent
+    """
+    table = {}
+    blake2b = hashlib.blake2b
+    def digest(obj):
+      # repr keeps the scalar types apart (1, 1.0, True, '1') and from child hashes (bytes)
+      if type(obj) is dict:
+        parts = [(key, table[id(value)] if type(value) in (dict, list) else value) 
+                 for key, value in obj.items()]
+        table[id(obj)] = blake2b(repr(parts).encode(), digest_size=DIGEST_SIZE, person=b'dict').digest()
+      else:
+        parts = [table[id(value)] if type(value) in (dict, list) else value for value in obj]
+        table[id(obj)] = blake2b(repr(parts).encode(), digest_size=DIGEST_SIZE, person=b'list').digest()
+
+    def ruledDigest(obj, state):
+      # the excluded children are left out, in lists their place is kept
+      if type(obj) is dict:
+        parts = []
+        for key, value in obj.items():
+          child = state.child(key)
+          if child is None or not child.included and type(value) not in (dict, list):
+            continue
+          parts.append((key, table[id(value)] if type(value) in (dict, list) else value))
+        table[id(obj)] = blake2b(repr(parts).encode(), digest_size=DIGEST_SIZE, person=b'dict').digest()
+      else:
+        parts = []
+        for index, value in enumerate(obj):
+          child = state.child(index)
+          if child is None or not child.included and type(value) not in (dict, list):
+            parts.append(...)
+          else:
+            parts.append(table[id(value)] if type(value) in (dict, list) else value)
+        table[id(obj)] = blake2b(repr(parts).encode(), digest_size=DIGEST_SIZE, person=b'list').digest()
+
+    data = self.jsonData[jsonId]
+    if type(data) in (dict, list):
+      if self.rules is None:
+        for obj in containersBelow(data):
+          digest(obj)
+      else:                                                     # like containersBelow, without the excluded ones
+        containers = []
+        stack = [(data, self.rules.stateAt(self.rootPath))]
+        while stack:
+          obj, state = stack.pop()
+          containers.append((obj, state))
+          for key, value in (obj.items() if type(obj) is dict else enumerate(obj)):
+            if type(value) in (dict, list):
+              child = state.child(key)
+              if child is not None:
+                stack.append((value, child))
+        for obj, state in reversed(containers):
+          ruledDigest(obj, state)
+    self.jsonHash[jsonId] = table
+    self.jsonHashed[jsonId] = data
+
   def compare(self):
     """ Compare 2 json data structures
     
-        Both way comparison
+        Both way comparison, done in a single walk of both documents.
+        After reloading a file only the subtrees that changed are compared 
+        again, the mismatches of the others are taken from the last compare.
+        With maxMismatches it stops at that many, limited is set then
+    """
+    previous = (self.mismatch, self.mismatchPath, self.mismatchIndex)
+    self.mismatch = []
+    self.mismatchPath = None
+    self.mismatchIndex = None                                   # old index may be out of range
+    self.mismatchCount = 0
+    self.limited = False
+    if self.progress is not None:
+      self.progressCount = [0, 0]
+    self.ruleState = None if self.rules is None else self.rules.root
+    if self.cachedResult():
+      self.maxIndex = len(self.mismatch) - 1 if self.mismatch else 0
+      return
+    try:
+      if self.workers > 1:
+        with self.phase('compare'), self.profiler or NO_PHASE:
+          self.parallelDiff()
+      else:
+        for jsonId in ('1', '2'):                               # fingerprints missing or outdated?
+          if self.jsonHashed[jsonId] is not self.jsonData[jsonId] or self.jsonHash[jsonId] is None:
+            self.fingerprint(jsonId)
+        with self.phase('compare'), self.profiler or NO_PHASE:
+          self.diffPrevious = self.diffCache
+          self.diffTree = {}
+          try:
+            self.jsonDiff(self.jsonData['1'], self.jsonData['2'])
+            self.diffCache = self.diffTree
+          finally:
+            self.diffTree = self.diffPrevious = None
+    except Cancelled:                                           # keep the result of the last compare
+      self.mismatch, self.mismatchPath, self.mismatchIndex = previous
+      raise
+    except MismatchLimit:                                       # the incremental diff cache is not updated
+      self.limited = True
+    if self.cache is not None and None not in self.jsonDigest.values():
+      self.cache.putResult(self.jsonDigest['1'], self.jsonDigest['2'], self.compareOptions(), 
+                           self.mismatch, self.limited)
+    self.maxIndex = len(self.mismatch) - 1 if self.mismatch else 0
+    if self.stats is not None:
+      self.countMismatches(self.mismatch)
+
+  def cachedResult(self):
+    """ Take the mismatches from the cache when the files were compared before
+    
+        Needs the cache and the digests of both files, not their json data.
+        Returns False when not cached
     """
-    self.mismatch = collections.OrderedDict()
-    self.jsonDiff(self.jsonData['1'], self.jsonData['2'], f='1')
-    self.jsonDiff(self.jsonData['2'], self.jsonData['1'], f='2')
-    self.Index = list(self.mismatch)
-    self.maxIndex = len(self.Index) - 1 if self.Index else 0
+    if self.cache is None or None in self.jsonDigest.values():
+      return False
+    with self.phase('cache'):
+      result = self.cache.getResult(self.jsonDigest['1'], self.jsonDigest['2'], self.compareOptions())
+    if result is None:
+      return False
+    self.mismatch, self.limited = result
+    self.mismatchPath = None
+    self.mismatchIndex = None
+    if self.stats is not None:
+      self.stats.counters['cached results'] += 1
+      self.countMismatches(self.mismatch)
+    return True
+
+  def iterMismatches(self):
+    """ compare(), yielding the mismatches while they are found
     
+        compare runs in a thread, the mismatches are the same and in the 
+        same order, they are saved in mismatch too. With workers > 1 they 
+        come when all workers are done. Closing the generator early stops
+        compare when it is still running, mismatch keeps the result of the 
+        last compare then
+    """
+    if self.workers > 1:                                        # worker results are merged in order at the end
+      self.compare()
+      yield from self.mismatch
+      return
+    found = queue.Queue(ITER_BUFFER)
+    done = object()                                             # end of the mismatches
+    stopped = False
+    error = []
+    hooks = {name: vars(self).get(name) for name in ('addMismatch', 'replayMismatches')}
+    addMismatch = self.addMismatch
+    replayMismatches = self.replayMismatches
+    def add(mismatch):
+      if stopped:
+        raise Cancelled()
+      found.put(mismatch)
+      addMismatch(mismatch)
+    def replay(mismatches, start, end):
+      if stopped:
+        raise Cancelled()
+      count = len(self.mismatch)
+      try:
+        replayMismatches(mismatches, start, end)
+      finally:
+        for mismatch in self.mismatch[count:]:
+          found.put(mismatch)
+    def run():
+      try:
+        self.compare()
+      except Exception as e:
+        error.append(e)
+      finally:
+        found.put(done)
+
+    self.addMismatch = add
+    self.replayMismatches = replay
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    count = 0
+    try:
+      while True:
+        mismatch = found.get()
+        if mismatch is done:
+          break
+        count += 1
+        yield mismatch
+    finally:
+      stopped = True
+      while thread.is_alive():                                  # unblock compare, it stops at the next mismatch
+        try:
+          found.get(timeout=0.1)
+        except queue.Empty:
+          pass
+      for name, hook in hooks.items():                          # back to the methods
+        if hook is None:
+          delattr(self, name)
+        else:
+          setattr(self, name, hook)
+    if error and not isinstance(error[0], Cancelled):
+      raise error[0]
+    if not count:                                               # nothing found while comparing: cached result
+      yield from self.mismatch
+
+  def phase(self, name):
+    """ Context manager timing phase name in the stats, does nothing without stats
+    """
+    return NO_PHASE if self.stats is None else self.stats.phase(name)
+
+  def enableStats(self, stats):
+    """ Count the work done by compare in stats (a jsonStats.Stats)
+    
+        Instrumented versions of pairDiff and containerDiff replace the 
+        methods of this Comparison only, without stats there is no cost.
+        The work of worker processes (workers > 1) is not counted
+    """
+    self.stats = stats
+    self.pairDiff = self.countedPairDiff
+    self.containerDiff = self.countedContainerDiff
+
+  def enableProgress(self, progress):
+    """ Report the progress of compare every PROGRESS_STEP containers
+    
+        progress(containers, nodes, mismatches) gets the containers and 
+        their nodes compared so far. It can raise Cancelled to stop compare,
+        the mismatches of the last compare are kept then. Call after 
+        enableStats, only the single process compare is reported
+    """
+    self.progress = progress
+    self.progressCount = [0, 0]                                 # containers, nodes
+    self.reportedContainerDiff = self.containerDiff
+    self.containerDiff = self.progressContainerDiff
+
+  def progressContainerDiff(self, obj1, obj2, path, path2):
+    count = self.progressCount
+    count[0] += 1
+    count[1] += len(obj1)
+    if not count[0] % PROGRESS_STEP:
+      self.progress(count[0], count[1], len(self.mismatch))
+    yield from self.reportedContainerDiff(obj1, obj2, path, path2)
+
+  def fileState(self, jsonId):
+    """ What is loaded for file jsonId, for restoreFile
+    """
+    return (self.jsonPath[jsonId], self.jsonData[jsonId], self.jsonHash[jsonId], 
+            self.jsonHashed[jsonId], self.jsonDigest[jsonId], self.jsonIndex[jsonId])
+
+  def restoreFile(self, jsonId, state):
+    """ Undo loading a file, when loading or comparing it was cancelled or failed
+    """
+    (self.jsonPath[jsonId], self.jsonData[jsonId], self.jsonHash[jsonId], 
+     self.jsonHashed[jsonId], self.jsonDigest[jsonId], self.jsonIndex[jsonId]) = state
+
+  def memorySize(self):
+    """ Estimated bytes of the json data, fingerprints, mismatches and TreeView items
+    
+        The json data is estimated from the size of its file
+    """
+    size = len(self.mismatch) * MISMATCH_SIZE
+    for jsonId in ('1', '2'):
+      if self.jsonData[jsonId] is not None and self.jsonPath[jsonId] is not None:
+        try:
+          size += os.path.getsize(self.jsonPath[jsonId]) * PARSED_SIZE
+        except OSError:                                         # changed since, not known
+          pass
+      size += len(self.jsonHash[jsonId] or ()) * HASH_SIZE + len(self.jsonItems[jsonId]) * ITEM_SIZE
+    return size
+
+  def unload(self):
+    """ Drop the json data and everything made from it, to free the memory
+    
+        The file paths and digests are kept, unloaded has the number of 
+        mismatches (for getMismatch) and the selected one. Loading the 
+        files and compare() make the rest again
+    """
+    self.unloaded = (len(self.mismatch), self.mismatchIndex)
+    self.maxIndex = 0
+    self.jsonData = {'1': None, '2': None}
+    self.jsonHash = {'1': None, '2': None}
+    self.jsonHashed = {'1': None, '2': None}
+    self.jsonIndex = {'1': None, '2': None}
+    self.jsonItems = {'1': {}, '2': {}}
+    self.jsonLazy = {'1': {}, '2': {}}
+    self.jsonFolds = {'1': {}, '2': {}}
+    self.search = {'1': [], '2': []}
+    self.searchIndex = {'1': -1, '2': -1}
+    self.diffCache = None
+    self.mismatch = []
+    self.mismatchPath = None
+    self.mismatchAncestors = None
+    self.mismatchIndex = None
+
+  def countMismatches(self, mismatches):
+    counters = self.stats.counters
+    counters['mismatches'] += len(mismatches)
+    for kind, count in collections.Counter(mismatch.kind for mismatch in mismatches).items():
+      counters['mismatches ' + KIND_NAMES[kind]] += count
+
+  def countedPairDiff(self, obj1, obj2, path, path2):
+    counters = self.stats.counters
+    counters['pairs'] += 1
+    if not path:
+      counters['nodes'] += 1                                    # the top level
+    if type(obj1) is type(obj2) and type(obj1) in (dict, list):
+      hash1 = self.jsonHash['1'].get(id(obj1))
+      if hash1 is not None and hash1 == self.jsonHash['2'].get(id(obj2)):
+        counters['pruned'] += 1
+    elif type(obj1) not in (dict, list) and type(obj2) not in (dict, list):
+      counters['equalityChecks'] += 1
+    return Comparison.pairDiff(self, obj1, obj2, path, path2)
+
+  def countedContainerDiff(self, obj1, obj2, path, path2):
+    counters = self.stats.counters
+    counters['containers'] += 1
+    if type(obj1) is dict:
+      counters['nodes'] += len(obj1) + sum(1 for prop in obj2 if prop not in obj1)
+      counters['equalityChecks'] += sum(1 for prop, value in obj1.items() 
+                                        if type(value) not in (dict, list) and prop in obj2)
+    else:
+      counters['nodes'] += max(len(obj1), len(obj2))
+      if not (self.alignLists or self.listKey is not None):
+        counters['equalityChecks'] += sum(1 for value in obj1[:len(obj2)] if type(value) not in (dict, list))
+    yield from Comparison.containerDiff(self, obj1, obj2, path, path2)
+    
+  def compareOptions(self):
+    """ Options for the Comparisons in the worker processes
+    """
+    return {'alignLists': self.alignLists, 'listKey': self.listKey, 'maxMismatches': self.maxMismatches,
+            'ignore': self.ignore, 'include': self.include, 'absTol': self.absTol, 'relTol': self.relTol}
+
+  def parallelDiff(self):
+    """ Compare with the subtrees at splitDepth compared by worker processes
+    
+        When the json data is not loaded, the files are only split in parts
+        and every worker parses its own part. Results are merged in the
+        order jsonDiff reports them.
+    """
+    if self.jsonData['1'] is None and self.jsonData['2'] is None and self.jsonPath['1'] is not None:
+      data1 = splitFile(self.jsonPath['1'], self.splitDepth)
+      data2 = splitFile(self.jsonPath['2'], self.splitDepth)
+      self.jsonHash = {'1': {}, '2': {}}                        # parts are fingerprinted by the workers
+    else:
+      for jsonId in ('1', '2'):
+        if self.jsonHashed[jsonId] is not self.jsonData[jsonId] or self.jsonHash[jsonId] is None:
+          self.fingerprint(jsonId)
+      data1 = self.jsonData['1']
+      data2 = self.jsonData['2']
+    if type(data1) is not dict or type(data2) is not dict:      # nothing to split
+      self.mismatch.extend(diffPart(self.compareOptions(), (), data1, data2, root=True))
+    else:
+      self.segments = []                                        # mismatch lists and worker results, in order
+      with concurrent.futures.ProcessPoolExecutor(self.workers) as executor:
+        self.executor = executor
+        try:
+          self.splitDiff(data1, data2, (), 0)
+        except MismatchLimit:                                   # the subtrees after it are not needed
+          pass
+        self.segments.append(self.mismatch)
+        merged = []
+        for segment in self.segments:
+          if isinstance(segment, concurrent.futures.Future):
+            segment = segment.result()
+          merged.extend(segment)
+          if self.maxMismatches is not None and len(merged) >= self.maxMismatches:
+            for segment in self.segments:                       # the workers not started yet are not needed
+              if isinstance(segment, concurrent.futures.Future):
+                segment.cancel()
+            break
+      self.mismatch = merged
+      self.segments = None
+      self.executor = None
+    if self.maxMismatches is not None and len(self.mismatch) >= self.maxMismatches:
+      del self.mismatch[self.maxMismatches:]
+      self.limited = True
+
+  def splitDiff(self, obj1, obj2, path, depth):
+    """ jsonDiff of 2 objects above splitDepth, subtrees are sent to the workers
+    """
+    state = self.ruleState
+    for prop, value1 in obj1.items():
+      propPath = path + (prop,)
+      child = None if state is None else state.child(prop)
+      if state is not None and child is None:                   # excluded by the path rules
+        continue
+      if prop not in obj2:                                      # property missing in file2
+        if state is None or child.included or child.reaches(loadParts(value1)):
+          self.addMissingProperty(propPath, propPath, '1')
+        continue
+      value2 = obj2[prop]
+      if type(value1) is dict and type(value2) is dict and depth + 1 < self.splitDepth:
+        self.ruleState = child
+        self.splitDiff(value1, value2, propPath, depth + 1)
+      elif type(value1) in (dict, list, Part) and type(value2) in (dict, list, Part) and \
+           not (type(value1) is Part and value1.size() < MIN_PART and 
+                type(value2) is Part and value2.size() < MIN_PART):
+        hash1 = self.jsonHash['1'].get(id(value1))
+        if hash1 is not None and hash1 == self.jsonHash['2'].get(id(value2)):
+          continue                                              # identical subtrees
+        self.segments.append(self.mismatch)                     # worker result goes after the mismatches so far
+        self.segments.append(self.executor.submit(diffPart, self.compareOptions(), propPath, value1, value2))
+        self.mismatch = []
+      else:
+        self.mismatch.extend(diffPart(self.compareOptions(), propPath, value1, value2))
+    for prop in obj2:                                           # properties only available in file2
+      if prop not in obj1:
+        child = None if state is None else state.child(prop)
+        if state is None or child is not None and (child.included or child.reaches(loadParts(obj2[prop]))):
+          propPath = path + (prop,)
+          self.addMissingProperty(propPath, propPath, '2')
+
   def getMismatch(self):
-    if not self.maxIndex:
+    maxIndex = self.maxIndex if self.unloaded is None else max(self.unloaded[0] - 1, 0)
+    if not maxIndex:
       msg = 'The files are the same'
     elif self.mismatchIndex is None:
-      msg = 'Found {} mismatches'.format(self.maxIndex+1)
+      msg = 'Found {} mismatches'.format(maxIndex+1)
     else:
-      mismatch = self.Index[self.mismatchIndex]
-      msg = self.mismatch[mismatch]['error']
+      msg = self.mismatch[self.mismatchIndex].error
     return msg 
 
   def firstMismatch(self):
     self.mismatchIndex = 0
     if not self.maxIndex:
       return
-    mismatch = self.Index[self.mismatchIndex]
-    return self.mismatch[mismatch]
+    return self.mismatch[self.mismatchIndex]
 
     
   def lastMismatch(self):
     self.mismatchIndex =  self.maxIndex
     if not self.maxIndex:
       return
-    mismatch = self.Index[self.mismatchIndex]
-    return self.mismatch[mismatch]
+    return self.mismatch[self.mismatchIndex]
     
   def nextMismatch(self):
     if not self.maxIndex:
@@ -53,8 +598,7 @@ class Comparison:
       self.mismatchIndex = 0
     elif self.mismatchIndex < self.maxIndex:
       self.mismatchIndex += 1
-    mismatch = self.Index[self.mismatchIndex]
-    return self.mismatch[mismatch]
+    return self.mismatch[self.mismatchIndex]
     
   def prevMismatch(self):
     if not self.maxIndex:
@@ -63,57 +607,772 @@ class Comparison:
       self.mismatchIndex = self.maxIndex
     elif self.mismatchIndex > 0:
       self.mismatchIndex -= 1
-    mismatch = self.Index[self.mismatchIndex]
-    return self.mismatch[mismatch]
+    return self.mismatch[self.mismatchIndex]
     
-  def jsonDiff(self, obj1, obj2, path='$', f=''):
-    if obj1 == obj2:                                            # the same
-      return                                                    # no need to continue
+  def addMismatch(self, mismatch):
+    """ Save a mismatch
+    """
+    self.mismatch.append(mismatch)
+
+  def limitedAddMismatch(self, mismatch):
+    """ addMismatch of a Comparison with maxMismatches
+    """
+    type(self).addMismatch(self, mismatch)
+    self.mismatchCount += 1
+    self.checkLimit()
+
+  def replayMismatches(self, mismatches, start, end):
+    """ Add mismatches[start:end], found by the last compare
+    """
+    if self.rules is not None:                                  # fingerprints leave out the excluded parts
+      mismatches = [self.currentValues(mismatch) for mismatch in itertools.islice(mismatches, start, end)]
+      start, end = 0, len(mismatches)
+    if self.maxMismatches is None:
+      self.mismatch.extend(itertools.islice(mismatches, start, end))
+      return
+    end = min(end, start + self.maxMismatches - self.mismatchCount)
+    self.mismatch.extend(itertools.islice(mismatches, start, end))
+    self.mismatchCount += end - start
+    self.checkLimit()
+
+  def currentValues(self, mismatch):
+    """ mismatch with the objects/lists it shows from the data compared now
+    
+        With path rules equal fingerprints only mean the compared parts are
+        equal, the excluded parts of a value shown may have changed
+    """
+    if mismatch.kind == CHANGED_RANGE or \
+       type(mismatch.value1) not in (dict, list) and type(mismatch.value2) not in (dict, list):
+      return mismatch
+    values = {'1': mismatch.value1, '2': mismatch.value2}
+    for jsonId, path in (('1', mismatch.path), ('2', mismatch.path2)):
+      if type(values[jsonId]) in (dict, list):
+        value = self.jsonData[jsonId]
+        for key in path:
+          value = value[key]
+        values[jsonId] = value
+    return Mismatch(mismatch.kind, mismatch.path, mismatch.path2, values['1'], values['2'], mismatch.file)
+
+  def checkLimit(self):
+    """ Stop the comparison when maxMismatches are found
+    """
+    if self.mismatchCount >= self.maxMismatches:
+      raise MismatchLimit()
+
+  def addChanged(self, path, value1, value2, path2=None):
+    self.addMismatch(Mismatch(CHANGED, path, path if path2 is None else path2, value1, value2))
+
+  def toleranceAddChanged(self, path, value1, value2, path2=None):
+    """ addChanged of a Comparison with absTol or relTol, numbers close enough are the same
+    """
+    if type(value1) in NUMBERS and type(value2) in NUMBERS and \
+       math.isclose(value1, value2, rel_tol=self.relTol, abs_tol=self.absTol):
+      return
+    type(self).addChanged(self, path, value1, value2, path2)
+
+  def addChangedRange(self, path, start, end, list1, list2, path2=None):
+    self.addMismatch(Mismatch(CHANGED_RANGE, path + (start,), (path if path2 is None else path2) + (start,), 
+                              list1[start:end], list2[start:end]))
+
+  def addTypeMismatch(self, path, path2=None):
+    self.addMismatch(Mismatch(DIFFERENT_TYPES, path, path if path2 is None else path2))
+
+  def addMissingProperty(self, path, path2, f):
+    self.addMismatch(Mismatch(MISSING_PROPERTY, path, path2, file=f))
+
+  def addMissingElement(self, path, path2, value, f):
+    if f == '1':
+      self.addMismatch(Mismatch(MISSING_ELEMENT, path, path2, value1=value, file=f))
+    else:
+      self.addMismatch(Mismatch(MISSING_ELEMENT, path, path2, value2=value, file=f))
+
+  def addMoved(self, path, path2):
+    self.addMismatch(Mismatch(MOVED, path, path2))
+
+  def findMismatch(self, path, f):
+    """ Mismatch of path (text) in file f, None when there is no mismatch
+    """
+    if self.mismatchPath is None:
+      self.indexMismatches()
+    return self.mismatchPath[f].get(path)
+
+  def mismatchChildren(self, path, f):
+    """ Keys of the children of path (text) in file f with mismatches at or below 
+        them, None when there are no mismatches below path
+    """
+    if self.mismatchPath is None:
+      self.indexMismatches()
+    return self.mismatchAncestors[f].get(path)
+
+  def indexMismatches(self):
+    """ Index the mismatches per file by path, and the paths above them
+    
+        The elements of a changed range are indexed one by one
+    """
+    self.mismatchPath = {'1': {}, '2': {}}
+    self.mismatchAncestors = {'1': {}, '2': {}}
+    for mismatch in self.mismatch:
+      for f, path in (('1', mismatch.path), ('2', mismatch.path2)):
+        if path is None:
+          continue
+        paths = self.mismatchPath[f]
+        ancestors = self.mismatchAncestors[f]
+        if mismatch.kind == CHANGED_RANGE:
+          parent = path[:-1]
+          elements = range(path[-1], path[-1] + len(mismatch.value1))
+          for index in elements:
+            paths.setdefault(pathText(parent + (index,)), mismatch)
+          ancestors.setdefault(pathText(parent), set()).update(elements)
+          path = parent
+        else:
+          paths.setdefault(pathText(path), mismatch)
+        for depth in range(len(path) - 1, -1, -1):              # up to the first path already indexed
+          keys = ancestors.setdefault(pathText(path[:depth]), set())
+          if path[depth] in keys:
+            break
+          keys.add(path[depth])
+
+  def jsonDiff(self, obj1, obj2, path=(), path2=None):
+    """ Compare obj1 (file1) with obj2 (file2)
+    
+        Single pass: every node pair is visited once, properties and list
+        elements missing in either file are reported on the way.
+        Paths are tuples of keys and list indexes, path2 is the path in 
+        file2 when it differs from path in file1. The containers being
+        compared are kept on a stack, not in python frames, so documents
+        of any depth json.loads accepts can be compared
+    """
+    walk = self.pairDiff(obj1, obj2, path, path2)
+    if walk is None:
+      return
+    stack = [walk]
+    while stack:
+      for pair in stack[-1]:                                    # a child pair to go deeper for
+        walk = self.pairDiff(*pair)
+        if walk is not None:
+          stack.append(walk)
+          break
+      else:                                                     # all children compared
+        stack.pop()
+
+  def pairDiff(self, obj1, obj2, path, path2):
+    """ Compare one pair of nodes, returns the walk of their contents or None
+    
+        The walk (see containerDiff) yields the pairs of children jsonDiff
+        compares next
+    """
     oType1 = type(obj1)                                         # get object1 type
-    oType2 = type(obj2)                                         # get object1 type
-    if oType1 != oType2:                                        # different type
-      if not path in self.mismatch:                             # mismatch already seen?
-        # nope: save the mismatch
-        error = ' Mismatch: {} different types'.format(path) 
-        self.mismatch[path] = {'error':error, 'node': []}
+    oType2 = type(obj2)                                         # get object2 type
+    if oType1 is not oType2:                                    # different type
+      if obj1 != obj2 and (self.ruleState is None or                # (1 == 1.0 is still the same)
+                           self.ruleState.reaches(obj1) or self.ruleState.reaches(obj2)):
+        self.addTypeMismatch(path, path2)
       return                                                    # no need to continue
-    if oType1 in (dict,):                                       # start comparing object contents
-      for prop in obj1:                                         # 1 key/property at a time
-        propPath = '{}.{}'.format(path, prop)                   # create 'path' name
-        propType = type(obj1[prop])                             # determine the type
+    if oType1 is dict or oType1 is list:                        # compare subtree fingerprints first
+      hash1 = self.jsonHash['1'].get(id(obj1))
+      hash2 = self.jsonHash['2'].get(id(obj2))
+      if hash1 is None or hash2 is None:                        # not fingerprinted: == is cheap on scalars only,
+        if CONTAINERS.isdisjoint(map(type, obj1.values() if oType1 is dict else obj1)) and obj1 == obj2:
+          return                                                # deeper subtrees would be compared again per level
+      elif hash1 == hash2:
+        return                                                  # identical subtrees, no need to continue
+      if self.diffTree is not None and hash1 is not None and hash2 is not None:
+        return self.cachedDiff(obj1, obj2, path, path2, hash1, hash2)
+      return self.containerDiff(obj1, obj2, path, path2)
+    elif obj1 != obj2 and (self.ruleState is None or self.ruleState.included):  # for 'normal' properties save mismatch
+      self.addChanged(path, obj1, obj2, path2)
+
+  def cachedDiff(self, obj1, obj2, path, path2, hash1, hash2):
+    """ containerDiff, unless the pair was compared by the last compare
+    
+        Every compared pair is saved with its fingerprints, its part of the 
+        mismatches and the pairs compared below it. A pair with the same 
+        fingerprints as last time gets the same mismatches.
+    """
+    key = (path, path2)
+    previous = self.diffPrevious.get(key) if self.diffPrevious else None
+    if previous is not None and previous[0] == hash1 and previous[1] == hash2:
+      self.diffTree[key] = previous
+      self.replayMismatches(previous[2], previous[3], previous[4])
+      return
+    tree = self.diffTree
+    previousTree = self.diffPrevious
+    self.diffTree = {}
+    self.diffPrevious = previous and previous[5]
+    start = len(self.mismatch)
+    yield from self.containerDiff(obj1, obj2, path, path2)
+    tree[key] = (hash1, hash2, self.mismatch, start, len(self.mismatch), self.diffTree)
+    self.diffTree = tree
+    self.diffPrevious = previousTree
+
+  def containerDiff(self, obj1, obj2, path, path2):
+    """ Compare the contents of 2 objects or 2 lists
+    
+        Generator: the child containers are not compared here, their pairs
+        are yielded to jsonDiff
+    """
+    if self.ruleState is not None:
+      yield from self.ruledContainerDiff(obj1, obj2, path, path2)
+      return
+    oType1 = type(obj1)
+    if oType1 is dict:                                          # start comparing object contents
+      for prop, value1 in obj1.items():                         # 1 key/property at a time
         if prop in obj2:                                        # check if it is available in object2
-          if obj1[prop] != obj2[prop]:                          # check if it is not the same
-            if propType in (dict, list):                        # yes, go deeper if needed for additional object or list
-              self.jsonDiff(obj1[prop], obj2[prop], path=propPath, f=f)
-            else:                                               # for 'normal' properties print mismatch message
-              if propPath not in self.mismatch:                 # check if mismatch already seen
-                # nope: save the mismatch
-                error = ' Mismatch: {} - {} != {}'.format(propPath, obj1[prop], obj2[prop])
-                self.mismatch[propPath] = {'error':error, 'node': []}
-        else:                                                   # property missing
-          error = ' Missing property:  file{} {}: {}'.format(f, propPath, prop)
-          self.mismatch[propPath] = {'error':error, 'node': []}
-    elif oType1 in (list,):                                     # start comparing list contents
-      for idx, prop in enumerate(obj1):                         # 1 element at a time
-        propPath = '{}[{}]'.format(path, idx)                   # indicate list index
-        propType = type(prop)                                   # get element type
-        try:
-          if obj2[idx] != prop:                                 # check if not the same
-            if propType in (dict, list):                        # yes, go deeper if needed for additional object or list
-              self.jsonDiff(prop, obj2[idx], path=propPath, f=f)
-            else:                                               # for 'normal' properties print mismatch message
-              if propPath not in self.mismatch:                 # check if mismatch already seen
-                # nope, save and print message
-                error = ' Mismatch: {} - {} != {}'.format(propPath, prop, obj2[idx])
-                self.mismatch[propPath] = {'error':error, 'node': []}
-        except IndexError:
-          error = ' Missing list element: file{} {} - {}'.format(f,propPath, prop)
-          self.mismatch[propPath] = {'error':error, 'node': []}
-    else:                                                          # for 'normal' properties print mismatch message
-      if path not in mismatch:
-        error = ' Mismatch: {} - {} != {}'.format(path, obj1, obj2)
-        self.mismatch[path] = {'error':error, 'node': []}
-    return
+          value2 = obj2[prop]
+          if value1 is value2:                                  # the same object, nothing to compare
+            continue
+          if type(value1) in (dict, list):                      # go deeper for additional object or list
+            yield value1, value2, path + (prop,), None if path2 is None else path2 + (prop,)
+          elif value1 != value2:                                # 'normal' property not the same
+            self.addChanged(path + (prop,), value1, value2, None if path2 is None else path2 + (prop,))
+        else:                                                   # property missing in file2
+          propPath = path + (prop,)
+          self.addMissingProperty(propPath, propPath if path2 is None else path2 + (prop,), '1')
+      for prop in obj2:                                         # properties only available in file2
+        if prop not in obj1:
+          propPath = path + (prop,)
+          self.addMissingProperty(propPath, propPath if path2 is None else path2 + (prop,), '2')
+    elif self.alignLists or self.listKey is not None:
+      yield from self.alignDiff(obj1, obj2, path, path if path2 is None else path2)
+    else:                                                       # start comparing list contents
+      len1 = len(obj1)
+      len2 = len(obj2)
+      shared = min(len1, len2)
+      first = shared if shared >= NUMERIC_MIN and self.numericDiff(obj1, obj2, path, path2) else 0
+      for idx in range(first, shared):                          # 1 element pair at a time
+        value1 = obj1[idx]
+        value2 = obj2[idx]
+        if value1 is value2:                                    # the same object, nothing to compare
+          continue
+        if type(value1) in (dict, list):                        # go deeper for additional object or list
+          yield value1, value2, path + (idx,), None if path2 is None else path2 + (idx,)
+        elif value1 != value2:                                  # 'normal' element not the same
+          self.addChanged(path + (idx,), value1, value2, None if path2 is None else path2 + (idx,))
+      for idx in range(len2, len1):                             # elements missing in file2
+        propPath = path + (idx,)
+        self.addMissingElement(propPath, propPath if path2 is None else None, obj1[idx], '1')
+      for idx in range(len1, len2):                             # elements only available in file2
+        if path2 is None:
+          propPath = path + (idx,)
+          self.addMissingElement(propPath, propPath, obj2[idx], '2')
+        else:
+          self.addMissingElement(None, path2 + (idx,), obj2[idx], '2')
+
+  def ruledContainerDiff(self, obj1, obj2, path, path2):
+    """ containerDiff with path rules, the children they exclude are not compared
+    
+        ruleState is the PathState of the pair, it is set to the state of 
+        a child before comparing the child
+    """
+    state = self.ruleState
+    if type(obj1) is dict:
+      for prop, value1 in obj1.items():
+        child = state.child(prop)
+        if child is None:                                       # excluded, not even looked at
+          continue
+        if prop in obj2:
+          value2 = obj2[prop]
+          if value1 is value2:
+            continue
+          if type(value1) in (dict, list):
+            self.ruleState = child
+            yield value1, value2, path + (prop,), None if path2 is None else path2 + (prop,)
+          elif value1 != value2 and child.reaches(value2):
+            self.addChanged(path + (prop,), value1, value2, None if path2 is None else path2 + (prop,))
+        elif child.reaches(value1):
+          propPath = path + (prop,)
+          self.addMissingProperty(propPath, propPath if path2 is None else path2 + (prop,), '1')
+      for prop in obj2:
+        if prop not in obj1 and state.childReaches(prop, obj2[prop]):
+          propPath = path + (prop,)
+          self.addMissingProperty(propPath, propPath if path2 is None else path2 + (prop,), '2')
+    elif self.alignLists or self.listKey is not None:
+      yield from self.alignDiff(obj1, obj2, path, path if path2 is None else path2)
+    else:
+      len1 = len(obj1)
+      len2 = len(obj2)
+      shared = min(len1, len2)
+      first = 0
+      if shared >= NUMERIC_MIN and not state.indexes:         # all elements have the same state
+        child = state.child(0)
+        if child is not None and child.included and self.numericDiff(obj1, obj2, path, path2):
+          first = shared
+      for idx in range(first, shared):
+        child = state.child(idx)
+        if child is None:
+          continue
+        value1 = obj1[idx]
+        value2 = obj2[idx]
+        if value1 is value2:
+          continue
+        if type(value1) in (dict, list):
+          self.ruleState = child
+          yield value1, value2, path + (idx,), None if path2 is None else path2 + (idx,)
+        elif value1 != value2 and child.reaches(value2):
+          self.addChanged(path + (idx,), value1, value2, None if path2 is None else path2 + (idx,))
+      for idx in range(len2, len1):
+        if state.childReaches(idx, obj1[idx]):
+          propPath = path + (idx,)
+          self.addMissingElement(propPath, propPath if path2 is None else None, obj1[idx], '1')
+      for idx in range(len1, len2):
+        if state.childReaches(idx, obj2[idx]):
+          if path2 is None:
+            propPath = path + (idx,)
+            self.addMissingElement(propPath, propPath, obj2[idx], '2')
+          else:
+            self.addMissingElement(None, path2 + (idx,), obj2[idx], '2')
+
+  def numericDiff(self, list1, list2, path, path2):
+    """ Compare the elements 2 lists of numbers have in common in bulk
+    
+        A run of differing elements is one CHANGED_RANGE mismatch. Returns
+        False when the lists are not both all numbers
+    """
+    if type(list1[0]) not in NUMBERS:                           # lists of objects, no need to look further
+      return False
+    types = set(map(type, list1))
+    types.update(map(type, list2))
+    if not types <= NUMBERS:
+      return False
+    count = min(len(list1), len(list2))
+    for start, end in differentRanges(list1, list2, count, self.absTol, self.relTol, int in types):
+      if end - start == 1:
+        self.addChanged(path + (start,), list1[start], list2[start], None if path2 is None else path2 + (start,))
+      else:
+        self.addChangedRange(path, start, end, list1, list2, path2)
+    return True
+
+  def hasListKey(self, elements):
+    """ Check if all elements are objects with a (scalar) listKey property
+    """
+    key = self.listKey
+    return key is not None and \
+           all(type(element) is dict and key in element and type(element[key]) not in (dict, list) 
+               for element in elements)
+
+  def elementIds(self, elements, f, keyed):
+    """ Identity of list elements for alignDiff
+    
+        The listKey value when keyed, else the fingerprint (objects/lists)
+        or type and value
+    """
+    if keyed:
+      key = self.listKey
+      return [(type(element[key]), element[key]) for element in elements]
+    table = self.jsonHash[f]
+    return [table.get(id(element), id(element)) if type(element) in (dict, list) else (type(element), element)
+            for element in elements]
+
+  def alignDiff(self, list1, list2, path, path2):
+    """ Compare lists by pairing elements with the same identity (elementIds)
+        instead of by index
+    
+        Elements that can not be paired are reported as missing, paired
+        elements out of order as moved. Without listKey, elements that are
+        not paired but are at the same place between paired elements, are 
+        compared with each other (changed in place).
+    """
+    len1 = len(list1)
+    len2 = len(list2)
+    keyed = self.hasListKey(list1) and self.hasListKey(list2)
+    ids1 = self.elementIds(list1, '1', keyed)
+    ids2 = self.elementIds(list2, '2', keyed)
+    first = 0                                                   # skip the common start and end
+    while first < len1 and first < len2 and ids1[first] == ids2[first]:
+      first += 1
+    last1 = len1
+    last2 = len2
+    while last1 > first and last2 > first and ids1[last1 - 1] == ids2[last2 - 1]:
+      last1 -= 1
+      last2 -= 1
+    shift = last2 - last1
+
+    positions = {}                                              # identity: indexes in list2, last first
+    for j in range(last2 - 1, first - 1, -1):
+      if ids2[j] in positions:
+        positions[ids2[j]].append(j)
+      else:
+        positions[ids2[j]] = [j]
+    match1 = {}                                                 # index in list2 of the paired element
+    match2 = {}                                                 # index in list1 of the paired element
+    for i in range(first, last1):
+      indexes = positions.get(ids1[i])
+      if indexes:
+        j = indexes.pop()
+        match1[i] = j
+        match2[j] = i
+    paired = sorted(match1)
+    inOrder = set(paired[k] for k in longestIncreasing([match1[i] for i in paired]))
+    moved = set(paired) - inOrder
+    if not keyed:                                               # pair what's left between elements in order
+      prev1 = prev2 = first - 1
+      for i in sorted(inOrder) + [last1]:
+        j = match1[i] if i < last1 else last2
+        free1 = [x for x in range(prev1 + 1, i) if x not in match1]
+        free2 = [y for y in range(prev2 + 1, j) if y not in match2]
+        for x, y in zip(free1, free2):
+          match1[x] = y
+          match2[y] = x
+        prev1, prev2 = i, j
+
+    hash1 = self.jsonHash['1']
+    hash2 = self.jsonHash['2']
+    state = self.ruleState                                      # path rules, elements are matched by their index in file1
+    # equal identities without listKey are equal elements, only the middle part is left
+    for i in range(0, len1) if keyed else range(first, last1):
+      j = i if i < first else i + shift if i >= last1 else match1.get(i, -1)
+      if j < 0:                                                 # element missing in file2
+        if state is None or state.childReaches(i, list1[i]):
+          self.addMissingElement(path + (i,), None, list1[i], '1')
+        continue
+      value1 = list1[i]
+      value2 = list2[j]
+      if i not in moved:                                        # skip equal elements before building paths
+        if value1 is value2:
+          continue
+        if type(value1) in (dict, list):
+          if hash1.get(id(value1), 1) == hash2.get(id(value2), 2):
+            continue
+        elif type(value2) not in (dict, list) and value1 == value2:
+          continue
+      if state is not None:
+        child = state.child(i)
+        if child is None:
+          continue
+        self.ruleState = child
+      propPath = path + (i,)
+      propPath2 = path2 + (j,)
+      if i in moved and (state is None or child.reaches(value1)):
+        self.addMoved(propPath, propPath2)
+      if value1 is value2:
+        continue
+      if type(value1) in (dict, list):                          # go deeper for additional object or list
+        yield value1, value2, propPath, None if propPath == propPath2 else propPath2
+      elif value1 != value2 and (state is None or child.reaches(value2)):
+        self.addChanged(propPath, value1, value2, None if propPath == propPath2 else propPath2)
+    for j in range(first, last2):
+      if j not in match2 and (state is None or state.childReaches(j, list2[j])):  # element only available in file2
+        self.addMissingElement(None, path2 + (j,), list2[j], '2')
+
+
+class Mismatch:
+  """ A mismatch between file1 and file2
   
+      Only the kind, paths and values are saved, the path texts and the 
+      message are formatted when they are shown. path is the path in file1,
+      path2 the path in file2, None when not available in that file
+  """
+  __slots__ = ('kind', 'path', 'path2', 'value1', 'value2', 'file')
+
+  def __init__(self, kind, path, path2, value1=None, value2=None, file=None):
+    self.kind = kind
+    self.path = path                                  # tuple of keys and list indexes
+    self.path2 = path2
+    self.value1 = value1
+    self.value2 = value2
+    self.file = file                                  # file with the missing property/element
+
+  def jsonPath(self, f):
+    """ Path text in file f, None when not available in that file
+    """
+    path = self.path if f == '1' else self.path2
+    return None if path is None else pathText(path)
+
+  def asDict(self):
+    """ Mismatch as json data, paths are lists of keys and list indexes
+    """
+    result = {'kind': KIND_NAMES[self.kind], 
+              'path1': None if self.path is None else list(self.path),
+              'path2': None if self.path2 is None else list(self.path2)}
+    if self.kind in (MISSING_PROPERTY, MISSING_ELEMENT):
+      result['file'] = self.file
+    if self.kind == CHANGED_RANGE:                              # path1 and path2 are of the first element
+      result['end'] = self.path[-1] + len(self.value1)
+    if self.kind in (CHANGED, CHANGED_RANGE) or self.kind == MISSING_ELEMENT and self.file == '1':
+      result['value1'] = self.value1
+    if self.kind in (CHANGED, CHANGED_RANGE) or self.kind == MISSING_ELEMENT and self.file == '2':
+      result['value2'] = self.value2
+    return result
+
+  @property
+  def error(self):
+    """ Mismatch message
+    """
+    kind = self.kind
+    if kind == CHANGED:
+      return ' Mismatch: {} - {} != {}'.format(pathText(self.path), self.value1, self.value2)
+    if kind == DIFFERENT_TYPES:
+      return ' Mismatch: {} different types'.format(pathText(self.path))
+    if kind == MISSING_PROPERTY:
+      path = self.path if self.file == '1' else self.path2
+      return ' Missing property:  file{} {}: {}'.format(self.file, pathText(path), path[-1])
+    if kind == MISSING_ELEMENT:
+      if self.file == '1':
+        return ' Missing list element: file1 {} - {}'.format(pathText(self.path), self.value1)
+      return ' Missing list element: file2 {} - {}'.format(pathText(self.path2), self.value2)
+    if kind == CHANGED_RANGE:
+      start = self.path[-1]
+      return ' Mismatch: {}[{}:{}] - {} values {} != {}'.format(pathText(self.path[:-1]), start, 
+                                                                start + len(self.value1), len(self.value1), 
+                                                                rangeText(self.value1), rangeText(self.value2))
+    return ' Moved list element: {} -> {}'.format(pathText(self.path), pathText(self.path2))
+
+
+def pathText(path):
+  """ json path text of a path tuple
+  """
+  return '$' + ''.join('[{}]'.format(segment) if type(segment) is int else '.{}'.format(segment) 
+                       for segment in path)
+
+
+def containersBelow(data):
+  """ The objects and lists in data (itself one), children before their parent
+  
+      A stack instead of recursion: any depth json.loads accepts
+  """
+  containers = []
+  stack = [data]
+  while stack:                                        # right to left, reversed below
+    obj = stack.pop()
+    containers.append(obj)
+    stack.extend([value for value in (obj.values() if type(obj) is dict else obj) if type(value) in CONTAINERS])
+  containers.reverse()
+  return containers
+
+
+def rangeText(values):
+  """ The first values of a changed range
+  """
+  shown = ', '.join(str(value) for value in values[:RANGE_SHOWN])
+  return '[{}]'.format(shown if len(values) <= RANGE_SHOWN else shown + ', ...')
+
+
+def differentRanges(list1, list2, count, absTol=0.0, relTol=0.0, ints=True):
+  """ (start, end) of the runs of indexes below count where 2 lists of numbers differ
+  
+      Numbers at most absTol apart, or relTol apart relative to the largest
+      of the two, are the same (math.isclose). Compared with numpy when it
+      is installed, ints is set when the lists can have ints
+  """
+  if loadNumpy() is not None:
+    ranges = numpyRanges(list1, list2, count, absTol, relTol, ints)
+    if ranges is not None:
+      return ranges
+  return pythonRanges(list1, list2, count, absTol, relTol)
+
+
+def loadNumpy():
+  """ numpy, imported the first time a numeric list is compared, None when it is not installed
+
+      Importing numpy takes longer than starting the rest of jsonDiff, files
+      without long lists of numbers do not need it
+  """
+  global numpy
+  if numpy is False:
+    try:
+      import numpy
+    except ImportError:                               # optional, numeric lists are compared in python instead
+      numpy = None
+  return numpy
+
+
+def pythonRanges(list1, list2, count, absTol, relTol):
+  ranges = []
+  tolerance = absTol or relTol
+  start = end = -1
+  for index, value1, value2 in zip(range(count), list1, list2):
+    if value1 != value2 and value1 is not value2 and \
+       not (tolerance and math.isclose(value1, value2, rel_tol=relTol, abs_tol=absTol)):
+      if index != end:                                          # a new run
+        if end >= 0:
+          ranges.append((start, end))
+        start = index
+      end = index + 1
+  if end >= 0:
+    ranges.append((start, end))
+  return ranges
+
+
+def numpyRanges(list1, list2, count, absTol, relTol, ints):
+  """ differentRanges with numpy, None when the numbers do not fit a float exactly
+  """
+  try:
+    array1 = numpy.fromiter(list1, numpy.float64, count)
+    array2 = numpy.fromiter(list2, numpy.float64, count)
+  except OverflowError:                                         # int too large for a float
+    return None
+  if ints and count and max(numpy.abs(array1).max(), numpy.abs(array2).max()) >= EXACT_FLOAT:
+    return None
+  different = array1 != array2
+  if absTol or relTol:
+    with numpy.errstate(invalid='ignore'):                      # inf - inf
+      largest = numpy.maximum(numpy.abs(array1), numpy.abs(array2))
+      close = numpy.abs(array1 - array2) <= numpy.maximum(absTol, relTol * largest)
+    different &= ~(close & numpy.isfinite(largest))             # like math.isclose, inf is only close to itself
+  for index in numpy.flatnonzero(numpy.isnan(array1) & numpy.isnan(array2)).tolist():
+    if list1[index] is list2[index]:                            # the same nan object, like jsonDiff
+      different[index] = False
+  indexes = numpy.flatnonzero(different)
+  if not len(indexes):
+    return []
+  breaks = numpy.flatnonzero(numpy.diff(indexes) != 1)          # last index of a run, except the last run
+  starts = indexes[numpy.concatenate(([0], breaks + 1))]
+  ends = indexes[numpy.concatenate((breaks, [len(indexes) - 1]))] + 1
+  return list(zip(starts.tolist(), ends.tolist()))
+
+
+def longestIncreasing(values):
+  """ Indexes of a longest increasing subsequence of values
+  """
+  tails = []                                                    # smallest last index of length k+1
+  tailValues = []
+  prev = [-1] * len(values)
+  for idx, value in enumerate(values):
+    k = bisect.bisect_left(tailValues, value)
+    if k:
+      prev[idx] = tails[k - 1]
+    if k == len(tails):
+      tails.append(idx)
+      tailValues.append(value)
+    else:
+      tails[k] = idx
+      tailValues[k] = value
+  result = []
+  idx = tails[-1] if tails else -1
+  while idx >= 0:
+    result.append(idx)
+    idx = prev[idx]
+  return result[::-1]
+
+
+class Part:
+  """ Part of a json file, loaded by the worker process comparing it
+  """
+  __slots__ = ('fn', 'start', 'end')
+
+  def __init__(self, fn, start, end):
+    self.fn = fn                                      # file name
+    self.start = start                                # byte offsets in the file
+    self.end = end
+
+  def size(self):
+    return self.end - self.start
+
+  def read(self):
+    with open(self.fn, 'rb') as fp:
+      fp.seek(self.start)
+      return fp.read(self.end - self.start)
+
+
+def splitFile(fn, depth):
+  """ Load the objects of a json file down to depth, objects and lists
+      deeper than that are left in the file as Part
+  """
+  with open(fn, 'rb') as fp:
+    raw = fp.read()
+  text = raw.decode('utf-8')
+  size = len(raw)
+  raw = None
+  decoder = json.JSONDecoder()
+  skipper = json.JSONDecoder(object_pairs_hook=lambda pairs: None)  # parse without keeping objects
+  last = [0, 0]                                       # last character and byte offset
+
+  def byteOffset(pos):
+    if size == len(text):                             # ascii
+      return pos
+    last[1] += len(text[last[0]:pos].encode('utf-8'))
+    last[0] = pos
+    return last[1]
+
+  def scan(pos, depth):
+    pos = WHITESPACE.match(text, pos).end()
+    c = text[pos:pos+1]
+    if c == '{' and depth > 0:
+      obj = {}
+      pos = WHITESPACE.match(text, pos + 1).end()
+      if text[pos:pos+1] == '}':
+        return obj, pos + 1
+      while True:
+        if text[pos:pos+1] != '"':
+          raise json.JSONDecodeError('Expecting property name enclosed in double quotes', text, pos)
+        key, pos = scanstring(text, pos + 1)
+        pos = WHITESPACE.match(text, pos).end()
+        if text[pos:pos+1] != ':':
+          raise json.JSONDecodeError("Expecting ':' delimiter", text, pos)
+        obj[key], pos = scan(pos + 1, depth - 1)
+        pos = WHITESPACE.match(text, pos).end()
+        c = text[pos:pos+1]
+        if c == '}':
+          return obj, pos + 1
+        if c != ',':
+          raise json.JSONDecodeError("Expecting ',' delimiter", text, pos)
+        pos = WHITESPACE.match(text, pos + 1).end()
+    if c in ('{', '['):
+      end = skipper.raw_decode(text, pos)[1]
+      return Part(fn, byteOffset(pos), byteOffset(end)), end
+    return decoder.raw_decode(text, pos)
+
+  value, end = scan(0, depth)
+  end = WHITESPACE.match(text, end).end()
+  if end != len(text):
+    raise json.JSONDecodeError('Extra data', text, end)
+  return value
+
+
+def loadParts(value):
+  """ value with the Parts loaded
+  """
+  if type(value) is Part:
+    return loadsJson(value.read())
+  if type(value) is dict:
+    return {prop: loadParts(child) for prop, child in value.items()}
+  return value
+
+
+def diffPart(options, path, part1, part2, root=False):
+  """ Compare a part of both json files, run by the worker processes
+  
+      Returns the mismatches
+  """
+  if type(part1) is Part and type(part2) is Part:
+    part1 = part1.read()
+    part2 = part2.read()
+    if part1 == part2:                                # same text, no need to parse
+      return []
+    part1 = loadsJson(part1)
+    part2 = loadsJson(part2)
+  else:
+    part1 = loadParts(part1)
+    part2 = loadParts(part2)
+  comparison = Comparison(**options)
+  comparison.rootPath = path
+  if comparison.rules is not None:
+    comparison.ruleState = comparison.rules.stateAt(path)
+  comparison.setJson('1', part1, False)                # compared once
+  comparison.setJson('2', part2, False)
+  try:
+    if root or type(part1) in (dict, list):
+      comparison.jsonDiff(part1, part2, path)
+    elif part1 != part2 and (comparison.ruleState is None or comparison.ruleState.reaches(part2)):
+      comparison.addChanged(path, part1, part2)
+  except MismatchLimit:
+    pass
+  return comparison.mismatch
+
+
+def comparisonOptions(args):
+  """ Comparison keyword arguments from the command line arguments
+  """
+  listKey = getattr(args, 'key', None)
+  return {'alignLists': getattr(args, 'align', False) or listKey is not None,
+          'listKey': listKey,
+          'workers': getattr(args, 'jobs', 1),
+          'splitDepth': getattr(args, 'split_depth', 1),
+          'maxMismatches': getattr(args, 'max_mismatches', None),
+          'ignore': tuple(getattr(args, 'ignore', None) or ()),
+          'include': tuple(getattr(args, 'include', None) or ()),
+          'absTol': getattr(args, 'abs_tol', 0.0),
+          'relTol': getattr(args, 'rel_tol', 0.0)}
+
 if __name__=='__main__':
   print('to be imported')  
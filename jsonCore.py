@@ -0,0 +1,37 @@
+""" The headless part of jsonDiff: comparison engine, loaders and output formats
+
+    Importing it does not import tkinter (or numpy, see loadNumpy), so
+    scripts and services can compare json without the gui:
+
+      comparison = compareFiles('a.json', 'b.json', ignore=('$..etag',))
+      for mismatch in comparison.mismatch:
+        print(mismatch.error)
+"""
+from jsonComparison import Comparison, Mismatch, Cancelled, comparisonOptions, pathText
+from jsonComparison import CHANGED, DIFFERENT_TYPES, MISSING_PROPERTY, MISSING_ELEMENT, MOVED, CHANGED_RANGE
+from jsonLoader import loadJson, loadsJson, loadFiles, registerParser, PARSERS, DEFAULT_PARSER
+from jsonOutput import WRITERS, TextWriter, NdjsonWriter, PatchWriter
+from jsonStream import StreamComparison
+from jsonNway import NwayComparison
+from jsonRules import PathRules, readRules
+from jsonCache import DiffCache
+from jsonStats import Stats
+from jsonBatch import runBatch, IDENTICAL, DIFFERENT, FAILED
+
+
+def compareFiles(fn1, fn2, parser=None, **options):
+  """ Comparison of 2 json files, compared
+
+      options are the Comparison keyword arguments, parser the name of a
+      JSON parser (None: the fastest available)
+  """
+  comparison = Comparison(**options)
+  for jsonId, fn in (('1', fn1), ('2', fn2)):
+    comparison.jsonPath[jsonId] = fn
+    comparison.setJson(jsonId, loadJson(fn, parser), False)
+  comparison.compare()
+  return comparison
+
+
+if __name__=='__main__':
+  print('to be imported')
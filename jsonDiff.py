@@ -1,60 +1,346 @@
 #!/usr/bin/env python3
 
-import os
 import sys
 import json
+import time
+import filecmp
 import argparse
+import importlib.util
 
-try:
-  from jsonDiffGui import App
-  cli = False
-except ImportError:
-  cli = True
+cli = importlib.util.find_spec('_tkinter') is None    # tkinter itself is only imported for the gui
 
-from jsonComparison import Comparison
+from jsonComparison import Comparison, comparisonOptions
+from jsonLoader import loadFiles, PARSERS, DEFAULT_PARSER
+from jsonStats import Stats, NO_PHASE
+from jsonCache import CACHE_PATH, CACHE_SIZE
+from jsonOutput import WRITERS
+from jsonRules import argumentRules
+from jsonWatch import FileWatcher, POLL_INTERVAL
 
-def main(args):
-  comparison = Comparison()
+def instrument(comparison, args):
+  """ Attach stats and profiler to the comparison when asked for
+  """
+  if args.stats:
+    comparison.enableStats(Stats())
+  if args.profile is not None:
+    import cProfile
+    comparison.profiler = cProfile.Profile()
+
+def message(args, text):
+  """ Print a message, to stderr when stdout has the mismatches in a machine readable format
+  """
+  print(text, file=sys.stdout if args.format == 'text' else sys.stderr)
+
+def failure(args):
+  """ Exit status after an error, with --quiet 1 means the files differ
+  """
+  return 2 if args.quiet else 1
+
+def finish(comparison, args, mismatches):
+  """ Report how the comparison ended, returns the exit status
+  """
+  if comparison.limited and not args.quiet:
+    message(args, 'Stopped after {} mismatches'.format(mismatches))
+  showStats(comparison, args)
+  return 1 if args.quiet and mismatches else 0
+
+def showStats(comparison, args):
+  if args.profile is not None:
+    comparison.profiler.dump_stats(args.profile)
+    print('Profile saved: {}'.format(args.profile), file=sys.stderr)
+  if comparison.stats is not None:
+    print(comparison.stats.report(), file=sys.stderr)
+
+def stream(args):
+  """ Compare while parsing both files, print mismatches as soon as found
+  """
+  def report(mismatch):
+    nonlocal mismatches
+    mismatches += 1
+    if not args.quiet:
+      writer.write(mismatch)
+    if comparison.stats is not None:
+      comparison.countMismatches((mismatch,))
+  from jsonStream import StreamComparison
+  mismatches = 0
+  writer = WRITERS[args.format](sys.stdout, flush=True)
+  options = comparisonOptions(args)
+  comparison = StreamComparison(report, maxMismatches=options['maxMismatches'], 
+                                ignore=options['ignore'], include=options['include'], 
+                                absTol=options['absTol'], relTol=options['relTol'])
+  instrument(comparison, args)
+  comparison.jsonPath['1'] = args.jsonFile1
+  comparison.jsonPath['2'] = args.jsonFile2
+  if not args.quiet:
+    message(args, 'Streaming: {} - {}'.format(args.jsonFile1, args.jsonFile2))
   try:
-    fn = args.jsonFile1
-    print('Reading: {}'.format(fn))
-    comparison.jsonData['1'] = json.load(open(fn))
-  except FileNotFoundError:
-    print('Can not find: {}'.format(sys.arg[v]))
-    sys.exit(1)
+    with comparison.phase('parse + compare'), comparison.profiler or NO_PHASE:
+      comparison.compare()
+    if not args.quiet:
+      writer.close()
+  except FileNotFoundError as e:
+    message(args, 'Can not find: {}'.format(e.filename))
+    sys.exit(failure(args))
   except json.decoder.JSONDecodeError as e:
-    print('Invalid JSON: {}'.format(e))
-    sys.exit(1)
+    message(args, 'Invalid JSON: {}'.format(e))
+    sys.exit(failure(args))
+  return finish(comparison, args, mismatches)
 
+def printMismatches(comparison, args, mismatches=None):
+  """ Write the mismatches in the output format, default: the mismatches of the last compare
+
+      mismatches can be comparison.iterMismatches(), then they are written while they are found
+  """
+  if args.quiet:
+    return
+  writer = WRITERS[args.format](sys.stdout, comparison.jsonData['2'])
+  with comparison.phase('render') if mismatches is None else NO_PHASE:  # the compare is timed itself
+    for mismatch in comparison.mismatch if mismatches is None else mismatches:
+      writer.write(mismatch)
+    writer.close()
+
+def sameBytes(fn1, fn2):
+  """ Check if 2 files have the same content, reads up to the first difference
+  """
   try:
-    fn = args.jsonFile2
-    print('Reading: {}'.format(fn))
-    comparison.jsonData['2'] = json.load(open(fn))
-  except FileNotFoundError:
-    print('Can not find: {}'.format(sys.arg[v]))
-    sys.exit(1)
-  except json.decoder.JSONDecodeError as e:
-    print('Invalid JSON: {}'.format(e))
-    sys.exit(1)
+    return filecmp.cmp(fn1, fn2, shallow=False)
+  except OSError:                                     # reported when loading the file
+    return False
+
+def loadChanged(comparison, args, files):
+  """ Load files {jsonId: file name} into the comparison, returns the jsonIds loaded
+
+      A file that can not be loaded keeps the data loaded before
+  """
+  loaded = []
+  with comparison.phase('parse'):
+    for (jsonId, fn), future in zip(files.items(), loadFiles(list(files.values()), args.parser)):
+      try:
+        data = future.result()
+      except OSError as e:
+        message(args, 'Can not open: {}'.format(e))
+        continue
+      except json.decoder.JSONDecodeError as e:
+        message(args, 'Invalid JSON: {}: {}'.format(fn, e))
+        continue
+      comparison.setJson(jsonId, data)
+      loaded.append(jsonId)
+  return loaded
+
+def watch(args):
+  """ Compare the files, then again whenever one of them changes, until interrupted
 
-  comparison.compare()
-  for path in comparison.mismatch:
-    print(comparison.mismatch[path]['error'])
+      Only a file that changed is parsed again and only its subtrees that
+      changed are compared again. Saves coming faster than the compares
+      are taken together, see jsonWatch.FileWatcher
+  """
+  comparison = Comparison(**comparisonOptions(args))
+  instrument(comparison, args)
+  fns = {'1': args.jsonFile1, '2': args.jsonFile2}
+  watcher = FileWatcher(set(fns.values()))
+  changed = set(fns.values())                         # both files at the start
+  loaded = set()
+  mismatches = 0
+  try:
+    while True:
+      files = {jsonId: fn for jsonId, fn in fns.items() if fn in changed}
+      if files:
+        message(args, '{}: {}'.format('Changed' if loaded else 'Reading', ', '.join(files.values())))
+        new = loadChanged(comparison, args, files)
+        loaded.update(new)
+        if new and len(loaded) == 2:
+          comparison.compare()
+          printMismatches(comparison, args)
+          mismatches = len(comparison.mismatch)
+          message(args, '{} mismatches, watching for changes'.format(mismatches))
+      time.sleep(POLL_INTERVAL)
+      changed = set(watcher.poll())
+  except KeyboardInterrupt:
+    return finish(comparison, args, mismatches)
+
+def main(args):
+  """ Compare the files, returns the exit status
+  """
+  if args.watch:
+    return watch(args)
+  if args.quiet and sameBytes(args.jsonFile1, args.jsonFile2):
+    return 0                                          # no need to parse
+  if args.stream:
+    return stream(args)
+  comparison = Comparison(**comparisonOptions(args))
+  instrument(comparison, args)
+  fns = (args.jsonFile1, args.jsonFile2)
+  digests = (None, None)
+  if args.cache:
+    from jsonCache import DiffCache
+    comparison.cache = DiffCache(maxSize=args.cache_size << 20)
+    try:
+      digests = [comparison.cache.fileDigest(fn) for fn in fns]
+    except FileNotFoundError as e:
+      message(args, 'Can not find: {}'.format(e.filename))
+      sys.exit(failure(args))
+    comparison.jsonDigest['1'], comparison.jsonDigest['2'] = digests
+    if args.format != 'patch' and comparison.cachedResult():  # compared before, patch needs the data of file2
+      if not args.quiet:
+        message(args, 'Cached: {} - {}'.format(*fns))
+      printMismatches(comparison, args)
+      return finish(comparison, args, len(comparison.mismatch))
+  if comparison.workers > 1:                          # the workers load their part of the files
+    comparison.jsonPath['1'] = args.jsonFile1
+    comparison.jsonPath['2'] = args.jsonFile2
+    if not args.quiet:
+      message(args, 'Splitting: {} - {}'.format(args.jsonFile1, args.jsonFile2))
+    try:
+      if args.format == 'text' or args.quiet:
+        comparison.compare()
+        printMismatches(comparison, args)
+      else:
+        printMismatches(comparison, args, comparison.iterMismatches())
+    except FileNotFoundError as e:
+      message(args, 'Can not find: {}'.format(e.filename))
+      sys.exit(failure(args))
+    except json.decoder.JSONDecodeError as e:
+      message(args, 'Invalid JSON: {}'.format(e))
+      sys.exit(failure(args))
+    return finish(comparison, args, len(comparison.mismatch))
+
+  data = []
+  with comparison.phase('parse'):                     # the parsing threads may hold the GIL all the time
+    for fn, future in zip(fns, loadFiles(fns, args.parser)):  # both files load at the same time
+      try:
+        if not args.quiet:
+          message(args, 'Reading: {}'.format(fn))
+        data.append(future.result())
+      except FileNotFoundError:
+        message(args, 'Can not find: {}'.format(fn))
+        sys.exit(failure(args))
+      except json.decoder.JSONDecodeError as e:
+        message(args, 'Invalid JSON: {}'.format(e))
+        sys.exit(failure(args))
+  for jsonId, value, digest in zip(('1', '2'), data, digests):
+    comparison.setJson(jsonId, value, args.cache, digest)  # fingerprints only pay off when they are cached
+
+  if args.format == 'text' or args.quiet:
+    comparison.compare()
+    printMismatches(comparison, args)
+  else:                                               # write the mismatches while comparing
+    printMismatches(comparison, args, comparison.iterMismatches())
+  return finish(comparison, args, len(comparison.mismatch))
   
 
-if __name__ == '__main__':
-  parser = argparse.ArgumentParser(description='Show differences between 2 JSON files with GUI when available')
+def run(argv=None):
+  """ Command line entry point, returns the exit status
+
+      The gui module, and with it tkinter, is only imported when the gui is used
+  """
+  if argv is None:
+    argv = sys.argv[1:]
+  if argv[:1] == ['batch']:                           # jsonDiff.py batch DIR1 DIR2 | --manifest FILE
+    import jsonBatch
+    return jsonBatch.main(argv[1:])
+  if argv[:1] == ['nway']:                            # jsonDiff.py nway BASELINE VARIANT...
+    import jsonNway
+    return jsonNway.main(argv[1:])
+  parser = argparse.ArgumentParser(description='Show differences between 2 JSON files with GUI when available',
+                                   epilog='use "%(prog)s batch --help" to compare many pairs of files, '
+                                          '"%(prog)s nway --help" to compare many variants with one baseline')
   parser.add_argument('jsonFile1', nargs='?', action='store', default=None, help='JSON input file 1')
   parser.add_argument('jsonFile2', nargs='?', action='store', default=None, help='JSON input file 2')
   parser.add_argument('--cli', action='store_true', help='force cli handling')  
-  args = parser.parse_args()    
-  print(cli, args)                
-  if cli or args.cli:
+  parser.add_argument('--stream', action='store_true', 
+                      help='cli: parse and compare the files incrementally, for files too big to load')
+  parser.add_argument('--align', action='store_true', 
+                      help='compare lists by pairing equal elements instead of by index, report inserts, deletes and moves')
+  parser.add_argument('--key', action='store', default=None, 
+                      help='compare lists of objects by pairing the objects with the same KEY property (implies --align)')
+  parser.add_argument('--jobs', '-j', action='store', type=int, default=1, 
+                      help='cli: compare the subtrees of the files in JOBS worker processes')
+  parser.add_argument('--split-depth', action='store', type=int, default=1, 
+                      help='depth of the subtrees compared by the worker processes (default 1)')
+  parser.add_argument('--stats', action='store_true', 
+                      help='count the work done and time the phases, cli: printed to stderr, gui: in the status bar')
+  parser.add_argument('--profile', action='store', default=None, 
+                      help='cli: run the comparison under cProfile and save the profile to PROFILE')
+  parser.add_argument('--parser', action='store', choices=sorted(PARSERS), default=DEFAULT_PARSER, 
+                      help='JSON parser (default: %(default)s)')
+  parser.add_argument('--max-mismatches', action='store', type=int, default=None, 
+                      help='stop comparing after MAX_MISMATCHES mismatches')
+  parser.add_argument('--quiet', '-q', action='store_true', 
+                      help='cli: only check if the files differ, stops at the first mismatch, exit status 0: same, '
+                           '1: different, 2: error. With --stream the files are only read up to the mismatch')
+  parser.add_argument('--view', action='store', choices=('tree', 'virtual'), default='tree', 
+                      help='gui: how the files are shown, virtual only draws the rows in the window and keeps '
+                           'scrolling through very large lists and objects fast (default %(default)s)')
+  parser.add_argument('--fold', action='store_true', 
+                      help='gui: show the children without mismatches of an object/list with mismatches as one '
+                           '"identical (N items)" item, opened when needed')
+  parser.add_argument('--watch', action='store_true', 
+                      help='compare again when a file changes, only the file that changed is read again')
+  parser.add_argument('--memory-budget', action='store', type=int, default=None, metavar='MB', 
+                      help='gui: MB for the data of the open tabs, the tabs shown least recently drop their data '
+                           'above it and load it again when shown (default: no limit)')
+  parser.add_argument('--cache', action='store_true', 
+                      help='keep the results and fingerprints in {}, files compared before are not compared '
+                           'again'.format(CACHE_PATH))
+  parser.add_argument('--cache-size', action='store', type=int, default=CACHE_SIZE >> 20, 
+                      help='MB of the cache, the least recently used results are removed (default %(default)s)')
+  parser.add_argument('--format', action='store', choices=sorted(WRITERS), default='text', 
+                      help='cli: output of the mismatches, text: messages, ndjson: a json object per line, '
+                           'patch: RFC 6902 JSON Patch from file1 to file2. ndjson and patch are written '
+                           'while comparing (default %(default)s)')
+  parser.add_argument('--abs-tol', action='store', type=float, default=0.0, 
+                      help='numbers at most ABS_TOL apart are the same')
+  parser.add_argument('--rel-tol', action='store', type=float, default=0.0, 
+                      help='numbers at most REL_TOL times the largest of the two apart are the same')
+  parser.add_argument('--ignore', action='append', default=[], metavar='PATTERN', 
+                      help='leave the paths matching PATTERN out, like $.items[*].updatedAt or $..etag, '
+                           'can be given more than once')
+  parser.add_argument('--include', action='append', default=[], metavar='PATTERN', 
+                      help='only compare the paths matching PATTERN, can be given more than once')
+  parser.add_argument('--rules', action='store', default=None, 
+                      help='file with a rule per line: "ignore PATTERN" or "include PATTERN"')
+  args = parser.parse_args(argv)
+  if not args.quiet and args.format == 'text':
+    print(cli, args)                
+  if args.stream and (args.align or args.key is not None):
+    parser.error('--align and --key can not be used with --stream')
+  if args.stream and args.jobs > 1:
+    parser.error('--jobs can not be used with --stream')
+  if args.stream and args.cache:
+    parser.error('--cache can not be used with --stream')
+  if args.format == 'patch' and (args.stream or args.align or args.key is not None or args.jobs > 1):
+    parser.error('--format patch can not be used with --stream, --align, --key and --jobs')
+  if args.watch and (args.stream or args.quiet or args.cache):
+    parser.error('--watch can not be used with --stream, --quiet and --cache')
+  if args.jobs < 1 or args.split_depth < 1:
+    parser.error('--jobs and --split-depth must be at least 1')
+  if args.memory_budget is not None and args.memory_budget < 1:
+    parser.error('--memory-budget must be at least 1')
+  if args.max_mismatches is not None and args.max_mismatches < 1:
+    parser.error('--max-mismatches must be at least 1')
+  if not (args.abs_tol >= 0 and args.rel_tol >= 0):
+    parser.error('--abs-tol and --rel-tol can not be negative')
+  try:
+    args.ignore, args.include = argumentRules(args)
+  except (OSError, ValueError) as e:
+    parser.error(str(e))
+  if args.quiet:
+    args.max_mismatches = 1                           # the first mismatch answers the question
+  App = None
+  if not (cli or args.cli or args.stream or args.quiet or args.format != 'text'):
+    try:
+      from jsonDiffGui import App
+    except ImportError:                               # tkinter without a working Tk
+      pass
+  if App is None:
     if args.jsonFile1 is None or args.jsonFile2 is None:
       parser.print_usage()
-      sys.exit(1)
-    main(args)
-  else:
-    app = App(args, Comparison)
-    app.run()
+      return 2 if args.quiet else 1
+    return main(args)
+  App(args, Comparison).run()
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(run())
 
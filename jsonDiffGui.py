@@ -1,20 +1,45 @@
 import os
 import sys
 import json
+import queue
+import functools
+import threading
 
 import tkinter as tk
 import tkinter.ttk as ttk
 from tkinter import filedialog as fd
 
-from jsonComparison import Comparison
+from jsonComparison import Comparison, Cancelled, comparisonOptions, pathText
+from jsonComparison import MISSING_PROPERTY, MISSING_ELEMENT, CHANGED_RANGE
+from jsonSearch import SearchIndex, itemText
+from jsonStats import Stats
+from jsonLoader import loadFiles
+from jsonCache import DiffCache, CACHE_SIZE
+from jsonRules import readRules
+from jsonView import JsonView
+from jsonNway import NwayComparison, reportPath
+from jsonBatch import DIFFERENT, FAILED
+from jsonWatch import FileWatcher, POLL_INTERVAL
 
 
 TK_VERSION = tk.TkVersion
-if TK_VERSION < 8.6:
-  from PIL import ImageTk, Image
 PROJECT_PATH = os.path.abspath(os.path.dirname(__file__))
 RSC_PATH = os.path.join(PROJECT_PATH, 'resource')
+ICONS = {'refresh_24': '24x24/redo.png',              # name: image file in RSC_PATH, loaded when first used
+         'open_24': '24x24/file-import.png',
+         'search_24': '24x24/search.png',
+         'next_24': '24x24/angle_right.png',
+         'prev_24': '24x24/angle_left.png',
+         'open': '48x48/folder-open.png',
+         'exit': '48x48/close.png',
+         'first': '48x48/angle-double-up.png',
+         'last': '48x48/angle-double-down.png',
+         'next': '48x48/angle-down.png',
+         'prev': '48x48/angle-up.png',
+         'jsonDiff': 'jsonDiff.png'}
 USER_PATH = os.path.expanduser("~")
+POLL_MS = 100                                         # interval of checking the progress of a Task
+FOLD_MIN = 3                                          # fewer identical children are not folded
 
 class CustomNotebook(ttk.Notebook):
   """ A ttk Notebook with close buttons on each tab
@@ -120,55 +145,58 @@ class CustomNotebook(ttk.Notebook):
 
 
 class App:
-  json_conv = { None: 'null',
-                True: 'true',
-                False: 'false'
-              }
   comparison = [None]                     # Open comparison records, None for newDiff tab
                                           # Intention is to sync this to the tabs indexes
                                           
   newDiffTab = 0                          # 
   jsonPath = {'1': None, '2': None}
+  virtualView = False                     # JsonView instead of TreeView
+  foldIdentical = False                   # runs of children without mismatches as one row
+  watchFiles = False                      # reload the files of the shown tab when they change
+  iconsPending = None                     # (widget, icon name) shown once the window is up, None: shown at once
+  memoryBudget = None                     # bytes of the loaded tabs, None: no limit
   
   def __init__(self, args, Comparison, master=None, path=USER_PATH):
     self.mainwindow = tk.Tk() if master is None else tk.Toplevel(master)
     self.userPath = path
+    self.options = comparisonOptions(args)                      # Comparison options from the command line
+    self.showStats = getattr(args, 'stats', False)              # show the Stats in the status bar
+    self.parser = getattr(args, 'parser', None)                 # JSON parser, None: the fastest available
+    self.virtualView = getattr(args, 'view', 'tree') == 'virtual'
+    self.foldIdentical = getattr(args, 'fold', False)
+    self.watchFiles = getattr(args, 'watch', False)
+    self.watchers = {}                                          # comparison: FileWatcher of its files
+    budget = getattr(args, 'memory_budget', None)
+    self.memoryBudget = None if budget is None else budget << 20
+    self.recent = []                                            # comparisons of the tabs, least recently shown first
+    self.images = {}                                            # name: PhotoImage of the ICONS loaded so far
+    self.task = None                                            # running Task, one at a time
+    self.cache = None                                           # persistent cache of results and fingerprints
+    if getattr(args, 'cache', False):
+      self.cache = DiffCache(maxSize=getattr(args, 'cache_size', CACHE_SIZE >> 20) << 20)
+    self.iconsPending = []
     self. buildUI()
+    self.mainwindow.after_idle(self.loadIcons)                  # after the window is drawn
     # newDiff tab is shown at start
     self.newComparison()
-    if args.jsonFile1 is not None:
-      self.loadJson(args.jsonFile1, '1')
-    if args.jsonFile2 is not None:
-      self.loadJson(args.jsonFile2, '2')
-    self.enableCompare()
+    files = [(jsonId, fn) for jsonId, fn in (('1', args.jsonFile1), ('2', args.jsonFile2)) if fn is not None]
+    if files:
+      self.loadJson(files, False, self.enableCompare)
+    elif getattr(args, 'variants', None):                       # jsonDiff.py nway --gui
+      self.nwayDiff(args.baseline, args.variants)
+    if self.watchFiles:
+      self.mainwindow.after(int(POLL_INTERVAL * 1000), self.pollFiles)
       
   def buildUI(self):
-    def loadImage(path):
-      if TK_VERSION < 8.6:
-        return ImageTk.PhotoImage(Image.open(path))
-      else:
-        return tk.PhotoImage(file=path)
-        
     # variable to interact with UI
     self.searchStr = tk.StringVar(value='')
     self.mismatchMsg = tk.StringVar(value='')
+    self.statsMsg = tk.StringVar(value='')
+    self.progressMsg = tk.StringVar(value='')
     self.jsonPath['1'] = tk.StringVar(value='')
     self.jsonPath['2'] = tk.StringVar(value='')
+    self.rulesPath = tk.StringVar(value='')                 # rules file of new comparisons, added to the command line rules
     
-    # images
-    self.refreshImg_24 = loadImage(os.path.join(RSC_PATH,'24x24/redo.png'))
-    self.openImg_24 = loadImage(os.path.join(RSC_PATH,'24x24/file-import.png'))
-    self.searchImg_24 = loadImage(os.path.join(RSC_PATH,'24x24/search.png'))
-    self.nextImg_24 = loadImage(os.path.join(RSC_PATH,'24x24/angle_right.png'))
-    self.prevImg_24 = loadImage(os.path.join(RSC_PATH,'24x24/angle_left.png'))
-    self.openImg = loadImage(os.path.join(RSC_PATH,'48x48/folder-open.png'))
-    #self.closeImg = loadImageos.path.join(RSC_PATH,'48x48/close.png'))
-    self.exitImg = loadImage(os.path.join(RSC_PATH,'48x48/close.png'))
-    self.firstImg = loadImage(os.path.join(RSC_PATH,'48x48/angle-double-up.png'))
-    self.lastImg = loadImage(os.path.join(RSC_PATH,'48x48/angle-double-down.png'))
-    self.nextImg = loadImage(os.path.join(RSC_PATH,'48x48/angle-down.png'))
-    self.prevImg = loadImage(os.path.join(RSC_PATH,'48x48/angle-up.png'))
-
     # build ui
     self.main = ttk.Frame(self.mainwindow)
     # Customize TreeView colors
@@ -186,13 +214,46 @@ class App:
     self.notebook.add(self.newDiffFrame(), sticky='ns', text='New...')               # Add new diff frame to notebook
     self.notebook.bind('<<NotebookTabChanged>>', self.onTabChange)      # Capture when the tab changes, needed to update currentComparison
     self.notebook.bind('<<NotebookTabClosed>>', self.onTabClose)        # Capture when the tab closes, needed to remove old data from comparison
+    # progress bar, shown while a Task runs
+    self.progressBar_UI()
     
     self.main.pack(expand=1, fill='both', side='top')
     self.mainwindow.title('jsonDiff')
-    self.mainwindow.iconphoto(False, loadImage(os.path.join(RSC_PATH,'jsonDiff.png')))
     self.mainwindow.configure(width='600', height='400')
     self.mainwindow.minsize(600, 400)
 
+  def setIcon(self, widget, name):
+    """ Show icon name on widget, while building the window it is only noted (see loadIcons)
+    """
+    if self.iconsPending is None:
+      widget.configure(image=self.image(name))
+    else:
+      self.iconsPending.append((widget, name))
+
+  def loadIcons(self):
+    """ Load the icons of the widgets made while building the window
+    
+        The window comes up first, the icons are read when Tk is idle
+    """
+    pending, self.iconsPending = self.iconsPending, None
+    self.mainwindow.iconphoto(False, self.image('jsonDiff'))
+    for widget, name in pending:
+      widget.configure(image=self.image(name))
+
+  def image(self, name):
+    """ PhotoImage of icon name (see ICONS), loaded the first time it is used
+    """
+    image = self.images.get(name)
+    if image is None:
+      path = os.path.join(RSC_PATH, ICONS[name])
+      if TK_VERSION < 8.6:                                      # no png support in Tk
+        from PIL import ImageTk, Image
+        image = ImageTk.PhotoImage(Image.open(path))
+      else:
+        image = tk.PhotoImage(file=path)
+      self.images[name] = image
+    return image
+
   def newDiffFrame(self):
     frame = ttk.Frame(self.notebook)
     # first row and last row with higher weight resulting in vertical centering
@@ -222,20 +283,33 @@ class App:
     selectJson2.configure(text='...', width='3', 
                           command=lambda: self.selectFile('new_2'))
     selectJson2.grid(column='2', row='2', pady='2')
-    #row 3: start Comparison
+    #row 3: path rules
+    label3 = ttk.Label(frame)
+    label3.configure(text='Rules (optional)')
+    label3.grid(column='0', row='3', padx='5', pady='2')
+    entry3 = ttk.Entry(frame)
+    entry3.configure(textvariable=self.rulesPath)
+    entry3.grid(column='1', row='3', padx='5', pady='2')
+    selectRules = ttk.Button(frame)
+    selectRules.configure(text='...', width='3', command=self.selectRules)
+    selectRules.grid(column='2', row='3', pady='2')
+    #row 4: start Comparison, or compare variants with file 1
+    nwayBtn = ttk.Button(frame)
+    nwayBtn.configure(text='Variants...', command=self.selectVariants)
+    nwayBtn.grid(column='0', row='4', sticky='w')
     self.diffBtn = ttk.Button(frame)
     self.diffBtn.configure(state='disabled', text='Compare', command=self.jsonDiff)
-    self.diffBtn.grid(column='0', row='3', columnspan='3', sticky='e')
+    self.diffBtn.grid(column='1', row='4', columnspan='2', sticky='e')
     # first row and last row with higher weight resulting in vertical centering
     empty2 = ttk.Label(frame)
     empty2.configure(text=' ')
-    empty2.grid(column='0', row='4',columnspan='3')
-    empty2.rowconfigure('4', weight='1')
+    empty2.grid(column='0', row='5',columnspan='3')
+    empty2.rowconfigure('5', weight='1')
     frame.pack(side='top')      
     return frame  
 
-  def diffFrame(self):
-    mainFrame = ttk.Frame(self.notebook)
+  def diffFrame(self, master=None):
+    mainFrame = ttk.Frame(self.notebook if master is None else master)
     panedWindow = ttk.Panedwindow(mainFrame, orient='horizontal')
     
     # JSON file 1
@@ -244,11 +318,13 @@ class App:
     # title bar
     titleBar1 = ttk.Frame(pane1)
     newBtn1 = ttk.Button(titleBar1)                            # open new file
-    newBtn1.configure(image=self.openImg_24, style='Toolbutton')
+    self.setIcon(newBtn1, 'open_24')
+    newBtn1.configure(style='Toolbutton')
     newBtn1.pack(side='left')
     newBtn1.configure(command=lambda: self.selectFile('open_1'))
     refreshBtn1 = ttk.Button(titleBar1)                        # reload existing file
-    refreshBtn1.configure(image=self.refreshImg_24, style='Toolbutton')
+    self.setIcon(refreshBtn1, 'refresh_24')
+    refreshBtn1.configure(style='Toolbutton')
     refreshBtn1.pack(side='left')
     refreshBtn1.configure(command=lambda: self.reloadFile('1'))
     jsonFile1 = ttk.Label(titleBar1)                           # json file name
@@ -257,9 +333,13 @@ class App:
     titleBar1.configure(height='20', width='200')
     titleBar1.pack(fill='x', side='top')
     # json treeView
-    self.currentComparison.jsonView['1'] = ttk.Treeview(pane1,style="selection.Treeview")                   #
+    if self.virtualView:
+      self.currentComparison.jsonView['1'] = self.virtualJsonView(pane1, '1')
+    else:
+      self.currentComparison.jsonView['1'] = ttk.Treeview(pane1,style="selection.Treeview")                   #
+      self.currentComparison.jsonView['1'].configure(show='tree')
+      self.currentComparison.jsonView['1'].bind('<<TreeviewOpen>>', lambda event: self.onTreeOpen(event, '1'))
     self.currentComparison.jsonView['1'].pack(expand=1, fill='both', side='top')
-    self.currentComparison.jsonView['1'].configure(show='tree')
     pane1.configure(height='200', width='200')
     pane1.pack(expand=1, fill='both',side='top')
     panedWindow.add(pane1, weight='1')
@@ -270,11 +350,13 @@ class App:
     # title bar
     titleBar2 = ttk.Frame(pane2)
     newBtn2 = ttk.Button(titleBar2)                            # open new file
-    newBtn2.configure(image=self.openImg_24, style='Toolbutton')
+    self.setIcon(newBtn2, 'open_24')
+    newBtn2.configure(style='Toolbutton')
     newBtn2.pack(side='left')
     newBtn2.configure(command=lambda: self.selectFile('open_2'))
     refreshBtn2 = ttk.Button(titleBar2)                        # reload existing file
-    refreshBtn2.configure(image=self.refreshImg_24, style='Toolbutton')
+    self.setIcon(refreshBtn2, 'refresh_24')
+    refreshBtn2.configure(style='Toolbutton')
     refreshBtn2.pack(side='left')
     refreshBtn2.configure(command=lambda: self.reloadFile('2'))
     jsonFile2 = ttk.Label(titleBar2)                           # json file name
@@ -283,9 +365,14 @@ class App:
     titleBar2.configure(height='20', width='200')
     titleBar2.pack(fill='x', side='top')
     # json treeView
-    self.currentComparison.jsonView['2'] = ttk.Treeview(pane2)
+    if self.virtualView:
+      self.currentComparison.jsonView['2'] = self.virtualJsonView(pane2, '2')
+      self.currentComparison.jsonView['2'].link(self.currentComparison.jsonView['1'])  # scroll and expand together
+    else:
+      self.currentComparison.jsonView['2'] = ttk.Treeview(pane2)
+      self.currentComparison.jsonView['2'].configure(show='tree')
+      self.currentComparison.jsonView['2'].bind('<<TreeviewOpen>>', lambda event: self.onTreeOpen(event, '2'))
     self.currentComparison.jsonView['2'].pack(expand=1, fill='both', side='top')
-    self.currentComparison.jsonView['2'].configure(show='tree')
     pane2.configure(height='200', width='200')
     pane2.pack(expand=1, fill='both',side='top')
     panedWindow.add(pane2, weight='1')
@@ -296,16 +383,45 @@ class App:
     msg.configure(state='readonly', textvariable=self.mismatchMsg, validate='none')
     msg['state'] = 'normal'
     msg.pack(expand=1, fill='x', side='top')
+    if self.showStats:
+      stats = ttk.Label(statusBar)
+      stats.configure(textvariable=self.statsMsg, anchor='w')
+      stats.pack(expand=1, fill='x', side='top')
     statusBar.configure(height='50', width='200')
     statusBar.pack(fill='x', side='top')
     mainFrame.configure(height='400', width='600')
     mainFrame.pack(expand=1, fill='both', side='top')
     return mainFrame
+
+  def virtualJsonView(self, master, f):
+    """ JsonView of file f of the current comparison, rows are tagged like the TreeView items
+    """
+    comparison = self.currentComparison
+    def tags(path):
+      if self.task is not None:                                 # the mismatches are changing
+        return ()
+      return self.itemTags(comparison, pathText(path), f)
+    view = JsonView(master, tags)
+    self.configureTags(view)
+    return view
       
+  def progressBar_UI(self):
+    self.progressBar = ttk.Frame(self.main)
+    msg = ttk.Label(self.progressBar)
+    msg.configure(textvariable=self.progressMsg, anchor='w')
+    msg.pack(expand=1, fill='x', padx='5', side='left')
+    cancelBtn = ttk.Button(self.progressBar)
+    cancelBtn.configure(text='Cancel', command=self.cancelTask)
+    cancelBtn.pack(padx='5', side='right')
+    self.progress = ttk.Progressbar(self.progressBar)
+    self.progress.configure(length='200')
+    self.progress.pack(padx='5', side='right')
+
   def iconBar_UI(self):
     iconBar = ttk.Frame(self.main)
     newBtn = ttk.Button(iconBar)
-    newBtn.configure(image=self.openImg, style='Toolbutton')
+    self.setIcon(newBtn, 'open')
+    newBtn.configure(style='Toolbutton')
     newBtn.pack(pady='1', side='left')
     newBtn.configure(command=self.newDiff)
     # closeBtn = ttk.Button(iconBar)
@@ -317,22 +433,26 @@ class App:
     # refreshAll.pack(side='left')
     # refreshAll.configure(command=lambda: self.reload(None))
     exitBtn = ttk.Button(iconBar)
-    exitBtn.configure(image=self.exitImg, style='Toolbutton')
+    self.setIcon(exitBtn, 'exit')
+    exitBtn.configure(style='Toolbutton')
     exitBtn.pack(side='left')
     exitBtn.configure(command=self.exitApp)
     separator = ttk.Separator(iconBar)
     separator.configure(orient='horizontal')
     separator.pack(fill='y', padx='7', pady='1', side='left')
     self.searchNextBtn = ttk.Button(iconBar)
-    self.searchNextBtn.configure(image=self.nextImg_24, style='Toolbutton',
+    self.setIcon(self.searchNextBtn, 'next_24')
+    self.searchNextBtn.configure(style='Toolbutton',
                                  state='disabled', command=self.searchNext)
     self.searchNextBtn.pack(padx='1', pady='1', side='right')
     self.searchPrevBtn = ttk.Button(iconBar)
-    self.searchPrevBtn.configure(image=self.prevImg_24, style='Toolbutton',
+    self.setIcon(self.searchPrevBtn, 'prev_24')
+    self.searchPrevBtn.configure(style='Toolbutton',
                                  state='disabled', command=self.searchPrev)
     self.searchPrevBtn.pack(padx='1', pady='1', side='right')
     searchBtn = ttk.Button(iconBar)
-    searchBtn.configure(image=self.searchImg_24, style='Toolbutton')
+    self.setIcon(searchBtn, 'search_24')
+    searchBtn.configure(style='Toolbutton')
     searchBtn.pack(padx='1', pady='1', side='right')
     searchBtn.configure(command=self.searchProperty)
     searchEntry = ttk.Entry(iconBar)
@@ -343,19 +463,23 @@ class App:
     separator.configure(orient='horizontal')
     separator.pack(fill='y', padx='15', pady='1', side='right')
     lastBtn = ttk.Button(iconBar)
-    lastBtn.configure(image=self.lastImg, style='Toolbutton')
+    self.setIcon(lastBtn, 'last')
+    lastBtn.configure(style='Toolbutton')
     lastBtn.pack(side='left')
     lastBtn.configure(command=lambda: self.showMismatch('last'))
     nextBtn = ttk.Button(iconBar)
-    nextBtn.configure(image=self.nextImg, style='Toolbutton')
+    self.setIcon(nextBtn, 'next')
+    nextBtn.configure(style='Toolbutton')
     nextBtn.pack(side='left')
     nextBtn.configure(command=lambda: self.showMismatch('next'))
     prevBtn = ttk.Button(iconBar)
-    prevBtn.configure(image=self.prevImg, style='Toolbutton')
+    self.setIcon(prevBtn, 'prev')
+    prevBtn.configure(style='Toolbutton')
     prevBtn.pack(side='left')
     prevBtn.configure(command=lambda: self.showMismatch('prev'))
     firstBtn = ttk.Button(iconBar)
-    firstBtn.configure(image=self.firstImg, style='Toolbutton')
+    self.setIcon(firstBtn, 'first')
+    firstBtn.configure(style='Toolbutton')
     firstBtn.pack(side='left')
     firstBtn.configure(command=lambda: self.showMismatch('first'))
     iconBar.configure(height='20', relief='flat', width='200')
@@ -364,7 +488,8 @@ class App:
   def searchBar_UI(self):
     searchBar = ttk.Frame(self.main)
     searchBtn = ttk.Button(searchBar)
-    searchBtn.configure(image=self.searchImg_24, style='Toolbutton')
+    self.setIcon(searchBtn, 'search_24')
+    searchBtn.configure(style='Toolbutton')
     searchBtn.pack(padx='1', pady='1', side='right')
     searchBtn.configure(command=self.searchProperty)
     searchEntry = ttk.Entry(searchBar)
@@ -377,20 +502,189 @@ class App:
     searchBar.pack(fill='x', side='top')
       
   def newComparison(self):
+    if self.comparison[-1] is not None and self.comparison[-1].jsonView['1'] is None:
+      self.comparison.pop()                                     # the new comparison before it was not used
     index = len(self.comparison)
-    self.comparison.append(Comparison(index))                   # Add new comparison
+    self.comparison.append(Comparison(index, **self.options))   # Add new comparison
     self.currentComparison = self.comparison[-1]                # save it as the current comparison
+    if self.showStats:
+      self.currentComparison.enableStats(Stats())
+    self.currentComparison.enableProgress(functools.partial(self.compareProgress, self.currentComparison))
+    self.currentComparison.cache = self.cache
     print("New Tab 0:{} - {}".format(self.currentComparison.tabIndex, 
                                      self.currentComparison.jsonPath))
 
+  def runTask(self, work, done, failed=None):
+    """ Run work(task) in a background Task, the window keeps responding
+    
+        done(result) is called when work returned, failed(error) when it
+        raised, also when it was cancelled. Both are called by the Tk main 
+        loop. Returns False when another Task is still running
+    """
+    if self.task is not None:
+      return False
+    self.task = Task(work)
+    self.taskDone = done
+    self.taskFailed = failed
+    self.progressMsg.set('')
+    self.progress.configure(mode='indeterminate', value=0)
+    self.progressBar.pack(before=self.notebook, fill='x', side='bottom')
+    self.task.start()
+    self.mainwindow.after(POLL_MS, self.pollTask)
+    return True
+
+  def pollTask(self):
+    """ Show the progress of the Task, finish it when it is done
+    """
+    progress = None
+    try:
+      while True:
+        kind, value = self.task.queue.get_nowait()
+        if kind != 'progress':
+          break
+        progress = value                                        # only the last one is shown
+    except queue.Empty:
+      kind = None
+    if progress is not None and not self.task.cancelled:
+      text, done, maximum = progress
+      self.progressMsg.set(text)
+      if maximum:
+        self.progress.configure(mode='determinate', maximum=maximum, value=done)
+      else:
+        self.progress.configure(mode='indeterminate')
+        self.progress.step()
+    if kind is None:                                            # still running
+      self.mainwindow.after(POLL_MS, self.pollTask)
+      return
+    self.task = None
+    self.progressBar.pack_forget()
+    if kind == 'done':
+      self.taskDone(value)
+      return
+    if self.taskFailed is not None:
+      self.taskFailed(value)
+    if isinstance(value, Cancelled):
+      print('Cancelled')
+    elif isinstance(value, json.decoder.JSONDecodeError):
+      tk.messagebox.showwarning(title='Invalid JSON', message=value)
+    elif isinstance(value, OSError):
+      tk.messagebox.showwarning(title='Can not open', message=value)
+    else:
+      raise value
+
+  def cancelTask(self):
+    if self.task is not None:
+      self.task.cancel()
+      self.progressMsg.set('Cancelling...')
+
+  def compareProgress(self, comparison, containers, nodes, mismatches):
+    """ Comparison progress report, called in the Task
+    """
+    self.task.progress('Comparing: {} nodes, {} mismatches'.format(nodes, mismatches), 
+                       containers, len(comparison.jsonHash['1']))
+
+  def loadJson(self, files, compare, done):
+    """ Load files [(jsonId, file name)] into the current comparison in a Task
+    
+        The comparison is compared again when compare is set. done() is 
+        called when finished, on failure the files loaded before are kept
+    """
+    comparison = self.currentComparison
+    states = [(jsonId, comparison.fileState(jsonId)) for jsonId, fn in files]
+    def work(task):
+      total = sum(os.path.getsize(fn) for jsonId, fn in files)
+      parsed = 0
+      loaded = []
+      with comparison.phase('parse'):                           # the parsing threads may hold the GIL all the time
+        futures = loadFiles([fn for jsonId, fn in files], self.parser)  # both files load at the same time
+        for (jsonId, fn), future in zip(files, futures):
+          task.progress('Parsing: {}'.format(os.path.basename(fn)), parsed, total)
+          loaded.append(future.result())
+          parsed += os.path.getsize(fn)
+      for (jsonId, fn), data in zip(files, loaded):
+        task.progress('Fingerprinting: {}'.format(os.path.basename(fn)), parsed, total)
+        digest = None if self.cache is None else self.cache.fileDigest(fn)
+        comparison.setJson(jsonId, data, digest=digest)
+        comparison.jsonIndex[jsonId] = None                     # indexed by the first search, see indexFiles
+      if compare:
+        task.progress('Comparing')
+        comparison.compare()
+    def finished(result):
+      for jsonId, fn in files:
+        comparison.jsonPath[jsonId] = fn                        # Save file name
+        self.jsonPath[jsonId].set(fn)                           # Update TreeView title
+      if comparison in self.comparison:                         # tab not closed in the meantime
+        done()
+    def failed(error):
+      for jsonId, state in states:
+        comparison.restoreFile(jsonId, state)
+    return self.runTask(work, finished, failed)
+
   def onTabChange(self, event):                                 # Selected new tab
     index = self.notebook.index('current')                      # Get current tab index
     if index==self.newDiffTab:                                  # Do nothing when on newDiff Frame
       return
     self.currentComparison = self.comparison[index]             # set correct currentComparison for the tab
     self.mismatchMsg.set(self.currentComparison.getMismatch())
+    self.updateStats()
     print('Changed Tab {}:{} - {}'.format(index, self.comparison.index(self.currentComparison),
                                           self.currentComparison.jsonPath))
+    if self.currentComparison.unloaded is not None:
+      self.restoreTab()
+    else:
+      self.useTab(self.currentComparison)
+
+  def useTab(self, comparison):
+    """ Make comparison the most recently shown, unload the tabs shown least
+        recently while the loaded tabs are over the memory budget
+    
+        Nothing is unloaded while a Task runs, the shown tab is never unloaded
+    """
+    if comparison in self.recent:
+      self.recent.remove(comparison)
+    self.recent.append(comparison)
+    if self.memoryBudget is None or self.task is not None:
+      return
+    loaded = [other for other in self.recent if other.unloaded is None]
+    total = sum(other.memorySize() for other in loaded)
+    for other in loaded[:-1]:
+      if total <= self.memoryBudget:
+        break
+      total -= other.memorySize()
+      self.unloadTab(other)
+
+  def unloadTab(self, comparison):
+    """ Drop the json data and TreeView items of a tab, they are made again when it is shown
+    """
+    for jsonId in ('1', '2'):
+      view = comparison.jsonView[jsonId]
+      if self.virtualView:
+        view.setData(None)
+      else:
+        view.delete(*view.get_children())
+    comparison.unload()
+    print('Unloaded Tab {} - {}'.format(comparison.tabIndex, comparison.jsonPath))
+
+  def restoreTab(self):
+    """ Load the files of the shown (unloaded) tab again, compare and show them
+    
+        Waits for a running Task
+    """
+    comparison = self.currentComparison
+    if comparison is None or comparison.unloaded is None:
+      return
+    tabIndex = self.notebook.index('current')
+    count, mismatchIndex = comparison.unloaded
+    def done():
+      comparison.unloaded = None
+      if mismatchIndex is not None and mismatchIndex < len(comparison.mismatch):
+        comparison.mismatchIndex = mismatchIndex
+      self.currentComparison = comparison
+      self.updateView(tabIndex)
+      self.useTab(comparison)
+    files = [('1', comparison.jsonPath['1']), ('2', comparison.jsonPath['2'])]
+    if not self.loadJson(files, True, done):
+      self.mainwindow.after(POLL_MS, self.restoreTab)
       
   def onTabClose(self, event):                                  # Closed tab
     """ tabs and compairson needs to be kept in sync
@@ -402,11 +696,16 @@ class App:
       popped = self.comparison.pop(index)                       # Remove comparison data
 
     print('Closed Tab {}:{} - {}'.format(index, popped.tabIndex, popped.jsonPath))
+    self.watchers.pop(popped, None)
+    if popped in self.recent:
+      self.recent.remove(popped)
     self.currentComparison = None                               # 
     if len(self.comparison) == 1:                               # Closed all comparison tabs
       self.notebook.select(self.newDiffTab)                     # show newDiff Frame
 
   def newDiff(self):                                            # Show newDiff Frame
+    if self.task is not None:
+      return
     self.newComparison()                                        # create new Comparison
     self.jsonPath['1'].set('')                                  # clear old file names
     self.jsonPath['2'].set('')                                  
@@ -415,41 +714,88 @@ class App:
     
   def reloadFile(self, jsonId):
     print('Reload File: {}'.format(jsonId))
-    try:
-      fn = self.currentComparison.jsonPath[jsonId]
-      self.currentComparison.jsonData[jsonId] = json.load(open(fn)) # Load json data
-      self.currentComparison.compare()
-      self.updateView(self.notebook.index('current'))
-    except json.decoder.JSONDecodeError as e:
-      tk.messagebox.showwarning(title='Invalid JSON', message=e)
+    self.updateFile(jsonId, self.currentComparison.jsonPath[jsonId])  # only compares the subtrees that changed
+
+  def updateFile(self, jsonId, fn, then=None):
+    """ Load fn as file jsonId of the current comparison, compare and show the changes
+    
+        then() is called after the changes are shown
+    """
+    comparison = self.currentComparison
+    tabIndex = self.notebook.index('current')
+    previous = self.previousState(jsonId)
+    def done():
+      self.currentComparison = comparison                       # the tab may have changed in the meantime
+      self.notebook.select(tabIndex)
+      self.refreshView(tabIndex, jsonId, *previous)             # Show update comparison
+      if then is not None:
+        then()
+    self.loadJson([(jsonId, fn)], True, done)
+
+  def pollFiles(self):
+    """ Reload the files of the shown comparison that changed, with --watch
+    
+        Nothing is reloaded while a Task runs, the files are looked at again
+        after it: saves coming faster than the reloads are taken together
+    """
+    self.mainwindow.after(int(POLL_INTERVAL * 1000), self.pollFiles)
+    comparison = self.currentComparison
+    if self.task is not None or comparison is None or comparison.jsonView['1'] is None or \
+       comparison.unloaded is not None or self.notebook.index('current') == self.newDiffTab:
+      return
+    fns = {comparison.jsonPath['1'], comparison.jsonPath['2']}
+    watcher = self.watchers.get(comparison)
+    if watcher is None or set(watcher.files()) != fns:          # new tab or other file opened
+      self.watchers[comparison] = FileWatcher(fns)
+      return
+    changed = watcher.poll()
+    jsonIds = [jsonId for jsonId in ('1', '2') if comparison.jsonPath[jsonId] in changed]
+    if not jsonIds:
       return
-    pass
+    print('Changed File: {}'.format(', '.join(comparison.jsonPath[jsonId] for jsonId in jsonIds)))
+    then = None                                                 # both changed: the second after the first
+    if len(jsonIds) == 2:
+      then = functools.partial(self.updateFile, '2', comparison.jsonPath['2'])
+    self.updateFile(jsonIds[0], comparison.jsonPath[jsonIds[0]], then)
 
   def exitApp(self):
     sys.exit(0)
 
   def showMismatch(self, action):
+    if self.task is not None:                                     # the mismatches are changing
+      return
+    if self.currentComparison.unloaded is not None:               # no mismatches until restoreTab compared again
+      return
     msg = {'first': self.currentComparison.firstMismatch,
            'last': self.currentComparison.lastMismatch,
            'next': self.currentComparison.nextMismatch,
            'prev': self.currentComparison.prevMismatch}
            
     mismatch = msg[action]()
-    if mismatch is None:
-      return
-    node = mismatch['node']
-    # Select path in jsonView1 and jsonView2
-    for node in mismatch['node']:
-      node[0].see(node[2])
-      node[0].selection_set(node[2])
-    self.mismatchMsg.set(mismatch['error'])
+    if mismatch is not None:
+      self.revealMismatch(mismatch)
+
+  def revealMismatch(self, mismatch):
+    # Select path in jsonView1 and jsonView2, inserting the items when needed
+    for jsonId, path in (('1', mismatch.path), ('2', mismatch.path2)):
+      if path is not None:
+        self.showPath(jsonId, path)
+    self.mismatchMsg.set(mismatch.error)
     
   def searchProperty(self, event=None):
-    if not self.searchStr:
+    if not self.searchStr.get() or self.task is not None:
+      return
+    comparison = self.currentComparison
+    if comparison.unloaded is not None:                         # no json data until restoreTab loads it again
+      return
+    jsonIds = [jsonId for jsonId in ('1', '2')
+               if comparison.jsonIndex[jsonId] is None and comparison.jsonData[jsonId] is not None]
+    if jsonIds:                                                 # first search, index the files first
+      self.indexFiles(comparison, jsonIds)
       return
     self.currentComparison.search = {'1':[], '2':[]}
-    self.search(self.currentComparison.jsonView['1'],'1')
-    self.search(self.currentComparison.jsonView['2'],'2')
+    self.search('1')
+    self.search('2')
     # (dis-)enable search next & prev buttons
     enabled = len(self.currentComparison.search['1']) > 1 or \
               len(self.currentComparison.search['2']) > 1
@@ -457,37 +803,51 @@ class App:
     self.searchPrevBtn.configure(state='normal' if enabled else 'disabled')
     self.currentComparison.searchIndex = {'1':-1, '2':-1}
     self.searchNext()
+    self.updateStats()
+    
+  def indexFiles(self, comparison, jsonIds):
+    """ Build the search index of the files in a Task, then search
     
-  def search(self, tree, f):
-    def get_all_children(tree, item=""):
-      children = tree.get_children(item)
-      for child in children:
-        children += get_all_children(tree, child)
-      return children
-
-    for item_id in get_all_children(tree):
-      tree.item(item_id, open=False)                              # Collapse tree view
-      item_text = str(tree.item(item_id, 'text'))                 # get item text
-      if self.searchStr.get().lower() in item_text.lower():       # matches search term?
-        self.currentComparison.search[f].append((tree,item_id))   # Yes add the searchList
+        Loading a file does not index it, that is only worth it when searching
+    """
+    def work(task):
+      for jsonId in jsonIds:
+        task.progress('Indexing: {}'.format(os.path.basename(comparison.jsonPath[jsonId] or '')))
+        with comparison.phase('index'):
+          comparison.jsonIndex[jsonId] = SearchIndex(comparison.jsonData[jsonId])
+    def done(result):
+      if comparison is self.currentComparison:                  # still the shown tab
+        self.searchProperty()
+    self.runTask(work, done)
+
+  def search(self, f):
+    """ Look up the search term in the search index of the json data
+    
+        Only the items of the results are inserted, when they are shown
+    """
+    with self.currentComparison.phase('search'):
+      index = self.currentComparison.jsonIndex[f]
+      if index is None:                                           # no data to index
+        index = self.currentComparison.jsonIndex[f] = SearchIndex(self.currentComparison.jsonData[f])
+      self.currentComparison.search[f] = index.search(self.searchStr.get())
 
   def searchNext(self):
-    for jsonId in self.currentComparison.search:
-      l = len(self.currentComparison.search[jsonId])              # get search result length
-      idx = (self.currentComparison.searchIndex[jsonId] + 1) % l  # wrap arounf searchIndex
-      self.currentComparison.searchIndex[jsonId] = idx            # save latest searchIndex
-      tree, item_id = self.currentComparison.search[jsonId][idx]  # show search result
-      tree.see(item_id)
-      tree.selection_set(item_id)
+    self.showSearch(1)
       
   def searchPrev(self):
+    self.showSearch(-1)
+
+  def showSearch(self, step):
+    if self.task is not None:
+      return
     for jsonId in self.currentComparison.search:
       l = len(self.currentComparison.search[jsonId])              # get search result length
-      idx = (self.currentComparison.searchIndex[jsonId] - 1) % l  # wrap arounf searchIndex
+      if not l:
+        continue
+      idx = (self.currentComparison.searchIndex[jsonId] + step) % l  # wrap around searchIndex
       self.currentComparison.searchIndex[jsonId] = idx            # save latest searchIndex
-      tree, item_id = self.currentComparison.search[jsonId][idx]  # show search result
-      tree.see(item_id)
-      tree.selection_set(item_id)
+      entry = self.currentComparison.search[jsonId][idx]          # show search result
+      self.showPath(jsonId, self.currentComparison.jsonIndex[jsonId].pathKeys(entry))
       
   def selectFile(self, data):
     action, jsonId = data.split('_')                              # get action new/open
@@ -495,26 +855,21 @@ class App:
                             title = "Select file",
                             filetypes = (("json files","*.json"),
                                          ("all files","*.*")))
-    if fn is None:                                                # No file selected or Cancel pressed
+    if not fn:                                                    # No file selected or Cancel pressed
       return                                                      # Do nothing
     self.userPath = os.path.dirname(fn)                           # save last used path
     print('Select File: {}'.format(fn))
-    self.loadJson(fn, jsonId)                                     # Load json data
-
     if action == 'new':                                           # if new comparison
-      self.enableCompare()                                        # Enable compare button when both files loaded
+      self.loadJson([(jsonId, fn)], False, self.enableCompare)    # Enable compare button when both files loaded
     else:                                                         # Update existing comparison
-      self.currentComparison.compare()                            # Compare newly loaded file with old file
-      self.updateView(self.notebook.index('current'))             # Show update comparison
+      self.updateFile(jsonId, fn)                                 # Compare newly loaded file with old file
 
-  def loadJson(self, fn, jsonId):
-    try:
-      self.currentComparison.jsonData[jsonId] = json.load(open(fn)) # Load json data
-      self.currentComparison.jsonPath[jsonId] = fn                # Save file name
-      self.jsonPath[jsonId].set(fn)                               # Update TreeView title
-    except json.decoder.JSONDecodeError as e:
-      tk.messagebox.showwarning(title='Invalid JSON', message=e)
-    return
+  def selectRules(self):
+    fn = fd.askopenfilename(initialdir = self.userPath,
+                            title = "Select rules file",
+                            filetypes = (("all files","*.*"),))
+    if fn:
+      self.rulesPath.set(fn)
 
   def enableCompare(self):
     """ Enable compare button if both files are loaded
@@ -523,97 +878,538 @@ class App:
        self.currentComparison.jsonData['2']:
       self.diffBtn.configure(state='normal')
 
+  def tabRules(self):
+    """ (ignore, include) patterns of a new comparison, None when the rules file is invalid
+    """
+    ignore, include = (), ()
+    if self.rulesPath.get():
+      try:
+        ignore, include = readRules(self.rulesPath.get())
+      except (OSError, ValueError) as e:
+        tk.messagebox.showwarning(title='Invalid rules', message=e)
+        return None
+    return self.options['ignore'] + tuple(ignore), self.options['include'] + tuple(include)
+
   def jsonDiff(self):
-    self.notebook.insert('end', self.diffFrame())
-    tabIndex = self.notebook.index('end') - 1
-    print('Current tab  {}:{}'.format(tabIndex, self.currentComparison.tabIndex))
-    self.currentComparison.compare()
-    self.updateView(tabIndex);
-    self.notebook.hide(self.newDiffTab)
-    self.notebook.select(tabIndex)
+    comparison = self.currentComparison
+    rules = self.tabRules()
+    if rules is None:
+      return
+    ignore, include = rules
+    if (ignore, include) != (comparison.ignore, comparison.include):
+      comparison.setRules(ignore, include)                      # fingerprinted again by compare
+    def work(task):
+      task.progress('Comparing')
+      comparison.compare()
+    def done(result):
+      self.currentComparison = comparison
+      self.notebook.insert('end', self.diffFrame())
+      tabIndex = self.notebook.index('end') - 1
+      print('Current tab  {}:{}'.format(tabIndex, self.currentComparison.tabIndex))
+      self.updateView(tabIndex);
+      self.notebook.hide(self.newDiffTab)
+      self.notebook.select(tabIndex)
+      self.useTab(comparison)
+    self.runTask(work, done)
+
+  def selectVariants(self):
+    """ Select the variants compared with JSON File 1 in an N-way comparison
+    """
+    baseline = self.jsonPath['1'].get()
+    if not baseline:
+      tk.messagebox.showwarning(title='No baseline', message='Select JSON File 1, the variants are compared with it')
+      return
+    fns = fd.askopenfilenames(initialdir = self.userPath,
+                              title = "Select variants",
+                              filetypes = (("json files","*.json"),
+                                           ("all files","*.*")))
+    if fns:
+      self.userPath = os.path.dirname(fns[0])
+      self.nwayDiff(baseline, list(fns))
+
+  def nwayDiff(self, baseline, variants):
+    """ Compare the variants with baseline in a new tab, see nwayFrame
+    
+        The N-way comparison takes the place of the new comparison
+    """
+    rules = self.tabRules()
+    if rules is None or self.task is not None:
+      return
+    options = dict(self.options, ignore=rules[0], include=rules[1])
+    comparison = NwayComparison(0, variants, self.parser, **options)
+    if self.showStats:
+      comparison.enableStats(Stats())
+    comparison.enableProgress(functools.partial(self.compareProgress, comparison))
+    def work(task):
+      task.progress('Parsing: {}'.format(os.path.basename(baseline)))
+      comparison.loadBaseline(baseline)
+      done = 0
+      def report(index, result):
+        nonlocal done
+        done += 1
+        task.progress('Compared: {}'.format(os.path.basename(result['file'])), done, len(variants))
+      results = comparison.compareAll(report)
+      shown = [index for index, result in enumerate(results) if result['status'] != FAILED]
+      shown.sort(key=lambda index: results[index]['status'] != DIFFERENT)  # the first different variant
+      if shown:
+        task.progress('Comparing: {}'.format(os.path.basename(variants[shown[0]])))
+        comparison.compareVariant(variants[shown[0]])
+    def done(result):
+      if self.comparison[-1] is not None and self.comparison[-1].jsonView['1'] is None:
+        self.comparison[-1] = comparison                        # instead of the new comparison without a tab
+      else:
+        self.comparison.append(comparison)
+      comparison.tabIndex = len(self.comparison) - 1
+      self.currentComparison = comparison
+      self.notebook.insert('end', self.nwayFrame())
+      tabIndex = self.notebook.index('end') - 1
+      self.updateView(tabIndex)
+      self.notebook.hide(self.newDiffTab)
+      self.notebook.select(tabIndex)
+      self.useTab(comparison)
+    self.runTask(work, done)
+
+  def nwayFrame(self):
+    """ Tab of an N-way comparison: the paths where the variants differ 
+        above the panes of the baseline and the selected variant
+    """
+    comparison = self.currentComparison
+    panedWindow = ttk.Panedwindow(self.notebook, orient='vertical')
+    top = ttk.Frame(panedWindow)
+    # variant shown as file 2
+    variantBar = ttk.Frame(top)
+    label = ttk.Label(variantBar)
+    label.configure(text='Variant')
+    label.pack(padx='5', side='left')
+    variant = ttk.Combobox(variantBar)
+    variant.configure(state='readonly', values=[variantText(result) for result in comparison.results])
+    if comparison.jsonPath['2'] in comparison.variants:
+      variant.current(comparison.variants.index(comparison.jsonPath['2']))
+    variant.pack(expand=1, fill='x', padx='5', side='left')
+    variantBar.pack(fill='x', side='top')
+    # differing paths
+    paths = ttk.Treeview(top, columns=('count', 'variants'), height='6')
+    paths.heading('#0', text='Path')
+    paths.heading('count', text='Variants')
+    paths.heading('variants', text='Differing variants')
+    paths.column('count', width='80', stretch=False)
+    rows = {}                                                   # item: (path, variant indexes)
+    for path, indexes in comparison.differingPaths().items():
+      item = paths.insert('', 'end', text=path, 
+                          values=('{} of {}'.format(len(indexes), len(comparison.variants)),
+                                  ', '.join(os.path.basename(comparison.variants[index]) for index in indexes)))
+      rows[item] = (path, indexes)
+    paths.pack(expand=1, fill='both', side='top')
+    
+    def variantSelected(event):
+      index = variant.current()
+      if comparison.jsonPath['2'] in comparison.variants:       # shown when compared
+        variant.current(comparison.variants.index(comparison.jsonPath['2']))
+      self.selectVariant(comparison, index, variant)
+    def pathSelected(event):
+      if not paths.selection() or self.task is not None:
+        return
+      path, indexes = rows[paths.selection()[0]]
+      if comparison.jsonPath['2'] in comparison.variants and \
+         comparison.variants.index(comparison.jsonPath['2']) in indexes:
+        self.showVariantMismatch(path)
+      else:                                                     # show a variant differing at path
+        self.selectVariant(comparison, indexes[0], variant, path)
+    variant.bind('<<ComboboxSelected>>', variantSelected)
+    paths.bind('<<TreeviewSelect>>', pathSelected)
+    panedWindow.add(top, weight='1')
+    panedWindow.add(self.diffFrame(panedWindow), weight='3')
+    return panedWindow
+
+  def selectVariant(self, comparison, index, variant, path=None):
+    """ Show variant index of an N-way comparison as file 2, then its mismatch at path (reportPath)
+    """
+    if self.task is not None or comparison is not self.currentComparison:
+      return
+    def shown():
+      variant.current(index)
+      if path is not None:
+        self.showVariantMismatch(path)
+    self.updateFile('2', comparison.variants[index], shown)
+
+  def showVariantMismatch(self, path):
+    """ Show the mismatch of the current (N-way) comparison at path (reportPath)
+    """
+    comparison = self.currentComparison
+    for index, mismatch in enumerate(comparison.mismatch):
+      if reportPath(mismatch) == path:
+        comparison.mismatchIndex = index
+        self.revealMismatch(mismatch)
+        return
 
   def updateView(self, tabIndex):
     
     title = '{} - {}'.format(os.path.basename(self.currentComparison.jsonPath['1']),
                              os.path.basename(self.currentComparison.jsonPath['2']))
     self.notebook.tab(tabIndex, text=title)
-    #Clear the treeview list items
-    for item in self.currentComparison.jsonView['1'].get_children():
-      self.currentComparison.jsonView['1'].delete(item)
-    self.insertNodes(self.currentComparison.jsonView['1'], 
-                     self.currentComparison.jsonData['1'], 
-                     '1')
-     #Clear the treeview list items
-    for item in self.currentComparison.jsonView['2'].get_children():
-      self.currentComparison.jsonView['2'].delete(item)
-    self.insertNodes(self.currentComparison.jsonView['2'], 
-                     self.currentComparison.jsonData['2'],
-                     '2')
+    with self.currentComparison.phase('render'):
+      if self.virtualView:                                      # only the rows in the window are drawn
+        for jsonId in ('1', '2'):
+          self.currentComparison.jsonView[jsonId].setData(self.currentComparison.jsonData[jsonId])
+      else:
+        #Clear the treeview list items
+        for item in self.currentComparison.jsonView['1'].get_children():
+          self.currentComparison.jsonView['1'].delete(item)
+        self.insertNodes(self.currentComparison.jsonView['1'], 
+                         self.currentComparison.jsonData['1'], 
+                         '1')
+         #Clear the treeview list items
+        for item in self.currentComparison.jsonView['2'].get_children():
+          self.currentComparison.jsonView['2'].delete(item)
+        self.insertNodes(self.currentComparison.jsonView['2'], 
+                         self.currentComparison.jsonData['2'],
+                         '2')
     msg = self.currentComparison.getMismatch()
     self.mismatchMsg.set(msg)
+    self.updateStats()
+
+  def updateStats(self):
+    """ Show the stats of the current comparison in the status bar
+    """
+    if self.currentComparison is not None and self.currentComparison.stats is not None:
+      self.statsMsg.set(self.currentComparison.stats.summary())
+
+  def previousState(self, jsonId):
+    """ What refreshView needs to know about the comparison before jsonId is (re)loaded
+    """
+    return (self.currentComparison.jsonData[jsonId], 
+            self.currentComparison.jsonHash[jsonId], 
+            self.currentComparison.mismatch)
+
+  def refreshView(self, tabIndex, jsonId, data, dataHash, mismatch):
+    """ Update the TreeViews after file jsonId was (re)loaded and compared
+    
+        data, dataHash and mismatch are the json data, fingerprints and 
+        mismatches from before. Only the items of jsonId with changed content
+        are inserted again, the other items only get their tags updated.
+    """
+    with self.currentComparison.phase('render'):
+      self.refreshTrees(jsonId, data, dataHash, mismatch)
+    title = '{} - {}'.format(os.path.basename(self.currentComparison.jsonPath['1']),
+                             os.path.basename(self.currentComparison.jsonPath['2']))
+    self.notebook.tab(tabIndex, text=title)
+    self.mismatchMsg.set(self.currentComparison.getMismatch())
+    self.updateStats()
+
+  def refreshTrees(self, jsonId, data, dataHash, mismatch):
+    """ Update the items of jsonId and the tags of the changed mismatches
+    """
+    comparison = self.currentComparison
+    tree = comparison.jsonView[jsonId]
+    comparison.search[jsonId] = []                              # results are entries of the old index
+    comparison.searchIndex[jsonId] = -1
+    if self.virtualView:                                        # keeps what was expanded, the tags are redrawn
+      tree.setData(comparison.jsonData[jsonId])
+      comparison.jsonView['2' if jsonId == '1' else '1'].redraw()
+      return
+    if self.foldIdentical:                                      # the folds of both files may hide mismatches now
+      for f in ('1', '2'):
+        comparison.jsonView[f].delete(*comparison.jsonView[f].get_children())
+        self.insertNodes(comparison.jsonView[f], comparison.jsonData[f], f)
+      return
+    new = comparison.jsonData[jsonId]
+    if dataHash is not None and sameShape(data, new):
+      replaced = []
+      self.refreshItems(jsonId, data, new, '$', '', dataHash, replaced)
+      tree.delete(*[child for parent, position, key, value, path, child in replaced])
+      items = comparison.jsonItems[jsonId]
+      lazy = comparison.jsonLazy[jsonId]
+      for path, item in list(items.items()):                    # forget the deleted items
+        if not tree.exists(item):
+          del items[path]
+          lazy.pop(item, None)
+      for parent, position, key, value, path, child in replaced:
+        self.insertNode(tree, parent, key, value, path, jsonId, position)
+    else:                                                       # different top level, start over
+      tree.delete(*tree.get_children())
+      self.insertNodes(tree, new, jsonId)
+    for changed in set(mismatch).symmetric_difference(comparison.mismatch):  # mismatches not found by both compares
+      for f, keys in (('1', changed.path), ('2', changed.path2)):
+        if keys is None:
+          continue
+        paths = [keys[:depth] for depth in range(len(keys) + 1)]  # the path and the paths above it
+        if changed.kind == CHANGED_RANGE:
+          paths.extend(keys[:-1] + (index,) for index in range(keys[-1] + 1, keys[-1] + len(changed.value1)))
+        for path in map(pathText, paths):
+          item = comparison.jsonItems[f].get(path)
+          if item is not None:
+            comparison.jsonView[f].item(item, tags=self.itemTags(comparison, path, f))
+
+  def refreshItems(self, f, old, new, path, parent, oldHash, replaced):
+    """ Compare the children of 2 versions of an expanded object/list with the same keys
+    
+        Unchanged children keep their items, (replaced) collects the children 
+        to insert again
+    """
+    comparison = self.currentComparison
+    items = comparison.jsonItems[f]
+    newHash = comparison.jsonHash[f]
+    if type(new) is dict:
+      children = ((key, old[key], value, '{}.{}'.format(path, key)) for key, value in new.items())
+    else:
+      children = ((index, old[index], value, '{}[{}]'.format(path, index)) for index, value in enumerate(new))
+    for position, (key, oldValue, value, childPath) in enumerate(children):
+      child = items.get(childPath)
+      if child is None:
+        continue
+      if type(oldValue) is not type(value):
+        same = False
+      elif type(value) in (dict, list):                         # the fingerprints leave out what the rules exclude
+        same = comparison.rules is None and oldHash.get(id(oldValue)) == newHash.get(id(value))
+      else:
+        same = oldValue == value
+      if same:                                                  # point the items to the new data
+        self.remapItems(f, value, childPath, child)
+      elif sameShape(oldValue, value) and child not in comparison.jsonLazy[f]:
+        self.refreshItems(f, oldValue, value, childPath, child, oldHash, replaced)
+      else:
+        replaced.append((parent, position, key, value, childPath, child))
+
+  def remapItems(self, f, value, path, item):
+    """ Point the (not yet expanded) items of an unchanged subtree to the new json data
+    """
+    comparison = self.currentComparison
+    lazy = comparison.jsonLazy[f]
+    if item in lazy:
+      lazy[item] = (value, path)
+      return
+    items = comparison.jsonItems[f]
+    if type(value) is dict:
+      children = ((child, '{}.{}'.format(path, key)) for key, child in value.items())
+    elif type(value) is list:
+      children = ((child, '{}[{}]'.format(path, index)) for index, child in enumerate(value))
+    else:
+      return
+    for child, childPath in children:
+      if type(child) in (dict, list) and childPath in items:
+        self.remapItems(f, child, childPath, items[childPath])
 
   def insertNodes(self, tree, data, f='1'):
+    """ Insert the top level of data, deeper levels are inserted when opened
+    """
+    self.configureTags(tree)
+    self.currentComparison.jsonItems[f] = {}
+    self.currentComparison.jsonLazy[f] = {}
+    self.currentComparison.jsonFolds[f] = {}
+    if isinstance(data, (list, dict)):
+      self.insertChildren(tree, "", data, '$', f)
+              
+  def configureTags(self, tree):
     tree.tag_configure('mismatch', background='tan1')
     tree.tag_configure('missing', background='medium sea green')
-    parent = ""
-    if isinstance(data, list):
-      for index, value in enumerate(data):
-        path = '$[{}]'.format(index)
-        self.insertNode(tree, parent, index, value, path, f)
-    elif isinstance(data, dict):
-      for (key, value) in data.items():
-        path = '$.{}'.format(key)
-        self.insertNode(tree, parent, key, value, path, f)
-              
-  def insertNode(self, tree, parent, key, value, path='$', f='1'):
-    if path in self.currentComparison.mismatch:
-      error = self.currentComparison.mismatch[path]['error'].split()[0]
-      tags = ('missing' if error=='Missing' else 'mismatch')
-      #print('Match: ',path, tags)
-    else: 
-      tags = ()
-      
-    if type(value) in (list, tuple):
-      node = tree.insert(parent, 
-                         'end', 
-                         text='{} [{}]'.format(key, len(value)), 
-                         tags=tags, 
-                         open=False)
-      for index, item in enumerate(value):    # list what is shown with [:MAX_N_SHOW_ITEM]
-        self.insertNode(tree, node, index, item, '{}[{}]'.format(path,index), f)
-    elif type(value) in (dict,):
-      node = tree.insert(parent, 
-                         'end', 
-                         text='{} {{{}}}'.format(key, len(value)), 
-                         tags=tags, 
-                         open=False)
-      for key, item in value.items():
-        self.insertNode(tree, node, key, item, '{}.{}'.format(path, key), f)
-    elif type(value) in (str,):
-      node = tree.insert(parent, 
-                         'end', 
-                         text='{}: "{}"'.format(key, value), 
-                         tags=tags, 
-                         open=False)
-    elif type(value) in (int,float):
-      node = tree.insert(parent, 
-                         'end', 
-                         text='{}: {}'.format(key, value), 
-                         tags=tags, 
-                         open=False)
-    else:
-      node = tree.insert(parent, 
-                         'end', 
-                         text='{}: {}'.format(key, self.json_conv[value]),
-                         tags=tags,
-                         open=False)
-    if tags:
-      self.currentComparison.mismatch[path]['node'].append((tree, parent, node))
-      print(f,node)
+    tree.tag_configure('ancestor', foreground='sienna')         # has mismatches below it
+    tree.tag_configure('identical', foreground='grey50')        # folded children
+
+  def mismatchTags(self, mismatch):
+    if mismatch is None:
+      return ()
+    return ('missing' if mismatch.kind in (MISSING_PROPERTY, MISSING_ELEMENT) else 'mismatch')
+
+  def itemTags(self, comparison, path, f):
+    """ Tags of the item of path (text) in file f: its mismatch, else if it has mismatches below it
+    """
+    mismatch = comparison.findMismatch(path, f)
+    if mismatch is not None:
+      return self.mismatchTags(mismatch)
+    return ('ancestor',) if comparison.mismatchChildren(path, f) is not None else ()
+
+  def insertChildren(self, tree, parent, value, path, f):
+    """ Insert the children of value, the object/list at path, below parent
+    
+        Only the children with mismatches at or below them are looked up. 
+        With foldIdentical the runs of the other children are folded when
+        value has mismatches below it, see insertFold
+    """
+    dirty = self.currentComparison.mismatchChildren(path, f)    # keys of the children with mismatches
+    keys = value if type(value) is dict else range(len(value))
+    if not self.foldIdentical or dirty is None:
+      for key in keys:
+        self.insertNode(tree, parent, key, value[key], childPath(path, key), f, 
+                        clean=dirty is None or key not in dirty)
+    elif type(value) is dict:
+      run = []
+      for key in keys:
+        if key in dirty:
+          self.insertFold(tree, parent, value, path, run, f)
+          run = []
+          self.insertNode(tree, parent, key, value[key], childPath(path, key), f)
+        else:
+          run.append(key)
+      self.insertFold(tree, parent, value, path, run, f)
+    else:                                                       # the runs between the dirty indexes
+      start = 0
+      for index in sorted(index for index in dirty if index < len(value)):
+        self.insertFold(tree, parent, value, path, range(start, index), f)
+        self.insertNode(tree, parent, index, value[index], childPath(path, index), f)
+        start = index + 1
+      self.insertFold(tree, parent, value, path, range(start, len(value)), f)
+
+  def insertFold(self, tree, parent, value, path, keys, f):
+    """ Insert the children keys of value without mismatches, FOLD_MIN or more as one item
+
+        The item is replaced by the children when it is opened
+    """
+    if len(keys) < FOLD_MIN:
+      for key in keys:
+        self.insertNode(tree, parent, key, value[key], childPath(path, key), f, clean=True)
+      return
+    node = tree.insert(parent, 'end', text='identical ({} items)'.format(len(keys)), tags=('identical',), 
+                       open=False)
+    tree.insert(node, 'end', text='')                           # placeholder, makes the item openable
+    self.currentComparison.jsonFolds[f][node] = (parent, value, path, keys)
+
+  def insertNode(self, tree, parent, key, value, path='$', f='1', position='end', clean=False):
+    """ Insert the item of a json node, clean: no mismatches at or below it
+    """
+    tags = () if clean else self.itemTags(self.currentComparison, path, f)
+    node = tree.insert(parent, 
+                       position, 
+                       text=itemText(key, value), 
+                       tags=tags, 
+                       open=False)
+    if type(value) in (list, tuple, dict) and value:          # children are inserted when opened
+      tree.insert(node, 'end', text='')                         # placeholder, makes the item openable
+      self.currentComparison.jsonLazy[f][node] = (value, path)
+    self.currentComparison.jsonItems[f][path] = node
+
+  def onTreeOpen(self, event, f):
+    if self.task is not None:                                   # the mismatches are changing, open it later
+      event.widget.item(event.widget.focus(), open=False)
+      return
+    self.expandNode(f, event.widget.focus())                    # focus is the item being opened
+
+  def expandNode(self, f, node):
+    """ Replace the placeholder of node with its children, or a folded item with the children it folds
+    
+        Returns False when there is nothing (left) to insert
+    """
+    if node in self.currentComparison.jsonFolds[f]:
+      self.unfold(f, node)
+      return True
+    if node not in self.currentComparison.jsonLazy[f]:
+      return False
+    value, path = self.currentComparison.jsonLazy[f].pop(node)
+    tree = self.currentComparison.jsonView[f]
+    with self.currentComparison.phase('render'):
+      tree.delete(*tree.get_children(node))                     # remove placeholder
+      self.insertChildren(tree, node, value, path, f)
+    return True
+
+  def unfold(self, f, node):
+    """ Replace a folded item with the children it folds
+    """
+    parent, value, path, keys = self.currentComparison.jsonFolds[f].pop(node)
+    tree = self.currentComparison.jsonView[f]
+    with self.currentComparison.phase('render'):
+      position = tree.index(node)
+      tree.delete(node)
+      for offset, key in enumerate(keys):
+        self.insertNode(tree, parent, key, value[key], childPath(path, key), f, position + offset, clean=True)
+
+  def unfoldChildren(self, f, parent):
+    """ Unfold the folded children of parent, returns False when there are none
+    """
+    folds = [node for node, fold in self.currentComparison.jsonFolds[f].items() if fold[0] == parent]
+    for node in folds:
+      self.unfold(f, node)
+    return bool(folds)
+
+  def showPath(self, f, path):
+    """ Select path (tuple) in the view of file f and scroll it into view
+    """
+    view = self.currentComparison.jsonView[f]
+    if self.virtualView:
+      view.see(path)
+      return
+    item = self.revealPath(f, pathText(path))
+    if item is not None:
+      view.see(item)
+      view.selection_set(item)
+
+  def revealPath(self, f, path):
+    """ Insert the TreeView items down to path
+    
+        Returns the item of path, None when path is not in the json data
+    """
+    items = self.currentComparison.jsonItems[f]
+    while path not in items:
+      end = len(path)
+      while True:                                               # find the deepest inserted parent
+        end = max(path.rfind('.', 0, end), path.rfind('[', 0, end))
+        if end <= 0:
+          parent = ""                                           # the top level
+          break
+        if path[:end] in items:
+          parent = items[path[:end]]
+          break
+      if not (parent and self.expandNode(f, parent)) and not self.unfoldChildren(f, parent):
+        return None                                             # already expanded: path not available
+    return items[path]
 
   def run(self):
       self.mainwindow.mainloop()
 
 
+class Task(threading.Thread):
+  """ Work done in a background thread, reported to the Tk main loop through a queue
+  
+      work(task) runs in the thread, task.progress() reports how far it got
+      and raises Cancelled after cancel(). The queue gets ('progress', 
+      (text, value, maximum)) messages, then ('done', result) or ('failed', error)
+  """
+  def __init__(self, work):
+    super().__init__(daemon=True)
+    self.work = work
+    self.queue = queue.Queue()
+    self.cancelled = False
+
+  def run(self):
+    try:
+      result = self.work(self)
+    except Exception as e:
+      self.queue.put(('failed', e))
+    else:
+      self.queue.put(('done', result))
+
+  def cancel(self):
+    self.cancelled = True
+
+  def progress(self, text, value=None, maximum=None):
+    """ Report progress, value of maximum, None: unknown
+    """
+    if self.cancelled:
+      raise Cancelled()
+    self.queue.put(('progress', (text, value, maximum)))
+
+
+def variantText(result):
+  """ Variant and its status, for the variant list of an N-way comparison
+  """
+  if result['status'] == FAILED:
+    return '{}: failed'.format(result['file'])
+  if result['status'] == DIFFERENT:
+    return '{}: {} mismatches'.format(result['file'], len(result['mismatches']))
+  return '{}: identical'.format(result['file'])
+
+
+def childPath(path, key):
+  """ Path (text) of child key (property or list index) of path
+  """
+  return '{}[{}]'.format(path, key) if type(key) is int else '{}.{}'.format(path, key)
+
+
+def sameShape(old, new):
+  """ Check if 2 versions of json data are objects with the same keys or lists with the same length
+  """
+  if type(old) is dict and type(new) is dict:
+    return list(old) == list(new)
+  return type(old) is list and type(new) is list and len(old) == len(new)
+
+
 if __name__=='__main__':
   print('to be imported')  
@@ -0,0 +1,80 @@
+import os
+import json
+import mmap
+import concurrent.futures
+
+try:
+  import orjson
+except ImportError:                                   # optional, the json module is used instead
+  orjson = None
+
+
+def parseJson(buffer):
+  """ Parse a utf-8 buffer with the json module
+  """
+  return json.loads(str(buffer, 'utf-8'))
+
+
+def parseOrjson(buffer):
+  """ Parse a utf-8 buffer with orjson, falls back to the json module for
+      what orjson does not accept (NaN, Infinity, big integers) and for
+      the error message of invalid json
+  """
+  try:
+    with memoryview(buffer) as view:
+      return orjson.loads(view)
+  except orjson.JSONDecodeError:
+    return parseJson(buffer)
+
+
+PARSERS = {'json': parseJson}                         # name: function parsing a utf-8 buffer
+if orjson is not None:
+  PARSERS['orjson'] = parseOrjson
+DEFAULT_PARSER = 'orjson' if orjson is not None else 'json'
+
+
+def registerParser(name, parse, default=False):
+  """ Add a parser, parse(buffer) returns the json data of a utf-8 buffer
+      (bytes like object) and raises a json.JSONDecodeError for invalid json
+  """
+  global DEFAULT_PARSER
+  PARSERS[name] = parse
+  if default:
+    DEFAULT_PARSER = name
+
+
+def loadJson(fn, parser=None):
+  """ Load a json file, memory mapped and parsed with parser (default: the
+      fastest available)
+  """
+  parse = PARSERS[parser or DEFAULT_PARSER]
+  with open(fn, 'rb') as fp:
+    if not os.fstat(fp.fileno()).st_size:             # empty files can not be mapped
+      return parse(b'')
+    with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+      if hasattr(mm, 'madvise'):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+      return parse(mm)
+
+
+def loadsJson(buffer, parser=None):
+  """ Parse json from a utf-8 buffer (bytes like object)
+  """
+  return PARSERS[parser or DEFAULT_PARSER](buffer)
+
+
+def loadFiles(fns, parser=None):
+  """ Start loading json files at the same time, in threads
+
+      Returns a Future per file, its result() is the json data or raises
+      the error of loading that file. The threads overlap the file reading
+      with parsing; parsers that release the GIL parse in parallel too
+  """
+  executor = concurrent.futures.ThreadPoolExecutor(len(fns))
+  futures = [executor.submit(loadJson, fn, parser) for fn in fns]
+  executor.shutdown(wait=False)
+  return futures
+
+
+if __name__=='__main__':
+  print('to be imported')
@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import argparse
+import concurrent.futures
+
+from jsonComparison import Comparison, comparisonOptions, pathText, CHANGED_RANGE
+from jsonLoader import loadJson, PARSERS, DEFAULT_PARSER
+from jsonRules import argumentRules
+from jsonBatch import IDENTICAL, DIFFERENT, FAILED
+
+shared = None                                         # NwayComparison of the parent, inherited by forked workers
+baseline = None                                       # NwayComparison of a worker process
+
+
+class NwayComparison(Comparison):
+  """ Many variants compared with one baseline
+
+      The baseline is file 1, it is parsed and fingerprinted once and kept
+      for all variants. File 2 is the variant compared last, a variant pair
+      with the same subtree fingerprints as the variant before it replays
+      its mismatches (see cachedDiff). With workers > 1 the variants are
+      compared in worker processes, a variant is one unit of work
+  """
+  def __init__(self, index=0, variants=(), parser=None, **options):
+    Comparison.__init__(self, index, **options)
+    self.jobs = self.workers                          # worker processes comparing the variants
+    self.workers = 1                                  # a variant is compared in one process
+    self.variants = list(variants)                    # file names of the variants
+    self.parser = parser                              # JSON parser, None: the fastest available
+    self.results = [None] * len(self.variants)        # result of every variant, see compareVariant
+
+  def loadBaseline(self, fn):
+    """ Load and fingerprint the baseline
+    """
+    with self.phase('parse'):
+      data = loadJson(fn, self.parser)
+    self.jsonPath['1'] = fn
+    self.jsonIndex['1'] = None
+    self.setJson('1', data)
+
+  def compareVariant(self, fn):
+    """ Load variant fn as file 2 and compare it with the baseline
+
+        Returns its result: file, status, mismatches and seconds, or error
+        when it can not be loaded. File 2 is not changed then
+    """
+    result = {'file': fn}
+    start = time.perf_counter()
+    try:
+      with self.phase('parse'):
+        data = loadJson(fn, self.parser)
+    except (OSError, ValueError) as e:                # JSONDecodeError is a ValueError
+      result['status'] = FAILED
+      result['error'] = str(e)
+    else:
+      self.jsonPath['2'] = fn
+      self.jsonIndex['2'] = None                      # search index of the variant before
+      self.setJson('2', data)
+      self.compare()
+      result['status'] = DIFFERENT if self.mismatch else IDENTICAL
+      result['mismatches'] = self.mismatch
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    return result
+
+  def compareAll(self, report=None):
+    """ Compare every variant with the baseline, returns the results
+
+        report(index, result) is called as soon as a variant is done, it
+        can raise Cancelled to stop. Forked worker processes use the
+        baseline of this comparison as it is, other workers load it once
+    """
+    global shared
+    self.results = [None] * len(self.variants)
+    if self.jobs < 2 or len(self.variants) < 2:
+      for index, fn in enumerate(self.variants):
+        self.results[index] = self.compareVariant(fn)
+        if report is not None:
+          report(index, self.results[index])
+      return self.results
+    shared = self
+    try:
+      with concurrent.futures.ProcessPoolExecutor(min(self.jobs, len(self.variants)), initializer=initWorker,
+                                                  initargs=(self.jsonPath['1'], self.compareOptions(),
+                                                            self.parser)) as executor:
+        futures = {executor.submit(diffVariant, fn): index for index, fn in enumerate(self.variants)}
+        try:
+          for future in concurrent.futures.as_completed(futures):
+            index = futures[future]
+            self.results[index] = future.result()
+            if report is not None:
+              report(index, self.results[index])
+        except BaseException:
+          executor.shutdown(wait=False, cancel_futures=True)  # only wait for the variants being compared
+          raise
+    finally:
+      shared = None
+    return self.results
+
+  def differingPaths(self):
+    """ Indexes of the variants differing at each path (reportPath), in the order the paths are found
+    """
+    paths = {}
+    for index, result in enumerate(self.results):
+      for mismatch in result.get('mismatches', ()) if result is not None else ():
+        variants = paths.setdefault(reportPath(mismatch), [])
+        if not variants or variants[-1] != index:     # more than one mismatch at a path
+          variants.append(index)
+    return paths
+
+
+def reportPath(mismatch):
+  """ Path (text) a mismatch is reported at: in the baseline, in the variant when only there
+
+      A changed range is one path, like in its message: $.values[3:7]
+  """
+  if mismatch.kind == CHANGED_RANGE:
+    start = mismatch.path[-1]
+    return '{}[{}:{}]'.format(pathText(mismatch.path[:-1]), start, start + len(mismatch.value1))
+  return mismatch.jsonPath('1') or mismatch.jsonPath('2')
+
+
+def initWorker(fn, options, parser):
+  """ Give the worker process its baseline, set up once per worker
+  """
+  global baseline
+  baseline = NwayComparison(parser=parser, **options)
+  if shared is not None and shared.jsonPath['1'] == fn:  # forked: no need to parse and fingerprint again
+    baseline.restoreFile('1', shared.fileState('1'))
+  else:
+    baseline.loadBaseline(fn)
+
+
+def diffVariant(fn):
+  """ Compare variant fn with the baseline, run by the worker processes
+  """
+  return baseline.compareVariant(fn)
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(prog='jsonDiff.py nway',
+                                   description='Compare many variants of a JSON file with one baseline, '
+                                               'the baseline is parsed and fingerprinted once')
+  parser.add_argument('baseline', help='JSON file the variants are compared with')
+  parser.add_argument('variants', nargs='+', help='JSON files compared with the baseline')
+  parser.add_argument('--gui', action='store_true', help='show the comparison in the gui')
+  parser.add_argument('--jobs', '-j', action='store', type=int, default=os.cpu_count() or 1,
+                      help='worker processes (default: number of cpus)')
+  parser.add_argument('--summary', action='store', default=None,
+                      help='write the results of all variants as JSON to SUMMARY')
+  parser.add_argument('--verbose', '-v', action='store_true', help='print the mismatches of every variant')
+  parser.add_argument('--parser', action='store', choices=sorted(PARSERS), default=DEFAULT_PARSER,
+                      help='JSON parser (default: %(default)s)')
+  parser.add_argument('--align', action='store_true',
+                      help='compare lists by pairing equal elements instead of by index')
+  parser.add_argument('--key', action='store', default=None,
+                      help='compare lists of objects by pairing the objects with the same KEY property')
+  parser.add_argument('--abs-tol', action='store', type=float, default=0.0,
+                      help='numbers at most ABS_TOL apart are the same')
+  parser.add_argument('--rel-tol', action='store', type=float, default=0.0,
+                      help='numbers at most REL_TOL times the largest of the two apart are the same')
+  parser.add_argument('--ignore', action='append', default=[], metavar='PATTERN',
+                      help='leave the paths matching PATTERN out, like $.items[*].updatedAt or $..etag')
+  parser.add_argument('--include', action='append', default=[], metavar='PATTERN',
+                      help='only compare the paths matching PATTERN')
+  parser.add_argument('--rules', action='store', default=None,
+                      help='file with a rule per line: "ignore PATTERN" or "include PATTERN"')
+  parser.set_defaults(jsonFile1=None, jsonFile2=None)   # for the gui
+  args = parser.parse_args(argv)
+  if args.jobs < 1:
+    parser.error('--jobs must be at least 1')
+  if not (args.abs_tol >= 0 and args.rel_tol >= 0):
+    parser.error('--abs-tol and --rel-tol can not be negative')
+  try:
+    args.ignore, args.include = argumentRules(args)
+  except (OSError, ValueError) as e:
+    parser.error(str(e))
+  if args.gui:
+    try:
+      from jsonDiffGui import App
+    except ImportError as e:
+      parser.error('--gui needs tkinter: {}'.format(e))
+    App(args, Comparison).run()
+    return 0
+
+  comparison = NwayComparison(0, args.variants, args.parser, **comparisonOptions(args))
+  start = time.perf_counter()
+  try:
+    comparison.loadBaseline(args.baseline)
+  except FileNotFoundError:
+    print('Can not find: {}'.format(args.baseline))
+    return 2
+  except json.decoder.JSONDecodeError as e:
+    print('Invalid JSON: {}'.format(e))
+    return 2
+
+  def report(index, result):
+    if result['status'] == FAILED:
+      print('Failed: {}: {}'.format(result['file'], result['error']), flush=True)
+    elif result['status'] == DIFFERENT:
+      print('Different: {}: {} mismatches'.format(result['file'], len(result['mismatches'])), flush=True)
+      if args.verbose:
+        for mismatch in result['mismatches']:
+          print(mismatch.error)
+
+  results = comparison.compareAll(report)
+  paths = comparison.differingPaths()
+  for path, variants in paths.items():
+    print('{}: {} of {} variants: {}'.format(path, len(variants), len(results),
+                                              ', '.join(results[index]['file'] for index in variants)))
+  seconds = time.perf_counter() - start
+  totals = {IDENTICAL: 0, DIFFERENT: 0, FAILED: 0}
+  for result in results:
+    totals[result['status']] += 1
+
+  summary = {'baseline': args.baseline,
+             'variants': len(results),
+             'identical': totals[IDENTICAL],
+             'different': totals[DIFFERENT],
+             'failed': totals[FAILED],
+             'seconds': round(seconds, 6),
+             'paths': {path: [results[index]['file'] for index in variants] for path, variants in paths.items()},
+             'results': [dict(result, mismatches=len(result['mismatches'])) if 'mismatches' in result else result
+                         for result in results]}
+  print('{variants} variants: {identical} identical, {different} different, {failed} failed, '
+        '{paths} differing paths in {seconds:.2f}s'.format(**dict(summary, paths=len(paths))))
+  if args.summary is not None:
+    with open(args.summary, 'w') as fp:
+      json.dump(summary, fp, indent=2)
+  if totals[FAILED]:
+    return 2
+  return 1 if totals[DIFFERENT] else 0
+
+
+if __name__=='__main__':
+  sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,106 @@
+import json
+
+from jsonComparison import CHANGED, DIFFERENT_TYPES, MISSING_PROPERTY, MISSING_ELEMENT, CHANGED_RANGE
+
+
+class TextWriter:
+  """ Mismatch messages, one per line
+
+      Writers write the mismatches to fp one at a time, close() ends the
+      output. With flush every mismatch is flushed as soon as it is written
+  """
+  def __init__(self, fp, data2=None, flush=False):
+    self.fp = fp
+    self.data2 = data2                                # json data of file2, for the values a mismatch does not have
+    self.flush = flush
+
+  def write(self, mismatch):
+    self.fp.write(self.format(mismatch) + '\n')
+    if self.flush:
+      self.fp.flush()
+
+  def close(self):
+    self.fp.flush()
+
+  def format(self, mismatch):
+    return mismatch.error
+
+
+class NdjsonWriter(TextWriter):
+  """ A json object per mismatch per line, see Mismatch.asDict
+  """
+  def __init__(self, fp, data2=None, flush=True):
+    TextWriter.__init__(self, fp, data2, flush)
+
+  def format(self, mismatch):
+    return json.dumps(mismatch.asDict())
+
+
+class PatchWriter(TextWriter):
+  """ RFC 6902 JSON Patch turning file1 into file2, an operation per line
+
+      Needs the data of file2 and lists compared by index: the operations
+      are applied in order, so the list elements removed from the end of a
+      list all have the same index
+  """
+  def __init__(self, fp, data2=None, flush=True):
+    TextWriter.__init__(self, fp, data2, flush)
+    self.separator = '['
+
+  def write(self, mismatch):
+    for operation in self.operations(mismatch):
+      self.fp.write(self.separator + '\n')
+      self.separator = ','
+      self.fp.write(json.dumps(operation))
+    if self.flush:
+      self.fp.flush()
+
+  def close(self):
+    self.fp.write('[]\n' if self.separator == '[' else '\n]\n')
+    self.fp.flush()
+
+  def operations(self, mismatch):
+    if mismatch.kind == CHANGED_RANGE:                # an operation per element
+      parent = mismatch.path[:-1]
+      return [{'op': 'replace', 'path': jsonPointer(parent + (index,)), 'value': value}
+              for index, value in enumerate(mismatch.value2, mismatch.path[-1])]
+    return [self.operation(mismatch)]
+
+  def operation(self, mismatch):
+    kind = mismatch.kind
+    if kind == CHANGED:
+      return {'op': 'replace', 'path': jsonPointer(mismatch.path), 'value': mismatch.value2}
+    if kind == DIFFERENT_TYPES:
+      return {'op': 'replace', 'path': jsonPointer(mismatch.path),
+              'value': valueAt(self.data2, mismatch.path2)}
+    if kind == MISSING_PROPERTY:
+      if mismatch.file == '1':
+        return {'op': 'remove', 'path': jsonPointer(mismatch.path)}
+      return {'op': 'add', 'path': jsonPointer(mismatch.path2), 'value': valueAt(self.data2, mismatch.path2)}
+    if kind == MISSING_ELEMENT:
+      if mismatch.file == '1':                        # the elements after it are removed already
+        parent = mismatch.path[:-1]
+        return {'op': 'remove', 'path': jsonPointer(parent + (len(valueAt(self.data2, parent)),))}
+      return {'op': 'add', 'path': jsonPointer(mismatch.path2), 'value': mismatch.value2}
+    raise ValueError('Moved list elements can not be written as a patch')
+
+
+WRITERS = {'text': TextWriter, 'ndjson': NdjsonWriter, 'patch': PatchWriter}
+
+
+def jsonPointer(path):
+  """ RFC 6901 json pointer of a path tuple
+  """
+  return ''.join('/' + str(segment).replace('~', '~0').replace('/', '~1') for segment in path)
+
+
+def valueAt(data, path):
+  """ Value at path (tuple) in json data
+  """
+  for segment in path:
+    data = data[segment]
+  return data
+
+
+if __name__=='__main__':
+  print('to be imported')
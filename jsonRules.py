@@ -0,0 +1,200 @@
+import re
+import json
+
+# a path segment of a pattern: .name .* ..name ..* [index] [*] ['name'] ["name"], .. before [ too
+SEGMENT = re.compile(r'''(\.\.?)(?:(\*)|([^.\[\]*]+))|(\.\.)?\[(?:(\*)|(\d+)|'([^']*)'|("(?:[^"\\]|\\.)*"))\]''')
+ANY = None                                            # matcher of * and [*]
+INDEX = object()                                      # children memo key of the indexes no pattern names
+NOT_MADE = object()
+
+
+def parsePattern(pattern):
+  """ Steps of a path pattern like $.items[*].updatedAt or $..etag
+
+      A step is (descendant, matcher): matcher is a key, an index or ANY,
+      descendant is set for .. (the step matches at any depth below)
+  """
+  if not pattern.startswith('$'):
+    raise ValueError('Invalid path pattern {!r}: it must start with $'.format(pattern))
+  steps = []
+  pos = 1
+  while pos < len(pattern):
+    match = SEGMENT.match(pattern, pos)
+    if match is None:
+      raise ValueError('Invalid path pattern {!r} at position {}'.format(pattern, pos))
+    dots, star, name, bracketDots, bracketStar, index, single, double = match.groups()
+    if dots is not None:
+      steps.append((dots == '..', ANY if star else name))
+    elif index is not None:
+      steps.append((bracketDots is not None, int(index)))
+    else:
+      key = ANY if bracketStar else single if single is not None else json.loads(double)
+      steps.append((bracketDots is not None, key))
+    pos = match.end()
+  if not steps:
+    raise ValueError('Invalid path pattern {!r}: $ is all of the data'.format(pattern))
+  return tuple(steps)
+
+
+class PathRules:
+  """ Compiled ignore and include path patterns
+
+      A path matching an ignore pattern is left out of the comparison with
+      everything below it. With include patterns only the paths matching
+      them (and everything below) are compared, their parents only to get
+      there. The patterns are matched one path segment at a time: every
+      object/list being compared has a PathState, the state of a child
+      follows from the state of its parent and its key
+  """
+  def __init__(self, ignore=(), include=()):
+    self.ignore = tuple(ignore)
+    self.include = tuple(include)
+    self.steps = [parsePattern(pattern) for pattern in self.ignore + self.include]
+    self.states = {}                                  # (ignore positions, include positions): PathState
+    ignoreAt = frozenset((p, 0) for p in range(len(self.ignore)))
+    includeAt = frozenset((p, 0) for p in range(len(self.ignore), len(self.steps))) if self.include else None
+    self.root = self.state(ignoreAt, includeAt)
+
+  def state(self, ignoreAt, includeAt):
+    """ The PathState of these positions in the patterns, made once
+    """
+    key = (ignoreAt, includeAt)
+    state = self.states.get(key)
+    if state is None:
+      state = self.states[key] = PathState(self, ignoreAt, includeAt)
+    return state
+
+  def advance(self, positions, key):
+    """ Positions in the patterns after matching key, and if a pattern matched completely
+    """
+    steps = self.steps
+    after = set()
+    matched = False
+    for p, i in positions:
+      descendant, matcher = steps[p][i]
+      if descendant:                                  # .. skips any number of keys
+        after.add((p, i))
+      if matcher is ANY or matcher == key and type(matcher) is type(key):
+        if i + 1 == len(steps[p]):
+          matched = True
+        else:
+          after.add((p, i + 1))
+    return frozenset(after), matched
+
+  def childState(self, state, key):
+    """ State of child key of state, None when the child is excluded
+    """
+    ignoreAt, ignored = self.advance(state.ignoreAt, key)
+    if ignored:
+      return None
+    if state.includeAt is None:                       # included with everything below
+      return self.state(ignoreAt, None)
+    includeAt, included = self.advance(state.includeAt, key)
+    if included:
+      return self.state(ignoreAt, None)
+    if not includeAt:                                 # can not lead to an included path
+      return None
+    return self.state(ignoreAt, includeAt)
+
+  def stateAt(self, path):
+    """ State of path (tuple), None when it is excluded
+    """
+    state = self.root
+    for key in path:
+      state = state.child(key)
+      if state is None:
+        return None
+    return state
+
+
+class PathState:
+  """ Where a path is in the patterns of the PathRules
+
+      included: the path is compared, else only the paths below it that
+      lead to an include pattern are
+  """
+  __slots__ = ('rules', 'ignoreAt', 'includeAt', 'included', 'indexes', 'children')
+
+  def __init__(self, rules, ignoreAt, includeAt):
+    self.rules = rules
+    self.ignoreAt = ignoreAt                          # positions in the ignore patterns
+    self.includeAt = includeAt                        # positions in the include patterns, None: included
+    self.included = includeAt is None
+    self.indexes = any(type(rules.steps[p][i][1]) is int  # patterns naming list indexes from here
+                       for p, i in ignoreAt | (includeAt or frozenset()))
+    self.children = {}                                # key: PathState or None (excluded)
+
+  def child(self, key):
+    """ State of child key (property or list index), None when it is excluded
+    """
+    memo = INDEX if type(key) is int and not self.indexes else key
+    state = self.children.get(memo, NOT_MADE)
+    if state is NOT_MADE:
+      state = self.children[memo] = self.rules.childState(self, key)
+    return state
+
+  def childReaches(self, key, value):
+    """ Check if child key with value has anything that is compared
+    """
+    state = self.child(key)
+    return state is not None and state.reaches(value)
+
+  def reaches(self, value):
+    """ Check if value at this path has anything that is compared
+    """
+    if self.included:
+      return True
+    if type(value) is dict:
+      children = value.items()
+    elif type(value) is list:
+      children = enumerate(value)
+    else:
+      return False
+    for key, child in children:
+      state = self.child(key)
+      if state is not None and state.reaches(child):
+        return True
+    return False
+
+
+def readRules(fn):
+  """ Ignore and include patterns from a rules file
+
+      A rule per line: 'ignore PATTERN' or 'include PATTERN', # starts a
+      comment line. Returns the ignore and include patterns
+  """
+  rules = {'ignore': [], 'include': []}
+  with open(fn) as fp:
+    for lineno, line in enumerate(fp, 1):
+      line = line.strip()
+      if not line or line.startswith('#'):
+        continue
+      kind, _, pattern = line.partition(' ')
+      pattern = pattern.strip()
+      if kind not in rules or not pattern:
+        raise ValueError('{} line {}: expected ignore or include and a path pattern'.format(fn, lineno))
+      try:
+        parsePattern(pattern)
+      except ValueError as e:
+        raise ValueError('{} line {}: {}'.format(fn, lineno, e))
+      rules[kind].append(pattern)
+  return rules['ignore'], rules['include']
+
+
+def argumentRules(args):
+  """ Ignore and include patterns of the command line: --ignore, --include
+      and the --rules file. Raises ValueError for invalid patterns
+  """
+  ignore = list(args.ignore)
+  include = list(args.include)
+  for pattern in ignore + include:
+    parsePattern(pattern)
+  if args.rules is not None:
+    fileIgnore, fileInclude = readRules(args.rules)
+    ignore += fileIgnore
+    include += fileInclude
+  return ignore, include
+
+
+if __name__=='__main__':
+  print('to be imported')
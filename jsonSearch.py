@@ -0,0 +1,99 @@
+import array
+import bisect
+
+JSON_CONV = { None: 'null',
+              True: 'true',
+              False: 'false'
+            }
+SEPARATOR = '\x00'                                    # between the texts of the nodes
+
+
+def itemText(key, value):
+  """ Text shown for a json node in the TreeView
+  """
+  if type(value) in (list, tuple):
+    return '{} [{}]'.format(key, len(value))
+  elif type(value) in (dict,):
+    return '{} {{{}}}'.format(key, len(value))
+  elif type(value) in (str,):
+    return '{}: "{}"'.format(key, value)
+  elif type(value) in (int, float):
+    return '{}: {}'.format(key, value)
+  return '{}: {}'.format(key, JSON_CONV[value])
+
+
+class SearchIndex:
+  """ Search index over the keys and values of json data
+
+      The lowercase TreeView texts of all nodes are joined into one string in
+      TreeView order. A search is a str.find over that string, every match is
+      mapped back to its node with a binary search on the text offsets
+  """
+  def __init__(self, data):
+    self.keys = []                                    # entry: key or list index of the node
+    self.parents = array.array('q')                   # entry: entry of the parent node, -1 at the top
+    self.offsets = array.array('q')                   # entry: start of its text
+    texts = []
+    if type(data) in (dict, list):
+      self.add(data, texts)
+    self.text = SEPARATOR.join(texts)
+    self.offsets.append(len(self.text) + 1)           # end of the last text
+
+  def add(self, data, texts):
+    keys = self.keys
+    parents = self.parents
+    offsets = self.offsets
+    offset = 0
+    stack = [(self.children(data), -1)]
+    while stack:                                      # entries in TreeView order
+      children, parent = stack[-1]
+      for key, value in children:
+        entry = len(keys)
+        text = itemText(key, value).lower()
+        keys.append(key)
+        parents.append(parent)
+        offsets.append(offset)
+        texts.append(text)
+        offset += len(text) + 1
+        if type(value) in (dict, list) and value:     # continue with the children
+          stack.append((self.children(value), entry))
+          break
+      else:
+        stack.pop()
+
+  @staticmethod
+  def children(value):
+    return iter(value.items()) if type(value) is dict else enumerate(value)
+
+  def path(self, entry):
+    """ json path of an entry
+    """
+    return '$' + ''.join('[{}]'.format(key) if type(key) is int else '.{}'.format(key) 
+                         for key in self.pathKeys(entry))
+
+  def pathKeys(self, entry):
+    """ Path (tuple of keys and list indexes) of an entry
+    """
+    keys = []
+    while entry >= 0:
+      keys.append(self.keys[entry])
+      entry = self.parents[entry]
+    return tuple(reversed(keys))
+
+  def search(self, text):
+    """ Entries of the nodes with text in their TreeView text (case insensitive)
+    """
+    text = text.lower()
+    found = []
+    if not text:
+      return found
+    pos = self.text.find(text)
+    while pos >= 0:
+      entry = bisect.bisect_right(self.offsets, pos) - 1
+      found.append(entry)
+      pos = self.text.find(text, self.offsets[entry + 1])   # continue with the next node
+    return found
+
+
+if __name__=='__main__':
+  print('to be imported')
@@ -0,0 +1,51 @@
+import time
+import collections
+import contextlib
+
+NO_PHASE = contextlib.nullcontext()                   # phase() without stats
+
+
+class Stats:
+  """ Counters and phase timers of a comparison
+
+      Phases are timed with 'with stats.phase(name):', the times of a phase
+      add up. Counters are increased by the instrumented Comparison
+      (Comparison.enableStats)
+  """
+  def __init__(self):
+    self.counters = collections.Counter()
+    self.phases = collections.OrderedDict()           # phase: seconds
+
+  @contextlib.contextmanager
+  def phase(self, name):
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+  def asDict(self):
+    return {'phases': dict(self.phases), 'counters': dict(self.counters)}
+
+  def summary(self):
+    """ One line for a status bar
+    """
+    phases = ', '.join('{} {:.3f}s'.format(name, seconds) for name, seconds in self.phases.items())
+    counters = self.counters
+    return '{} | {} nodes, {} pruned, {} equality checks, {} mismatches'.format(
+           phases, counters['nodes'], counters['pruned'], counters['equalityChecks'], counters['mismatches'])
+
+  def report(self):
+    """ Multi line report
+    """
+    lines = ['Phases:']
+    for name, seconds in self.phases.items():
+      lines.append('  {:30} {:10.4f}s'.format(name, seconds))
+    lines.append('Counters:')
+    for name in sorted(self.counters):
+      lines.append('  {:30} {:10}'.format(name, self.counters[name]))
+    return '\n'.join(lines)
+
+
+if __name__=='__main__':
+  print('to be imported')
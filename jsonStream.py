@@ -0,0 +1,424 @@
+import re
+import json
+from json.decoder import scanstring
+
+from jsonComparison import Comparison, MismatchLimit
+
+
+CHUNK_SIZE = 1 << 16                                  # characters read from the file at a time
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER = re.compile(r'(-?(?:0|[1-9]\d*))(\.\d+)?([eE][-+]?\d+)?')
+NUMBER_CHARS = frozenset('0123456789.eE+-')           # can follow the part of a number matched so far
+EXCLUDED = object()                                   # value of a property left out by the path rules
+CONSTANTS = (('true', True), ('false', False), ('null', None),
+             ('NaN', float('nan')), ('Infinity', float('inf')), ('-Infinity', float('-inf')))
+
+# parser events
+START_MAP = 'start_map'
+MAP_KEY = 'map_key'
+END_MAP = 'end_map'
+START_ARRAY = 'start_array'
+END_ARRAY = 'end_array'
+VALUE = 'value'
+
+# parser states, what is expected next
+EXPECT_VALUE = 0
+EXPECT_VALUE_OR_END = 1                               # after '['
+EXPECT_KEY = 2                                        # after ',' in an object
+EXPECT_KEY_OR_END = 3                                 # after '{'
+EXPECT_COLON = 4
+EXPECT_COMMA_OR_END = 5
+EXPECT_NOTHING = 6                                    # after the root value
+
+
+def decodeError(msg, buf, pos, offset, lines, column):
+  """ JSONDecodeError with the position in the file instead of in the buffer
+  """
+  e = json.JSONDecodeError(msg, buf, pos)
+  if e.lineno == 1:
+    e.colno += column
+  e.lineno += lines
+  e.pos += offset
+  e.args = ('{}: line {} column {} (char {})'.format(msg, e.lineno, e.colno, e.pos),)
+  return e
+
+
+def parseEvents(fp, chunkSize=CHUNK_SIZE):
+  """ Parse a json file incrementally
+
+      Yields (event, value) tuples, only the current chunk of the file and
+      the stack of open objects/lists are kept in memory
+  """
+  buf = ''
+  pos = 0
+  offset = 0                                          # characters dropped from the buffer
+  lines = 0                                           # newlines dropped from the buffer
+  column = 0                                          # characters dropped after the last newline
+  eof = False
+  need = False                                        # token incomplete, read more data
+  stack = []                                          # open objects '{' and lists '['
+  expect = EXPECT_VALUE
+  while True:
+    if need or pos >= len(buf):
+      if eof:
+        break
+      chunk = fp.read(max(chunkSize, len(buf) - pos))  # grow with long tokens
+      if not chunk:
+        eof = True
+      else:
+        dropped = buf[:pos]                           # keep track of the position in the file
+        newlines = dropped.count('\n')
+        if newlines:
+          lines += newlines
+          column = pos - dropped.rfind('\n') - 1
+        else:
+          column += pos
+        offset += pos
+        buf = buf[pos:] + chunk
+        pos = 0
+      need = False
+      continue
+    c = buf[pos]
+    if c in ' \t\n\r':                                # skip whitespace
+      pos = WHITESPACE.match(buf, pos).end()
+      continue
+
+    if expect == EXPECT_COMMA_OR_END:
+      if c == ',':
+        expect = EXPECT_KEY if stack[-1] == '{' else EXPECT_VALUE
+        pos += 1
+      elif c == '}' and stack[-1] == '{':
+        stack.pop()
+        pos += 1
+        expect = EXPECT_COMMA_OR_END if stack else EXPECT_NOTHING
+        yield END_MAP, None
+      elif c == ']' and stack[-1] == '[':
+        stack.pop()
+        pos += 1
+        expect = EXPECT_COMMA_OR_END if stack else EXPECT_NOTHING
+        yield END_ARRAY, None
+      else:
+        raise decodeError("Expecting ',' delimiter", buf, pos, offset, lines, column)
+      continue
+    if expect == EXPECT_COLON:
+      if c != ':':
+        raise decodeError("Expecting ':' delimiter", buf, pos, offset, lines, column)
+      pos += 1
+      expect = EXPECT_VALUE
+      continue
+    if expect == EXPECT_KEY or expect == EXPECT_KEY_OR_END:
+      if c == '}' and expect == EXPECT_KEY_OR_END:
+        stack.pop()
+        pos += 1
+        expect = EXPECT_COMMA_OR_END if stack else EXPECT_NOTHING
+        yield END_MAP, None
+        continue
+      if c != '"':
+        raise decodeError('Expecting property name enclosed in double quotes',
+                          buf, pos, offset, lines, column)
+      try:
+        key, end = scanstring(buf, pos + 1)
+      except json.JSONDecodeError as e:
+        if not eof and (e.msg.startswith('Unterminated') or e.pos >= len(buf) - 6):
+          need = True
+          continue
+        raise decodeError(e.msg, buf, e.pos, offset, lines, column)
+      pos = end
+      expect = EXPECT_COLON
+      yield MAP_KEY, key
+      continue
+    if expect == EXPECT_NOTHING:
+      raise decodeError('Extra data', buf, pos, offset, lines, column)
+
+    # EXPECT_VALUE or EXPECT_VALUE_OR_END
+    if c == '{':
+      stack.append(c)
+      pos += 1
+      expect = EXPECT_KEY_OR_END
+      yield START_MAP, None
+      continue
+    if c == '[':
+      stack.append(c)
+      pos += 1
+      expect = EXPECT_VALUE_OR_END
+      yield START_ARRAY, None
+      continue
+    if c == ']' and expect == EXPECT_VALUE_OR_END:
+      stack.pop()
+      pos += 1
+      expect = EXPECT_COMMA_OR_END if stack else EXPECT_NOTHING
+      yield END_ARRAY, None
+      continue
+    if c == '"':
+      try:
+        value, end = scanstring(buf, pos + 1)
+      except json.JSONDecodeError as e:
+        if not eof and (e.msg.startswith('Unterminated') or e.pos >= len(buf) - 6):
+          need = True
+          continue
+        raise decodeError(e.msg, buf, e.pos, offset, lines, column)
+    else:
+      if not eof and len(buf) - pos < 10:             # make sure literals are complete
+        need = True
+        continue
+      match = NUMBER.match(buf, pos)
+      if match is not None and not buf.startswith('-Infinity', pos):
+        end = match.end()
+        if not eof and (end == len(buf) or buf[end] in NUMBER_CHARS):  # may continue in the next chunk: 1.2e|-05
+          need = True
+          continue
+        integer, frac, exp = match.groups()
+        if frac or exp:
+          value = float(integer + (frac or '') + (exp or ''))
+        else:
+          value = int(integer)
+      else:
+        for name, value in CONSTANTS:
+          if buf.startswith(name, pos):
+            end = pos + len(name)
+            break
+        else:
+          raise decodeError('Expecting value', buf, pos, offset, lines, column)
+    pos = end
+    expect = EXPECT_COMMA_OR_END if stack else EXPECT_NOTHING
+    yield VALUE, value
+
+  if expect != EXPECT_NOTHING:                        # end of file before the end of the data
+    msg = 'Expecting value' if expect in (EXPECT_VALUE, EXPECT_VALUE_OR_END) else \
+          'Expecting property name enclosed in double quotes' if expect in (EXPECT_KEY, EXPECT_KEY_OR_END) else \
+          "Expecting ':' delimiter" if expect == EXPECT_COLON else "Expecting ',' delimiter"
+    raise decodeError(msg, buf, len(buf), offset, lines, column)
+
+
+def buildValue(events, event):
+  """ Load the value starting with event from the event stream
+  """
+  kind, value = event
+  if kind == START_MAP:
+    obj = {}
+    for kind, key in events:
+      if kind == END_MAP:
+        return obj
+      obj[key] = buildValue(events, next(events))
+  elif kind == START_ARRAY:
+    obj = []
+    for event in events:
+      if event[0] == END_ARRAY:
+        return obj
+      obj.append(buildValue(events, event))
+  return value
+
+
+def skipValue(events, event):
+  """ Skip the value starting with event in the event stream
+  """
+  if event[0] not in (START_MAP, START_ARRAY):
+    return
+  depth = 1
+  for kind, value in events:
+    if kind == START_MAP or kind == START_ARRAY:
+      depth += 1
+    elif kind == END_MAP or kind == END_ARRAY:
+      depth -= 1
+      if not depth:
+        return
+
+
+class StreamComparison(Comparison):
+  """ Comparison of 2 json files parsed as event streams
+
+      Both files are walked in lockstep, only the parts that can not be
+      compared that way (keys in a different order, values shown in a
+      message) are loaded. Mismatches are passed to report(mismatch)
+      as soon as they are found instead of being saved. With maxMismatches
+      the files are only read up to the last mismatch reported
+  """
+  def __init__(self, report, index=0, chunkSize=CHUNK_SIZE, maxMismatches=None, ignore=(), include=(), 
+               absTol=0.0, relTol=0.0):
+    Comparison.__init__(self, index, maxMismatches=maxMismatches, ignore=ignore, include=include, 
+                        absTol=absTol, relTol=relTol)
+    self.report = report
+    self.chunkSize = chunkSize
+    self.jsonHash = {'1': {}, '2': {}}                # loaded parts are not fingerprinted
+
+  def addMismatch(self, mismatch):
+    self.report(mismatch)
+
+  def compare(self):
+    """ Compare the 2 json files in jsonPath
+    """
+    self.mismatchCount = 0
+    self.limited = False
+    self.ruleState = None if self.rules is None else self.rules.root
+    with open(self.jsonPath['1']) as fp1, open(self.jsonPath['2']) as fp2:
+      events1 = parseEvents(fp1, self.chunkSize)
+      events2 = parseEvents(fp2, self.chunkSize)
+      try:
+        self.streamDiff(events1, events2, next(events1), next(events2), (), root=True)
+      except MismatchLimit:                           # the rest of the files is not read
+        self.limited = True
+        return
+      for event in events1:                           # check for data after the json value
+        pass
+      for event in events2:
+        pass
+
+  def streamDiff(self, events1, events2, event1, event2, path, root=False):
+    """ Compare the values starting with event1 (file1) and event2 (file2)
+
+        Same results as Comparison.jsonDiff
+    """
+    kind1, value1 = event1
+    kind2, value2 = event2
+    state = self.ruleState                            # path rules, None: compare everything
+    if kind1 == START_MAP and kind2 == START_MAP:
+      self.streamMaps(events1, events2, path)
+    elif kind1 == START_ARRAY and kind2 == START_ARRAY:
+      self.streamArrays(events1, events2, path)
+    elif kind1 == VALUE and kind2 == VALUE:
+      if value1 != value2 and (state is None or state.included):
+        if root and type(value1) is not type(value2):
+          self.addTypeMismatch(path)
+        else:
+          self.addChanged(path, value1, value2)
+    elif root or kind1 != VALUE:                      # object or list against something else
+      if state is None or state.included:
+        skipValue(events1, event1)
+        skipValue(events2, event2)
+        self.addTypeMismatch(path)
+      else:                                           # load both to check the path rules
+        value1 = buildValue(events1, event1)
+        value2 = buildValue(events2, event2)
+        if state.reaches(value1) or state.reaches(value2):
+          self.addTypeMismatch(path)
+    else:                                             # value against object or list
+      value2 = buildValue(events2, event2)
+      if state is None or state.reaches(value2):
+        self.addChanged(path, value1, value2)
+
+  def skipMissing(self, state, key, events, event):
+    """ Skip the value of key, only found in one file, check if it is reported
+    
+        state is the PathState of the parent, None: no path rules
+    """
+    if state is None:
+      skipValue(events, event)
+      return True
+    child = state.child(key)
+    if child is None or child.included:
+      skipValue(events, event)
+      return child is not None
+    return child.reaches(buildValue(events, event))
+
+  def loadProperty(self, state, key, events):
+    """ Load the value of property key, EXCLUDED (skipped) when the path rules leave it out
+    """
+    if state is not None and state.child(key) is None:
+      skipValue(events, next(events))
+      return EXCLUDED
+    return buildValue(events, next(events))
+
+  def streamMaps(self, events1, events2, path):
+    """ Compare 2 objects, the properties in the same order are compared as they are read
+
+        A key not read in the other file yet has its value loaded and kept
+        until the key is read there, or the object ends: after an inserted,
+        removed or renamed property the objects line up again, only the
+        properties read in between are loaded. A property moved further
+        down is kept loaded until it is read in the other file. Mismatches
+        after the keys differ are reported in the order they are found
+    """
+    state = self.ruleState
+    pending1 = {}                                     # key: value of the keys not read in file2 yet
+    pending2 = {}                                     # key: value of the keys not read in file1 yet
+    kind1, key1 = next(events1)
+    kind2, key2 = next(events2)
+    while kind1 == MAP_KEY or kind2 == MAP_KEY:
+      if kind1 == MAP_KEY and kind2 == MAP_KEY and key1 == key2:
+        if state is not None:
+          self.ruleState = state.child(key1)
+        if state is not None and self.ruleState is None:  # excluded by the path rules
+          skipValue(events1, next(events1))
+          skipValue(events2, next(events2))
+        else:
+          self.streamDiff(events1, events2, next(events1), next(events2), path + (key1,))
+        kind1, key1 = next(events1)
+        kind2, key2 = next(events2)
+      elif kind1 == MAP_KEY and key1 in pending2:     # read in file2 before
+        self.pendingDiff(state, key1, self.loadProperty(state, key1, events1), pending2.pop(key1), path)
+        kind1, key1 = next(events1)
+      elif kind2 == MAP_KEY and key2 in pending1:     # read in file1 before
+        self.pendingDiff(state, key2, pending1.pop(key2), self.loadProperty(state, key2, events2), path)
+        kind2, key2 = next(events2)
+      elif kind1 != MAP_KEY:                          # file1 is done: only available in file2
+        if self.skipMissing(state, key2, events2, next(events2)):
+          self.addMissingProperty(path + (key2,), path + (key2,), '2')
+        kind2, key2 = next(events2)
+      elif kind2 != MAP_KEY:                          # file2 is done: missing in file2
+        if self.skipMissing(state, key1, events1, next(events1)):
+          self.addMissingProperty(path + (key1,), path + (key1,), '1')
+        kind1, key1 = next(events1)
+      else:                                           # keys differ: keep both until they are read in the other file
+        pending1[key1] = self.loadProperty(state, key1, events1)
+        pending2[key2] = self.loadProperty(state, key2, events2)
+        kind1, key1 = next(events1)
+        kind2, key2 = next(events2)
+    for f, pending in (('1', pending1), ('2', pending2)):
+      for key, value in pending.items():
+        if value is not EXCLUDED and (state is None or state.child(key).included or state.child(key).reaches(value)):
+          self.addMissingProperty(path + (key,), path + (key,), f)
+    self.ruleState = state
+
+  def pendingDiff(self, state, key, value1, value2, path):
+    """ Compare the loaded values of property key, like streamDiff
+    """
+    if value1 is EXCLUDED:
+      return
+    self.ruleState = child = None if state is None else state.child(key)
+    if type(value1) in (dict, list):
+      self.jsonDiff(value1, value2, path + (key,))
+    elif value1 != value2 and (child is None or                 # value against value, object or list
+                               (child.reaches(value2) if type(value2) in (dict, list) else child.included)):
+      self.addChanged(path + (key,), value1, value2)
+
+  def streamArrays(self, events1, events2, path):
+    state = self.ruleState
+    idx = 0
+    while True:
+      event1 = next(events1)
+      event2 = next(events2)
+      if event1[0] == END_ARRAY:                      # remaining elements only available in file2
+        while event2[0] != END_ARRAY:
+          if state is None or state.child(idx) is not None:
+            value = buildValue(events2, event2)
+            if state is None or state.child(idx).reaches(value):
+              self.addMissingElement(path + (idx,), path + (idx,), value, '2')
+          else:
+            skipValue(events2, event2)
+          idx += 1
+          event2 = next(events2)
+        return
+      if event2[0] == END_ARRAY:                      # remaining elements missing in file2
+        while event1[0] != END_ARRAY:
+          if state is None or state.child(idx) is not None:
+            value = buildValue(events1, event1)
+            if state is None or state.child(idx).reaches(value):
+              self.addMissingElement(path + (idx,), path + (idx,), value, '1')
+          else:
+            skipValue(events1, event1)
+          idx += 1
+          event1 = next(events1)
+        return
+      if state is not None:
+        self.ruleState = state.child(idx)
+        if self.ruleState is None:                    # excluded by the path rules
+          skipValue(events1, event1)
+          skipValue(events2, event2)
+          idx += 1
+          continue
+      self.streamDiff(events1, events2, event1, event2, path + (idx,))
+      idx += 1
+
+
+if __name__=='__main__':
+  print('to be imported')
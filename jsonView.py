@@ -0,0 +1,356 @@
+import bisect
+
+import tkinter as tk
+import tkinter.ttk as ttk
+import tkinter.font as tkfont
+
+from jsonSearch import itemText
+
+INDENT = 16                                           # pixels per level
+EXPANDER = ('+', '-')                                 # collapsed, expanded
+WHEEL_ROWS = 3                                        # rows scrolled per mouse wheel step
+
+
+class FlatNode:
+  """ An expanded object/list of a FlatTree
+  """
+  __slots__ = ('value', 'path', 'parent', 'keys', 'positions', 'expanded', 'order', 'size')
+
+  def __init__(self, value, path, parent=None):
+    self.value = value
+    self.path = path                                  # tuple of keys and list indexes
+    self.parent = parent                              # FlatNode, None at the top
+    self.keys = list(value) if type(value) is dict else None  # the keys of an object by position
+    self.positions = None                             # key: position, made when a path is looked up
+    self.expanded = {}                                # position: FlatNode of the expanded children
+    self.order = []                                   # positions of the expanded children, sorted
+    self.size = len(value)                            # rows below it, with the rows of the expanded children
+
+  def key(self, position):
+    return position if self.keys is None else self.keys[position]
+
+  def position(self, key):
+    """ Position of child key, None when there is no such child
+    """
+    if self.keys is None:
+      return key if type(key) is int and 0 <= key < len(self.value) else None
+    if self.positions is None:
+      self.positions = {key: position for position, key in enumerate(self.keys)}
+    return self.positions.get(key)
+
+  def offset(self, position):
+    """ Row of child position, counted from the first row below this node
+    """
+    offset = position
+    for expanded in self.order:
+      if expanded >= position:
+        break
+      offset += self.expanded[expanded].size
+    return offset
+
+
+class FlatTree:
+  """ The rows of json data shown as a tree, by row index
+
+      Only the expanded objects/lists are kept (FlatNode with the number of
+      rows below it), a row is found by skipping the rows of the expanded
+      children in front of it. Expanding a list of a million elements adds
+      one FlatNode, not a million rows. Like the TreeView, the top level
+      object/list is not a row itself
+  """
+  def __init__(self, data):
+    self.root = FlatNode(data if type(data) in (dict, list) else [], ())
+
+  def __len__(self):
+    return self.root.size
+
+  def locate(self, row):
+    """ (node, position): row is child position of expanded node
+    """
+    node = self.root
+    while True:
+      for position in node.order:
+        if row <= position:
+          return node, row
+        child = node.expanded[position]
+        if row <= position + child.size:              # below child
+          node = child
+          row -= position + 1
+          break
+        row -= child.size
+      else:
+        return node, row
+
+  def row(self, row):
+    """ key, value, path and FlatNode (None when not expanded) of a row
+    """
+    node, position = self.locate(row)
+    key = node.key(position)
+    return key, node.value[key], node.path + (key,), node.expanded.get(position)
+
+  def find(self, path, expand=False):
+    """ (node, position) of path (tuple), None when it is not in the data
+
+        With expand the objects/lists above path are expanded, else a path
+        below a collapsed object/list is not found either
+    """
+    if not path:
+      return None
+    node = self.root
+    for key in path[:-1]:
+      position = node.position(key)
+      if position is None:
+        return None
+      child = node.expanded.get(position)
+      if child is None:
+        if not expand or type(node.value[key]) not in (dict, list):
+          return None
+        child = self.expandAt(node, position)
+      node = child
+    position = node.position(path[-1])
+    return None if position is None else (node, position)
+
+  def rowOf(self, path, expand=False):
+    """ Row of path (tuple), None when it is not shown (see find)
+    """
+    if self.find(path, expand) is None:
+      return None
+    row = -1
+    node = self.root
+    for key in path:
+      position = node.position(key)
+      row += node.offset(position) + 1
+      node = node.expanded.get(position)
+    return row
+
+  def expandAt(self, node, position):
+    key = node.key(position)
+    child = FlatNode(node.value[key], node.path + (key,), node)
+    node.expanded[position] = child
+    bisect.insort(node.order, position)
+    while node is not None:
+      node.size += child.size
+      node = node.parent
+    return child
+
+  def collapseAt(self, node, position):
+    child = node.expanded.pop(position)
+    node.order.remove(position)
+    while node is not None:
+      node.size -= child.size
+      node = node.parent
+
+  def expand(self, path):
+    """ Expand the object/list at path, returns False when there is nothing to expand
+    """
+    found = self.find(path)
+    if found is None:
+      return False
+    node, position = found
+    value = node.value[node.key(position)]
+    if position in node.expanded or type(value) not in (dict, list) or not value:
+      return False
+    self.expandAt(node, position)
+    return True
+
+  def collapse(self, path):
+    """ Collapse the object/list at path, returns False when it is not expanded
+    """
+    found = self.find(path)
+    if found is None or found[1] not in found[0].expanded:
+      return False
+    self.collapseAt(*found)
+    return True
+
+  def isExpanded(self, path):
+    found = self.find(path)
+    return found is not None and found[1] in found[0].expanded
+
+  def expandedPaths(self):
+    """ Paths of the expanded objects/lists, parents first
+    """
+    paths = []
+    stack = [self.root]
+    while stack:
+      node = stack.pop()
+      for position in node.order:
+        child = node.expanded[position]
+        paths.append(child.path)
+        stack.append(child)
+    return paths
+
+
+class JsonView(ttk.Frame):
+  """ Virtualized TreeView of json data
+
+      Only the rows in the window are drawn on a Canvas, the rows come from
+      a FlatTree, so scrolling through a list of a million elements costs
+      the same as through a list of a hundred. tags(path) gives the tags of
+      a row, tag_configure() their background like in a ttk.Treeview.
+      Linked views scroll and expand along with each other
+  """
+  def __init__(self, master, tags=None):
+    ttk.Frame.__init__(self, master)
+    self.tags = tags                                  # tags(path) of a row, like the TreeView item tags
+    self.tagColors = {}                               # tag: (background, foreground)
+    self.tree = FlatTree(None)
+    self.top = 0                                      # first row in the window
+    self.selected = None                              # path of the selected row
+    self.linked = None                                # JsonView scrolled along
+    self.font = tkfont.nametofont('TkDefaultFont')
+    self.rowHeight = self.font.metrics('linespace') + 4
+    self.canvas = tk.Canvas(self, background='white', highlightthickness=0, takefocus=1)
+    self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.yview)
+    self.scrollbar.pack(side='right', fill='y')
+    self.canvas.pack(side='left', expand=1, fill='both')
+    self.canvas.bind('<Configure>', lambda event: self.scrollTo(self.top, False))
+    self.canvas.bind('<MouseWheel>', lambda event: self.scrollTo(self.top + (-WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS)))
+    self.canvas.bind('<Button-4>', lambda event: self.scrollTo(self.top - WHEEL_ROWS))
+    self.canvas.bind('<Button-5>', lambda event: self.scrollTo(self.top + WHEEL_ROWS))
+    self.canvas.bind('<Button-1>', self.onClick)
+    self.canvas.bind('<Double-Button-1>', self.onDoubleClick)
+    self.canvas.bind('<Up>', lambda event: self.moveSelection(-1))
+    self.canvas.bind('<Down>', lambda event: self.moveSelection(1))
+    self.canvas.bind('<Prior>', lambda event: self.moveSelection(-self.windowRows()))
+    self.canvas.bind('<Next>', lambda event: self.moveSelection(self.windowRows()))
+    self.canvas.bind('<Left>', lambda event: self.selected is not None and self.toggle(self.selected, False))
+    self.canvas.bind('<Right>', lambda event: self.selected is not None and self.toggle(self.selected, True))
+
+  def link(self, view):
+    self.linked = view
+    view.linked = self
+
+  def tag_configure(self, tag, background=None, foreground=None):
+    self.tagColors[tag] = (background, foreground)
+
+  def setData(self, data):
+    """ Show data, the objects/lists expanded before stay expanded when they are still there
+    """
+    paths = self.tree.expandedPaths()
+    top = self.tree.row(self.top)[2] if self.top < len(self.tree) else None
+    self.tree = FlatTree(data)
+    for path in paths:
+      self.tree.expand(path)
+    row = None if top is None else self.tree.rowOf(top)
+    self.scrollTo(0 if row is None else row, False)
+
+  def windowRows(self):
+    return max(1, self.canvas.winfo_height() // self.rowHeight)
+
+  def yview(self, *args):
+    """ Scrollbar command
+    """
+    if args[0] == 'moveto':
+      self.scrollTo(int(float(args[1]) * len(self.tree)))
+    elif args[0] == 'scroll':
+      self.scrollTo(self.top + int(args[1]) * (self.windowRows() if args[2] == 'pages' else 1))
+
+  def scrollTo(self, top, sync=True):
+    """ Show the rows from top, the linked view follows with sync
+    """
+    self.top = max(0, min(top, len(self.tree) - self.windowRows()))
+    self.redraw()
+    if sync and self.linked is not None:
+      self.linked.follow(self)
+
+  def follow(self, view):
+    """ Scroll to the path at the top of view, to the same row when it is not shown here
+    """
+    row = self.tree.rowOf(view.tree.row(view.top)[2]) if view.top < len(view.tree) else None
+    self.scrollTo(view.top if row is None else row, False)
+
+  def redraw(self):
+    canvas = self.canvas
+    canvas.delete('all')
+    width = canvas.winfo_width()
+    height = self.rowHeight
+    total = len(self.tree)
+    end = min(total, self.top + self.windowRows() + 1)  # the last row can be partly shown
+    for row in range(self.top, end):
+      key, value, path, node = self.tree.row(row)
+      y = (row - self.top) * height
+      background, foreground = self.tagColors.get(self.tag(path), (None, None))
+      if path == self.selected:
+        background = 'grey90'
+      if background is not None:
+        canvas.create_rectangle(0, y, width, y + height, fill=background, width=0)
+      x = (len(path) - 1) * INDENT + 2
+      if type(value) in (dict, list) and value:
+        canvas.create_text(x + INDENT // 2, y + height // 2, text=EXPANDER[node is not None], font=self.font)
+      canvas.create_text(x + INDENT + 2, y + height // 2, text=itemText(key, value), anchor='w', font=self.font,
+                         fill=foreground or 'black')
+    if total:
+      self.scrollbar.set(self.top / total, end / total)
+    else:
+      self.scrollbar.set(0, 1)
+
+  def tag(self, path):
+    """ The first configured tag of a row, None when it has none
+    """
+    if self.tags is None:
+      return None
+    tags = self.tags(path)
+    for tag in (tags,) if type(tags) is str else tags:
+      if tag in self.tagColors:
+        return tag
+    return None
+
+  def toggle(self, path, expand=None, sync=True):
+    """ Expand or collapse path (None: the other way around), the linked view does the same with sync
+    """
+    if expand is None:
+      expand = not self.tree.isExpanded(path)
+    if not (self.tree.expand(path) if expand else self.tree.collapse(path)):
+      return
+    self.scrollTo(self.top, False)
+    if sync and self.linked is not None:
+      self.linked.toggle(path, expand, False)
+      self.linked.follow(self)
+
+  def see(self, path):
+    """ Select path (tuple), expanding the objects/lists above it and scrolling it into the window
+
+        Returns False when path is not in the data
+    """
+    row = self.tree.rowOf(path, expand=True)
+    if row is None:
+      return False
+    self.selected = path
+    if self.top <= row < self.top + self.windowRows():
+      self.redraw()
+    else:
+      self.scrollTo(row - self.windowRows() // 2, False)
+    return True
+
+  def rowAt(self, y):
+    row = self.top + y // self.rowHeight
+    return row if row < len(self.tree) else None
+
+  def onClick(self, event):
+    self.canvas.focus_set()
+    row = self.rowAt(event.y)
+    if row is None:
+      return
+    key, value, path, node = self.tree.row(row)
+    x = (len(path) - 1) * INDENT + 2
+    if x <= event.x < x + INDENT and type(value) in (dict, list):  # the expander
+      self.toggle(path)
+    else:
+      self.selected = path
+      self.redraw()
+
+  def onDoubleClick(self, event):
+    row = self.rowAt(event.y)
+    if row is not None:
+      self.toggle(self.tree.row(row)[2])
+
+  def moveSelection(self, rows):
+    if not len(self.tree):
+      return
+    row = None if self.selected is None else self.tree.rowOf(self.selected)
+    row = self.top if row is None else max(0, min(len(self.tree) - 1, row + rows))
+    self.see(self.tree.row(row)[2])
+
+
+if __name__=='__main__':
+  print('to be imported')
@@ -0,0 +1,56 @@
+import os
+import time
+
+POLL_INTERVAL = 0.5                                   # seconds between looking at the files
+SETTLE = 0.5                                          # seconds a changed file has to stay the same
+
+
+class FileWatcher:
+  """ Notices when files change by polling their size and modification time
+
+      Only the metadata is read, so polling often is cheap. poll() reports
+      a changed file once it stayed the same for settle seconds: a file
+      written in steps, or saved again and again, is reported once when
+      it is done instead of after every save. A file that is missing (being
+      replaced) is reported when it is back
+  """
+  def __init__(self, fns, settle=SETTLE):
+    self.settle = settle
+    self.signatures = {fn: signature(fn) for fn in fns}  # fn: signature when last reported
+    self.changes = {}                                 # fn: (signature, time it was first seen)
+
+  def poll(self, now=None):
+    """ The files that changed since they were last reported, and settled
+    """
+    now = time.monotonic() if now is None else now
+    changed = []
+    for fn, reported in self.signatures.items():
+      current = signature(fn)
+      if current == reported:                         # not changed, or changed back
+        self.changes.pop(fn, None)
+        continue
+      seen = self.changes.get(fn)
+      if seen is None or seen[0] != current:          # still changing, wait until it settles
+        self.changes[fn] = (current, now)
+      elif current is not None and now - seen[1] >= self.settle:
+        del self.changes[fn]
+        self.signatures[fn] = current
+        changed.append(fn)
+    return changed
+
+  def files(self):
+    return list(self.signatures)
+
+
+def signature(fn):
+  """ (size, modification time, inode) of a file, None when it does not exist
+  """
+  try:
+    stat = os.stat(fn)
+  except OSError:
+    return None
+  return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+if __name__=='__main__':
+  print('to be imported')
@@ -0,0 +1,65 @@
+import time
+import unittest
+
+from jsonComparison import Comparison
+
+
+def deepDocument(depth, leaf, width):
+  """ depth nested objects, each with a sibling list of width numbers
+  """
+  data = leaf
+  for level in range(depth):
+    data = {'s': list(range(width)), 'c': data}
+  return data
+
+
+def compare(data1, data2, fingerprint=False):
+  comparison = Comparison()
+  comparison.setJson('1', data1, fingerprint)
+  comparison.setJson('2', data2, fingerprint)
+  comparison.compare()
+  return [mismatch.error for mismatch in comparison.mismatch]
+
+
+class DeepDocumentTest(unittest.TestCase):
+  def seconds(self, depth, width):
+    """ Best time of comparing 2 deep documents that differ at the bottom only
+    """
+    data1 = deepDocument(depth, 1, width)
+    data2 = deepDocument(depth, 2, width)
+    best = None
+    for run in range(3):
+      start = time.perf_counter()
+      errors = compare(data1, data2)
+      seconds = time.perf_counter() - start
+      best = seconds if best is None else min(best, seconds)
+    self.assertEqual(errors, [' Mismatch: $' + '.c' * depth + ' - 1 != 2'])
+    return best
+
+  def test_mismatches(self):
+    data1 = deepDocument(5, {'a': 1, 'b': [1, 2]}, 3)
+    data2 = deepDocument(5, {'a': 1, 'b': [1, 3], 'd': None}, 3)
+    data2['c']['s'][1] = 5
+    for fingerprint in (False, True):
+      self.assertEqual(compare(data1, data2, fingerprint), [' Mismatch: $.c.s[1] - 1 != 5',
+                                                            ' Mismatch: $.c.c.c.c.c.b[1] - 2 != 3',
+                                                            ' Missing property:  file2 $.c.c.c.c.c.d: d'])
+
+  def test_depth_900(self):
+    """ Deeper than the python recursion limit allows for a walk with more than one frame per level
+    """
+    data1 = deepDocument(900, 1, 1)
+    data2 = deepDocument(900, 2, 1)
+    for fingerprint in (False, True):
+      self.assertEqual(compare(data1, data2, fingerprint), [' Mismatch: $' + '.c' * 900 + ' - 1 != 2'])
+
+  def test_cost_grows_linearly_with_depth(self):
+    """ Each level compares its own siblings once, not the whole subtree below it again
+    """
+    shallow = self.seconds(25, 5000)
+    deep = self.seconds(200, 5000)
+    self.assertLess(deep, shallow * 8 * 2)              # 8 times deeper, quadratic would be 64 times slower
+
+
+if __name__=='__main__':
+  unittest.main()
@@ -0,0 +1,87 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+import tracemalloc
+
+from jsonStream import parseEvents, StreamComparison, VALUE
+from jsonComparison import loadNumpy
+
+
+def values(text, chunkSize):
+  return [value for event, value in parseEvents(io.StringIO(text), chunkSize) if event == VALUE]
+
+
+class ParseEventsTest(unittest.TestCase):
+  def test_number_split_at_every_point(self):
+    """ A chunk ending anywhere inside a number, also right after its . e or e-
+    """
+    for number in ('0.12345678901e-05', '-12.5E+3', '7e10', '123456789012345'):
+      expected = [float(number) if number.strip('-0123456789') else int(number), 1]
+      for chunkSize in range(1, 24):
+        for pad in range(chunkSize):                  # the number shifted over every split point
+          text = '{}[{}, 1]'.format(' ' * pad, number)
+          self.assertEqual(values(text, chunkSize), expected, (number, chunkSize, pad))
+
+  def test_number_at_the_chunk_boundary(self):
+    text = json.dumps(['x' * 65530, 1.2345678901234e-05])
+    for split in range(len(text) - 16, len(text)):    # the e of the number at the end of the first chunk
+      self.assertEqual(values(text, split), json.loads(text))
+
+  def test_invalid_number(self):
+    for text in ('[1.e5]', '[1e]', '[01]', '[1.5.5]'):
+      for chunkSize in (1, 2, 3, 64):
+        with self.assertRaises(json.JSONDecodeError):
+          values(text, chunkSize)
+
+
+class StreamComparisonTest(unittest.TestCase):
+  def compare(self, data1, data2):
+    """ Mismatch messages of streaming data1 against data2, and the peak memory used
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+      fns = []
+      for index, data in enumerate((data1, data2)):
+        fns.append(os.path.join(tmp, 'file{}.json'.format(index + 1)))
+        with open(fns[-1], 'w') as fp:
+          json.dump(data, fp)
+      errors = []
+      comparison = StreamComparison(lambda mismatch: errors.append(mismatch.error), chunkSize=1 << 12)
+      comparison.jsonPath = {'1': fns[0], '2': fns[1]}
+      loadNumpy()                                     # imported on the way otherwise, counted in the peak
+      tracemalloc.start()
+      comparison.compare()
+      peak = tracemalloc.get_traced_memory()[1]
+      tracemalloc.stop()
+    return errors, peak
+
+  def test_extra_key_early_in_the_root(self):
+    """ One inserted property does not load the rest of the objects
+    """
+    data1 = {'k{}'.format(i): list(range(i, i + 500)) for i in range(100)}
+    data2 = {'k0': data1['k0'], 'extra': [0] * 500}
+    data2.update(data1)
+    data2['k50'] = data2['k50'][:-1]
+    tracemalloc.start()
+    loaded = json.loads(json.dumps(data1))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del loaded
+    errors, peak = self.compare(data1, data2)
+    self.assertEqual(sorted(errors), [' Missing list element: file1 $.k50[499] - 549',
+                                      ' Missing property:  file2 $.extra: extra'])
+    self.assertLess(peak, size / 10)
+
+  def test_properties_in_other_order(self):
+    data1 = {'a': 1, 'b': {'c': [1, 2]}, 'd': 'x', 'e': 5}
+    data2 = {'d': 'y', 'e': 5, 'b': {'c': [1, 3]}, 'f': 1}
+    errors, peak = self.compare(data1, data2)
+    self.assertEqual(sorted(errors), [" Mismatch: $.b.c[1] - 2 != 3",
+                                      " Mismatch: $.d - x != y",
+                                      ' Missing property:  file1 $.a: a',
+                                      ' Missing property:  file2 $.f: f'])
+
+
+if __name__=='__main__':
+  unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import unittest
+import subprocess
+
+from jsonBench import STARTUP_BUDGET, STARTUP_HEAVY
+
+PROJECT_PATH = os.path.dirname(os.path.abspath(__file__))
+JSONDIFF = os.path.join(PROJECT_PATH, 'jsonDiff.py')
+# jsonDiff.py run as the script, then the modules it imported
+MODULES = """import sys, runpy
+sys.argv[0] = {!r}
+sys.path.insert(0, {!r})
+try:
+  runpy.run_path(sys.argv[0], run_name='__main__')
+except SystemExit:
+  pass
+print('\\n'.join(sys.modules))
+""".format(JSONDIFF, PROJECT_PATH)
+
+
+class StartupTest(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.fns = []
+    for index, data in enumerate(({'a': 1, 'b': [1, 2]}, {'a': 1, 'b': [1, 3]})):
+      self.fns.append(os.path.join(self.tmp.name, 'file{}.json'.format(index + 1)))
+      with open(self.fns[-1], 'w') as fp:
+        json.dump(data, fp)
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_no_heavy_imports(self):
+    """ The cli compare of 2 small files does not import the gui, numpy, the cache or the profiler
+    """
+    process = subprocess.run([sys.executable, '-c', MODULES, '--cli', '-q'] + self.fns,
+                             stdout=subprocess.PIPE, text=True, check=True)
+    modules = process.stdout.split()
+    self.assertIn('jsonComparison', modules)
+    self.assertEqual([module for module in modules if module.split('.')[0] in STARTUP_HEAVY], [])
+
+  def test_within_budget(self):
+    best = None
+    for run in range(3):                              # the best of 3, a busy machine is not a regression
+      start = time.perf_counter()
+      subprocess.run([sys.executable, JSONDIFF, '--cli', '-q'] + self.fns, stdout=subprocess.DEVNULL)
+      seconds = time.perf_counter() - start
+      best = seconds if best is None else min(best, seconds)
+    self.assertLess(best, STARTUP_BUDGET)
+
+
+if __name__=='__main__':
+  unittest.main()